@@ -0,0 +1,117 @@
+from typing import Dict, List, Callable, Optional
+from dataclasses import dataclass
+from timing_wheel import TimingWheel, Timer
+
+
+@dataclass
+class _RoomTurn:
+    to_act: List[str]  # players yet to act this betting round, in seat order; the first one is on the clock
+    timer: Optional[Timer] = None
+
+
+class ActionClock(object):
+    """
+    Gives the player whose turn it is turn_timeout seconds to act, for every room at once, on a single TimingWheel.
+
+    A betting round starts with the deal and with each community card reveal, and every seated player acts in seat
+    order. When a player runs out of time, on_timeout is called with the client, the room number and the username,
+    and is expected to act for the player through the normal command path.
+    """
+    def __init__(self, on_timeout: Callable[[object, str, str], None], turn_timeout: float = 30,
+                 wheel: Optional[TimingWheel] = None):
+        """
+        Constructor for the action clock.
+
+        :param on_timeout: function acting for a player who ran out of time, e.g. by starting a command task
+        :param turn_timeout: seconds each player gets to act
+        :param wheel: the timing wheel to schedule on; a new one with 100 ms ticks if None
+        """
+        self._on_timeout = on_timeout
+        self._turn_timeout = turn_timeout
+        self.wheel = wheel if wheel is not None else TimingWheel(tick=0.1)
+        self._rooms: Dict[str, _RoomTurn] = {}
+        self._client = None
+        self.timeouts = 0
+
+    def _start_clock(self, room_number: str, room_turn: _RoomTurn):
+        if room_turn.timer is not None:
+            self.wheel.cancel(room_turn.timer)
+            room_turn.timer = None
+        if room_turn.to_act:
+            room_turn.timer = self.wheel.schedule(self._turn_timeout, lambda: self._expired(room_number))
+        else:
+            del self._rooms[room_number]
+
+    def start_round(self, room_number: str, players: List[str]):
+        """
+        Starts a betting round, putting the first player on the clock.
+
+        :param room_number: the room number
+        :param players: the room's players in seat order
+        """
+        self.stop(room_number)
+        room_turn = self._rooms[room_number] = _RoomTurn(list(players))
+        self._start_clock(room_number, room_turn)
+
+    def acted(self, room_number: str, username: str):
+        """
+        Records that a player acted, moving the clock on to the next player if it was their turn.
+
+        :param room_number: the room number
+        :param username: the player who acted
+        """
+        room_turn = self._rooms.get(room_number)
+        if room_turn is None or username not in room_turn.to_act:
+            return
+        was_on_clock = room_turn.to_act[0] == username
+        room_turn.to_act.remove(username)
+        if was_on_clock:
+            self._start_clock(room_number, room_turn)
+
+    def stop(self, room_number: str):
+        """
+        Ends the room's betting round without anyone else acting, e.g. at the showdown.
+
+        :param room_number: the room number
+        """
+        room_turn = self._rooms.pop(room_number, None)
+        if room_turn is not None and room_turn.timer is not None:
+            self.wheel.cancel(room_turn.timer)
+
+    def timeout_failed(self, room_number: str, username: str):
+        """
+        Ends the room's betting round if the action taken for a timed-out player failed, so the room does not wait
+        without a timer forever.
+
+        :param room_number: the room number
+        :param username: the player who timed out
+        """
+        room_turn = self._rooms.get(room_number)
+        if room_turn is not None and room_turn.timer is None and room_turn.to_act[0] == username:
+            self.stop(room_number)
+
+    def on_clock(self, room_number: str) -> Optional[str]:
+        """
+        :param room_number: the room number
+        :return: the player whose turn it is, or None if no betting round is running
+        """
+        room_turn = self._rooms.get(room_number)
+        return room_turn.to_act[0] if room_turn is not None else None
+
+    def _expired(self, room_number: str):
+        room_turn = self._rooms[room_number]
+        room_turn.timer = None
+        username = room_turn.to_act[0]
+        self.timeouts += 1
+        # The action goes through the command path, which calls acted() and moves the clock on. Until then the room
+        # has no timer, so the player cannot time out twice.
+        self._on_timeout(self._client, room_number, username)
+
+    async def run(self, client):
+        """
+        Runs the clock forever.
+
+        :param client: The MQTT client passed to on_timeout
+        """
+        self._client = client
+        await self.wheel.run()
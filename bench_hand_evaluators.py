@@ -0,0 +1,175 @@
+from typing import Dict, List, Tuple, Set, Callable, Sequence
+import argparse
+import itertools
+import os
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from poker.poker import Poker, Card, CARDS, HAND_TYPES, hand_strength
+
+# Number of 5-card hands of each type among all 2,598,960, indexed like HAND_TYPES
+EXPECTED_FIVE_CARD_COUNTS = (1302540, 1098240, 123552, 54912, 10200, 5108, 3744, 624, 36, 4)
+# Probability of each best hand type among 7-card hands, indexed like HAND_TYPES
+EXPECTED_SEVEN_CARD_PROBABILITIES = (0.17412, 0.43823, 0.23496, 0.04830, 0.04619, 0.03025, 0.02596, 0.00168,
+                                     0.00028, 0.00003)
+
+
+def _legacy_evaluator() -> Callable[[Sequence[Card]], Tuple[int, float]]:
+    the_game = Poker()
+
+    def evaluate(hand):
+        hand_type, score = the_game._calculate_score(hand)
+        return HAND_TYPES.index(hand_type), score
+    return evaluate
+
+
+def _strength_evaluator() -> Callable[[Sequence[Card]], Tuple[int, int]]:
+    def evaluate(hand):
+        strength = hand_strength(hand)
+        return strength >> 20, strength
+    return evaluate
+
+
+# Evaluators under test: name -> factory of a function returning (index in HAND_TYPES, comparable value) for 5 cards
+EVALUATORS = {'hand_strength': _strength_evaluator,
+              'legacy_score': _legacy_evaluator}
+
+
+def _five_card_chunk(first_card: int, names: List[str]) -> Tuple[Dict[str, List[int]], Dict[str, float],
+                                                                   Set[Tuple]]:
+    """
+    Evaluates every 5-card hand whose lowest card code is first_card.
+
+    :return: (hand type counts per evaluator, seconds spent per evaluator, distinct tuples of every evaluator's value)
+    """
+    hands = [(CARDS[first_card],) + tuple(CARDS[code] for code in rest)
+             for rest in itertools.combinations(range(first_card + 1, 52), 4)]
+    counts, seconds, values = {}, {}, []
+    for name in names:
+        evaluate = EVALUATORS[name]()
+        start = time.perf_counter()
+        results = [evaluate(hand) for hand in hands]
+        seconds[name] = time.perf_counter() - start
+        counts[name] = [0] * len(HAND_TYPES)
+        for hand_type, _ in results:
+            counts[name][hand_type] += 1
+        values.append([value for _, value in results])
+    return counts, seconds, set(zip(*values))
+
+
+def _seven_card_chunk(seed: int, num_hands: int, names: List[str]) -> Tuple[Dict[str, List[int]], int, int]:
+    """
+    Evaluates the best 5 of 7 cards for random hands, and plays them against each other in pairs.
+
+    :return: (best hand type counts per evaluator, number of heads-up matchups, matchups the evaluators disagree on)
+    """
+    rng = random.Random(seed)
+    evaluators = [EVALUATORS[name]() for name in names]
+    counts = {name: [0] * len(HAND_TYPES) for name in names}
+    matchups = disagreements = 0
+    for _ in range(num_hands // 2):
+        cards = [CARDS[code] for code in rng.sample(range(52), 9)]
+        board = cards[4:]
+        outcomes = []
+        for name, evaluate in zip(names, evaluators):
+            best = [max((evaluate(hand) for hand in itertools.combinations(cards[2 * i:2 * i + 2] + board, 5)),
+                        key=lambda result: result[1]) for i in range(2)]
+            for hand_type, _ in best:
+                counts[name][hand_type] += 1
+            outcomes.append((best[0][1] > best[1][1]) - (best[0][1] < best[1][1]))
+        matchups += 1
+        disagreements += len(set(outcomes)) > 1
+    return counts, matchups, disagreements
+
+
+def _ordering_violations(values: Set[Tuple], names: List[str]) -> Dict[str, int]:
+    """
+    Counts the hand classes a second evaluator orders differently from the first one.
+
+    :param values: distinct tuples of every evaluator's value for the same hand
+    :return: evaluator name -> number of distinct values of the first evaluator it disagrees with
+    """
+    violations = {}
+    reference = sorted(values)
+    for column, name in enumerate(names[1:], start=1):
+        by_reference: Dict = {}
+        for value in reference:
+            by_reference.setdefault(value[0], set()).add(value[column])
+        violations[name] = sum(len(group) > 1 for group in by_reference.values())  # ties the reference splits
+        previous_max = None
+        for reference_value in sorted(by_reference):
+            group = by_reference[reference_value]
+            if previous_max is not None and min(group) <= previous_max:
+                violations[name] += 1  # ranks this class at or below a class the reference ranks lower
+            previous_max = max(group) if previous_max is None else max(previous_max, max(group))
+    return violations
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Validate hand evaluators on every 5-card hand and on random 7-card '
+                                                 'hands, and measure their throughput. The 5-card pass takes about 40 '
+                                                 'seconds of CPU time for both evaluators, divided over the workers.')
+    parser.add_argument('--evaluators', nargs='+', default=list(EVALUATORS), choices=list(EVALUATORS),
+                        help='evaluators to run; the first is the reference for ordering (default: all)')
+    parser.add_argument('--seven-card-hands', type=int, default=200000, help='random 7-card hands (default: 200000)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='processes (default: one per core)')
+    args = parser.parse_args()
+    names = args.evaluators
+
+    start = time.perf_counter()
+    counts = {name: [0] * len(HAND_TYPES) for name in names}
+    seconds = {name: 0.0 for name in names}
+    values: Set[Tuple] = set()
+    with ProcessPoolExecutor(args.workers) as pool:
+        # Chunks with a low first card hold the most hands, so they are submitted first
+        for chunk_counts, chunk_seconds, chunk_values in pool.map(_five_card_chunk, range(48),
+                                                                  itertools.repeat(names)):
+            for name in names:
+                counts[name] = [a + b for a, b in zip(counts[name], chunk_counts[name])]
+                seconds[name] += chunk_seconds[name]
+            values |= chunk_values
+        five_card_wall = time.perf_counter() - start
+
+        chunk_size = 10000
+        seven_card_counts = {name: [0] * len(HAND_TYPES) for name in names}
+        matchups = disagreements = 0
+        chunk_starts = range(0, args.seven_card_hands, chunk_size)
+        for chunk_counts, chunk_matchups, chunk_disagreements in pool.map(
+                _seven_card_chunk, chunk_starts,
+                [min(chunk_size, args.seven_card_hands - chunk_start) for chunk_start in chunk_starts],
+                itertools.repeat(names)):
+            for name in names:
+                seven_card_counts[name] = [a + b for a, b in zip(seven_card_counts[name], chunk_counts[name])]
+            matchups += chunk_matchups
+            disagreements += chunk_disagreements
+
+    failed = False
+    num_hands = sum(EXPECTED_FIVE_CARD_COUNTS)
+    print(f'All {num_hands:,} 5-card hands in {five_card_wall:.1f} s with {args.workers} workers:')
+    for name in names:
+        wrong = [(HAND_TYPES[i], count, expected) for i, (count, expected)
+                 in enumerate(zip(counts[name], EXPECTED_FIVE_CARD_COUNTS)) if count != expected]
+        failed |= name == names[0] and bool(wrong)
+        print(f'  {name}: {num_hands / seconds[name]:,.0f} evaluations/s per core, '
+              f'{"hand type counts OK" if not wrong else "WRONG hand type counts"}')
+        for hand_type, count, expected in wrong:
+            print(f'    {hand_type}: {count:,} (expected {expected:,})')
+    print(f'  {len({value[0] for value in values}):,} distinct hand classes by {names[0]}')
+    for name, violations in _ordering_violations(values, names).items():
+        print(f'  {name} orders {violations:,} hand classes differently from {names[0]}')
+
+    num_seven_card_hands = sum(seven_card_counts[names[0]])
+    print(f'{num_seven_card_hands:,} random 7-card hands:')
+    for name in names:
+        deviation = max(abs(count / num_seven_card_hands - expected) for count, expected
+                        in zip(seven_card_counts[name], EXPECTED_SEVEN_CARD_PROBABILITIES))
+        print(f'  {name}: largest deviation from the expected hand type probabilities {deviation:.4f}')
+    if len(names) > 1:
+        print(f'  {disagreements:,} of {matchups:,} heads-up matchups decided differently by the evaluators')
+    print(f'Total {time.perf_counter() - start:.1f} s')
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
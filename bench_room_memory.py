@@ -0,0 +1,52 @@
+import argparse
+import asyncio
+import gc
+import tracemalloc
+from poker_db import AsyncPokerGameDB
+from user_db import UserDB
+
+
+async def _measure(num_rooms: int, num_players: int, active: bool) -> float:
+    """
+    Measures the memory held by rooms of an AsyncPokerGameDB, including its per-room bookkeeping.
+
+    :param num_rooms: number of rooms to create
+    :param num_players: players seated in each room
+    :param active: play each room to the turn with a bet per player; otherwise leave the rooms idle before the deal
+    :return: bytes per room
+    """
+    game_db = AsyncPokerGameDB(UserDB())
+    game_db._QUERY_TIME = 0
+    gc.collect()
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    for room_idx in range(num_rooms):
+        room_number = ' ' + str(room_idx)
+        await game_db.add_game(room_number, num_players, 5000, seed=room_idx)
+        for player_idx in range(num_players):
+            await game_db.add_player(room_number, ' player' + str(player_idx))
+        if active:
+            the_game = await game_db.get_game(room_number)
+            the_game.initial_deal()
+            for _ in range(4):
+                the_game.community_draw()
+            for player_idx in range(num_players):
+                the_game.bet(player_idx, 100 + player_idx)
+    gc.collect()
+    after, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return (after - before) / num_rooms
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Report the memory held per idle and per active room.')
+    parser.add_argument('--rooms', type=int, default=10000, help='rooms per measurement (default: 10000)')
+    parser.add_argument('--players', type=int, default=6, help='players per room (default: 6)')
+    args = parser.parse_args()
+    for active in (False, True):
+        bytes_per_room = asyncio.run(_measure(args.rooms, args.players, active))
+        print(f'{"active" if active else "idle"} room, {args.players} players: {bytes_per_room:,.0f} bytes')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+from typing import Dict, List
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+# Command handled by each server process; creating a game builds the databases and appends to the write-ahead log
+FIRST_MESSAGE = "create_game 1, 2, 1000"
+
+
+def _child(loop_name: str):
+    """
+    Imports the server, handles FIRST_MESSAGE without a broker and prints the timings as JSON.
+    """
+    start = time.perf_counter()
+    import poker_mqtt
+    imported = time.perf_counter()
+    import asyncio
+    import event_loop
+    from poker_capture import CapturingClient
+
+    async def first_message():
+        await poker_mqtt.dispatch(CapturingClient(), FIRST_MESSAGE)
+
+    selected = event_loop.select_event_loop(prefer_uvloop=loop_name == 'uvloop')
+    asyncio.run(first_message())
+    handled = time.perf_counter()
+    print(json.dumps({'loop': selected, 'import': imported - start, 'first_message': handled - start}))
+
+
+def measure(loop_name: str, runs: int) -> Dict[str, List[float]]:
+    """
+    Starts a fresh server process runs times, each in an empty working directory.
+
+    :param loop_name: 'asyncio' or 'uvloop'
+    :param runs: number of processes
+    :return: seconds of each run for 'import', 'first_message' (both from the start of the import) and 'process'
+             (from starting Python to its exit), and the selected loop under 'loop'
+    """
+    timings: Dict[str, List] = {'import': [], 'first_message': [], 'process': [], 'loop': []}
+    for _ in range(runs):
+        with tempfile.TemporaryDirectory(prefix='poker_startup_') as working_dir:
+            start = time.perf_counter()
+            output = subprocess.run([sys.executable, __file__, '--child', loop_name], cwd=working_dir,
+                                    capture_output=True, text=True, check=True).stdout
+            timings['process'].append(time.perf_counter() - start)
+        result = json.loads(output.strip().splitlines()[-1])
+        for key in ('import', 'first_message', 'loop'):
+            timings[key].append(result[key])
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure the time from starting the server to handling its first '
+                                                 'command, with each event loop.')
+    parser.add_argument('--runs', type=int, default=10, help='server processes per event loop (default: 10)')
+    parser.add_argument('--loops', nargs='+', default=['asyncio', 'uvloop'], choices=['asyncio', 'uvloop'],
+                        help='event loops to measure (default: both)')
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        _child(args.child)
+        return
+    print(f'Median of {args.runs} fresh processes handling "{FIRST_MESSAGE}":')
+    for loop_name in args.loops:
+        timings = measure(loop_name, args.runs)
+        if loop_name not in timings['loop']:
+            print(f'  {loop_name}: not installed')
+            continue
+        print(f'  {loop_name}: import {1000 * statistics.median(timings["import"]):.1f} ms, '
+              f'first message {1000 * statistics.median(timings["first_message"]):.1f} ms after the import started, '
+              f'process {1000 * statistics.median(timings["process"]):.1f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,40 @@
+from typing import Coroutine, Any
+import asyncio
+import sys
+
+
+def select_event_loop(prefer_uvloop: bool = True) -> str:
+    """
+    Sets the event loop policy asyncio.run() uses, for the platform the server runs on.
+
+    asyncio-mqtt needs add_reader() and add_writer(), which the default Proactor loop on Windows does not have, so
+    Windows gets the selector loop. Elsewhere uvloop is used if it is installed, and asyncio's own loop otherwise.
+
+    :param prefer_uvloop: use uvloop when it is installed
+    :return: the selected loop: 'selector', 'uvloop' or 'asyncio'
+    """
+    if sys.platform == 'win32':
+        asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
+        return 'selector'
+    if prefer_uvloop:
+        try:
+            import uvloop
+        except ImportError:
+            pass
+        else:
+            asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+            return 'uvloop'
+    asyncio.set_event_loop_policy(None)
+    return 'asyncio'
+
+
+def run(main: Coroutine[Any, Any, Any], prefer_uvloop: bool = True) -> Any:
+    """
+    Runs a coroutine like asyncio.run(), on the event loop select_event_loop() picks.
+
+    :param main: the coroutine
+    :param prefer_uvloop: use uvloop when it is installed
+    :return: the coroutine's result
+    """
+    select_event_loop(prefer_uvloop)
+    return asyncio.run(main)
@@ -0,0 +1,220 @@
+from typing import List, Tuple, Iterator, Optional, NamedTuple
+import glob
+import mmap
+import os
+import struct
+from poker.poker import Poker, Card, HAND_TYPES, ACTION_KINDS, card_to_code, code_to_card
+
+MAX_PLAYERS = 10
+MAX_ACTIONS = 16
+_NO_CARD = 0xFF
+_SEGMENT_MAGIC = b'PKRHH002'
+_SEGMENT_HEADER = struct.Struct('<8sI4x')  # magic, record size
+# player, kind, amount; amounts are signed 64-bit like the chip counts of a game snapshot
+_ACTION = struct.Struct('<BBq')
+# hand id, room, pot, players, winner, hand type, actions, board, hole cards, then MAX_ACTIONS x action
+_RECORD = struct.Struct('<Q16sqBBBB5s%ds%ds3x' % (2 * MAX_PLAYERS, _ACTION.size * MAX_ACTIONS))
+# Version 1 segments stored amounts as unsigned 32-bit. They stay readable, but new records go to a new segment.
+_V1_ACTION = struct.Struct('<BBI')
+_V1_RECORD = struct.Struct('<Q16sqBBBB5s%ds%ds3x' % (2 * MAX_PLAYERS, _V1_ACTION.size * MAX_ACTIONS))
+_FORMATS = {_SEGMENT_MAGIC: (_RECORD, _ACTION), b'PKRHH001': (_V1_RECORD, _V1_ACTION)}
+# Offsets of fields used for filtering without unpacking the whole record
+_ROOM_OFFSET = 8
+_HAND_TYPE_OFFSET = 34
+
+
+class HandRecord(NamedTuple):
+    hand_id: int
+    room_number: str
+    pot: int
+    winner: int
+    hand_type: str
+    board: List[Card]
+    hole_cards: List[List[Card]]
+    actions: List[Tuple[int, str, int]]
+
+
+def _encode_room(room_number: str) -> bytes:
+    encoded = room_number.strip().encode('utf-8')
+    if len(encoded) > 16:
+        # Only cut between characters, so the room decodes again
+        encoded = encoded[:16].decode('utf-8', errors='ignore').encode('utf-8')
+    return encoded.ljust(16, b'\0')
+
+
+class HandHistoryWriter(object):
+    """
+    Appends one fixed-size record per finished hand to segment files named hands_<n>.seg.
+
+    Each segment is a 16-byte header followed by records of the same size, so readers can jump to any record and
+    filter on a field by reading the bytes at its offset. A segment is closed after records_per_segment records.
+    Rooms are truncated to 16 bytes, and only the first MAX_ACTIONS actions of a hand are kept.
+    """
+    def __init__(self, directory: str = 'hand_history', records_per_segment: int = 1000000):
+        """
+        Constructor for the writer. Hand ids continue after the last record already on disk.
+
+        :param directory: directory holding the segment files
+        :param records_per_segment: number of records per segment file
+        """
+        self._directory = directory
+        self._records_per_segment = records_per_segment
+        self._segment = None
+        self._segment_records = 0
+        segments = _segment_paths(directory)
+        self._segment_idx = len(segments)
+        self._next_hand_id = sum(_segment_record_count(path) for path in segments) + 1
+        if segments and _segment_format(segments[-1])[0] is _RECORD:
+            last_records = _segment_record_count(segments[-1])
+            if last_records < records_per_segment:
+                self._segment_idx -= 1
+                self._segment_records = last_records
+
+    def _open_segment(self):
+        os.makedirs(self._directory, exist_ok=True)
+        path = os.path.join(self._directory, 'hands_%06d.seg' % self._segment_idx)
+        self._segment = open(path, 'ab')
+        if self._segment.tell() == 0:
+            self._segment.write(_SEGMENT_HEADER.pack(_SEGMENT_MAGIC, _RECORD.size))
+        else:
+            # Drop a torn record left by a crash, so new records stay aligned
+            self._segment.truncate(_SEGMENT_HEADER.size + self._segment_records * _RECORD.size)
+
+    def append(self, room_number: str, the_game: Poker, winner: int) -> int:
+        """
+        Records a finished hand. showdown() or compute_winner() must have been called on the game, and its pot not
+        paid out yet.
+
+        :param room_number: the room number
+        :param the_game: the game after the river
+        :param winner: the winning player's index; with a split pot, one of the winners
+        :return: the hand id
+        """
+        if self._segment is None or self._segment_records == self._records_per_segment:
+            if self._segment is not None:
+                self._segment.close()
+                self._segment_idx += 1
+                self._segment_records = 0
+            self._open_segment()
+        player_stacks = the_game.get_player_stacks()[:MAX_PLAYERS]
+        hole_cards = bytearray([_NO_CARD] * (2 * MAX_PLAYERS))
+        for player_idx, player_stack in enumerate(player_stacks):
+            for card_idx, card in enumerate(player_stack[:2]):
+                hole_cards[2 * player_idx + card_idx] = card_to_code(card)
+        board = bytes(card_to_code(card) for card in the_game.get_community_stack()[:5]).ljust(5, bytes([_NO_CARD]))
+        actions = the_game.get_actions()[:MAX_ACTIONS]
+        hand_type = the_game.get_best_hands()[winner]['hand type']
+        hand_id = self._next_hand_id
+        self._segment.write(_RECORD.pack(
+            hand_id, _encode_room(room_number), the_game.the_pot, len(player_stacks), winner,
+            HAND_TYPES.index(hand_type), len(actions), board, bytes(hole_cards),
+            b''.join(_ACTION.pack(player_idx, ACTION_KINDS.index(kind), amount)
+                     for player_idx, kind, amount in actions)))
+        self._segment.flush()
+        self._segment_records += 1
+        self._next_hand_id += 1
+        return hand_id
+
+    def close(self):
+        if self._segment is not None:
+            self._segment.close()
+            self._segment = None
+
+
+def _segment_paths(directory: str) -> List[str]:
+    return sorted(glob.glob(os.path.join(directory, 'hands_*.seg')))
+
+
+def _segment_format(path: str) -> Tuple[struct.Struct, struct.Struct]:
+    """
+    :param path: a segment file
+    :return: the record and action layouts of the segment; the current ones for a segment without a header yet
+    :raises ValueError: if the file is not a hand history segment of a known version
+    """
+    with open(path, 'rb') as f:
+        header = f.read(_SEGMENT_HEADER.size)
+    if len(header) < _SEGMENT_HEADER.size:
+        return _RECORD, _ACTION
+    magic, record_size = _SEGMENT_HEADER.unpack(header)
+    if magic not in _FORMATS or _FORMATS[magic][0].size != record_size:
+        raise ValueError(f'{path} is not a hand history segment of a known version.')
+    return _FORMATS[magic]
+
+
+def _segment_record_count(path: str) -> int:
+    # A torn record at the end of a segment is not counted
+    record = _segment_format(path)[0]
+    return max(0, (os.path.getsize(path) - _SEGMENT_HEADER.size) // record.size)
+
+
+def _decode(segment: memoryview, offset: int, record_format: struct.Struct = _RECORD,
+            action: struct.Struct = _ACTION) -> HandRecord:
+    # unpack_from() leaves no view into the segment behind, so its memory map can always be closed
+    hand_id, room, pot, num_players, winner, hand_type, num_actions, board, hole_cards, actions = \
+        record_format.unpack_from(segment, offset)
+    return HandRecord(
+        # Segments written before rooms were cut between characters may end in part of one
+        hand_id, room.rstrip(b'\0').decode('utf-8', errors='replace'), pot, winner, HAND_TYPES[hand_type],
+        [code_to_card(code) for code in board if code != _NO_CARD],
+        [[code_to_card(code) for code in hole_cards[2 * i:2 * i + 2] if code != _NO_CARD]
+         for i in range(num_players)],
+        [(player_idx, ACTION_KINDS[kind], amount)
+         for player_idx, kind, amount in action.iter_unpack(actions[:num_actions * action.size])])
+
+
+class HandHistoryReader(object):
+    """
+    Reads the segments written by HandHistoryWriter through memory maps. Filters compare raw bytes at fixed offsets,
+    so only matching records are decoded.
+    """
+    def __init__(self, directory: str = 'hand_history'):
+        self._directory = directory
+
+    def _segments(self) -> Iterator[Tuple[memoryview, struct.Struct, struct.Struct]]:
+        for path in _segment_paths(self._directory):
+            record_format, action = _segment_format(path)
+            num_records = _segment_record_count(path)
+            if num_records == 0:
+                continue
+            with open(path, 'rb') as f:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as segment:
+                    view = memoryview(segment)[_SEGMENT_HEADER.size:
+                                               _SEGMENT_HEADER.size + num_records * record_format.size]
+                    try:
+                        yield view, record_format, action
+                    finally:
+                        view.release()
+
+    def __len__(self):
+        return sum(_segment_record_count(path) for path in _segment_paths(self._directory))
+
+    def scan(self, room_number: Optional[str] = None, hand_type: Optional[str] = None) -> Iterator[HandRecord]:
+        """
+        Iterates over the recorded hands, optionally only those of one room and/or one winning hand type.
+
+        :param room_number: only hands played in this room
+        :param hand_type: only hands won with this hand type, e.g. 'Flush'
+        :return: iterator of hand records in the order they were written
+        """
+        room = _encode_room(room_number) if room_number is not None else None
+        hand_type_code = HAND_TYPES.index(hand_type) if hand_type is not None else None
+        for view, record_format, action in self._segments():
+            record_size = record_format.size
+            for offset in range(0, len(view), record_size):
+                if hand_type_code is not None and view[offset + _HAND_TYPE_OFFSET] != hand_type_code:
+                    continue
+                if room is not None and view[offset + _ROOM_OFFSET:offset + _ROOM_OFFSET + 16] != room:
+                    continue
+                yield _decode(view, offset, record_format, action)
+
+    def count_hand_types(self) -> List[int]:
+        """
+        Counts the winning hand types of every recorded hand, without decoding the records.
+
+        :return: list of counts, indexed like HAND_TYPES
+        """
+        counts = [0] * len(HAND_TYPES)
+        for view, record_format, _ in self._segments():
+            for hand_type in view[_HAND_TYPE_OFFSET::record_format.size]:
+                counts[hand_type] += 1
+        return counts
@@ -1,6 +1,12 @@
-from typing import List, Tuple, Dict
+from typing import List, Tuple, Dict, Sequence, Optional, Union
+from array import array
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+import functools
 import random
-from dataclasses import dataclass
+import struct
+import threading
+import time
+from dataclasses import dataclass, field
 import itertools
 
 POKER_INSTRUCTIONS = {
@@ -15,8 +21,12 @@ POKER_INSTRUCTIONS = {
 }
 
 
-@dataclass
+@dataclass(frozen=True)
 class Card(object):
+    """
+    A playing card. Cards are immutable, and every game shares the 52 instances in CARDS.
+    """
+    __slots__ = ('suit', 'number')
     suit: str
     number: int
 
@@ -37,28 +47,330 @@ class Card(object):
         return f'{self._convert_card_num_to_str(self.number)} of {self.suit}'
 
 
+HAND_TYPES = ('High Card', 'Pair', 'Two Pair', 'Three of a Kind', 'Straight', 'Flush', 'Full House',
+              'Four of a Kind', 'Straight Flush', 'Royal Flush')
+ACTION_KINDS = ('check', 'bet')
+
+# Binary formats encode every card as one byte, suit index * 13 + (number - 2), in the order of _CODE_SUITS.
+_CODE_SUITS = ("S", "H", "C", "D")
+_CARD_TO_CODE = {(suit, number): suit_idx * 13 + number - 2
+                 for suit_idx, suit in enumerate(_CODE_SUITS) for number in range(2, 15)}
+_CODE_TO_CARD = {code: card for card, code in _CARD_TO_CODE.items()}
+# One shared instance per card, indexed by code; a deck is a bytearray of codes, new games copy FULL_DECK.
+CARDS = tuple(Card(*_CODE_TO_CARD[code]) for code in range(52))
+_FULL_DECK = bytes(range(52))
+_SNAPSHOT_MAGIC = b'PKR'
+_SNAPSHOT_VERSION = 2
+_SNAPSHOT_HEADER = struct.Struct('<3sBHqqBB')     # magic, version, num_players, pot, bet amount, deck and board sizes
+_SNAPSHOT_PLAYER = struct.Struct('<qBB')          # cash, done flag, hand size
+_SNAPSHOT_ACTIONS = struct.Struct('<H')           # number of actions (version 2 and later)
+_SNAPSHOT_ACTION = struct.Struct('<BBq')          # player index, action kind, amount
+
+
+def hand_strength(hand: Sequence['Card']) -> int:
+    """
+    Exact strength of a 5-card hand: a greater number is a better hand, and equal numbers are split pots.
+
+    The hand type's index in HAND_TYPES is stored above five 4-bit card numbers that break ties within the type,
+    grouped cards (e.g. the pair) first, then the rest from highest to lowest. An ace counts as 1 in A-2-3-4-5.
+
+    :param hand: five cards
+    :return: the strength
+    """
+    numbers = sorted((card.number for card in hand), reverse=True)
+    counts = {}
+    for number in numbers:
+        counts[number] = counts.get(number, 0) + 1
+    # Card numbers ordered by how often they appear, then by number
+    ranked = sorted(counts, key=lambda number: (counts[number], number), reverse=True)
+    shape = sorted(counts.values(), reverse=True)
+    flush = len({card.suit for card in hand}) == 1
+    straight = len(counts) == 5 and numbers[0] - numbers[4] == 4
+    if numbers == [14, 5, 4, 3, 2]:
+        straight, numbers, ranked = True, [5, 4, 3, 2, 1], [5, 4, 3, 2, 1]
+    if straight and flush:
+        hand_type = 9 if numbers[0] == 14 else 8
+    elif shape[0] == 4:
+        hand_type = 7
+    elif shape == [3, 2]:
+        hand_type = 6
+    elif flush:
+        hand_type = 5
+    elif straight:
+        hand_type = 4
+    elif shape[0] == 3:
+        hand_type = 3
+    elif shape == [2, 2, 1]:
+        hand_type = 2
+    elif shape[0] == 2:
+        hand_type = 1
+    else:
+        hand_type = 0
+    strength = hand_type
+    for number in ranked + [0] * (5 - len(ranked)):
+        strength = strength << 4 | number
+    return strength
+
+
+def strength_hand_type(strength: int) -> str:
+    """
+    :param strength: a strength from hand_strength()
+    :return: the hand type, e.g. 'Flush'
+    """
+    return HAND_TYPES[strength >> 20]
+
+
+@dataclass
+class Pot:
+    amount: int
+    eligible: List[int]  # player indices that can win this pot
+    winners: List[int] = field(default_factory=list)
+
+
+@dataclass
+class Showdown:
+    strengths: List[int]  # best strength of each player, indexed by player
+    ranking: List[List[int]]  # groups of tied players, best group first
+    pots: List[Pot]  # the main pot, then the side pots
+    payouts: List[int]  # amount won by each player, indexed by player
+    returned: List[int]  # uncalled bet given back to each player, indexed by player
+
+
+def card_to_code(card: 'Card') -> int:
+    """
+    Encodes a card as one byte for the binary formats.
+    """
+    return _CARD_TO_CODE[(card.suit, card.number)]
+
+
+def code_to_card(code: int) -> 'Card':
+    """
+    Decodes a card encoded by card_to_code().
+    """
+    return CARDS[code]
+
+
+@dataclass
+class DecisionView:
+    """
+    What a player can see when it is their turn.
+    """
+    player_idx: int
+    num_players: int
+    hole_cards: List[Card]
+    community_cards: List[Card]
+    pot: int
+    cash: int
+
+
+class Strategy(object):
+    """
+    Decides a player's actions. Subclasses implement decide(), and may override decide_batch() to decide many seats
+    at once, e.g. to share work between them.
+
+    time_budget is the seconds the engine waits for one call; a decision that is late or invalid becomes a check.
+    None means no limit, e.g. for a human at the console.
+    """
+    time_budget: Optional[float] = 0.05
+
+    def decide(self, view: DecisionView) -> Tuple[str, int]:
+        """
+        :param view: the deciding player's view of the game
+        :return: ('check', 0) or ('bet', amount)
+        """
+        raise NotImplementedError
+
+    def decide_batch(self, views: List[DecisionView]) -> List[Tuple[str, int]]:
+        """
+        :param views: views of several seats, possibly at different tables
+        :return: one action per view, in the same order
+        """
+        return [self.decide(view) for view in views]
+
+
+class ConsoleStrategy(Strategy):
+    """
+    Asks a human at the console.
+    """
+    time_budget = None
+
+    def decide(self, view: DecisionView) -> Tuple[str, int]:
+        player_input = 'g'
+        while player_input not in ('b', 'k'):
+            player_input = input(f"Player {view.player_idx}: {POKER_INSTRUCTIONS['English']['PLAYER_CHOICE']} ")
+        if player_input == 'b':
+            return 'bet', int(input(f"Player {view.player_idx}: {POKER_INSTRUCTIONS['English']['PLAYER_BET_AMT']} "))
+        return 'check', 0
+
+
+_DECISION_POOL: Optional[ThreadPoolExecutor] = None
+_DECISION_WORKERS = 8
+# Batch still running on the pool for each strategy object, so no strategy is ever called from two threads at once
+_running_batches: Dict[int, Tuple[Strategy, Future]] = {}
+_running_batches_lock = threading.Lock()
+
+
+def _batch_done(strategy_id: int, future: Future):
+    with _running_batches_lock:
+        if _running_batches.get(strategy_id, (None, None))[1] is future:
+            del _running_batches[strategy_id]
+
+
+def _valid_action(action, view: DecisionView) -> Tuple[str, int]:
+    try:
+        kind, amount = action
+        if kind == 'bet' and isinstance(amount, int) and 0 < amount <= view.cash:
+            return 'bet', amount
+    except (TypeError, ValueError):
+        pass
+    return 'check', 0
+
+
+def decide_all(requests: List[Tuple[Strategy, DecisionView]]) -> List[Tuple[str, int]]:
+    """
+    Collects the decisions of many seats, calling decide_batch() once per strategy object. Strategies with a time
+    budget run concurrently on a thread pool of _DECISION_WORKERS threads and are waited for until their budget runs
+    out; their seats check if the batch is late, fails or returns an invalid action. A late batch keeps running, and
+    its result is dropped. Until it finishes, its strategy is not called again: the strategy's seats check instead,
+    so strategies need not be thread-safe.
+
+    :param requests: (strategy, view) of each deciding seat
+    :return: the action of each seat, in the same order
+    """
+    global _DECISION_POOL
+    batches: Dict[int, Tuple[Strategy, List[int]]] = {}
+    for request_idx, (strategy, _) in enumerate(requests):
+        batches.setdefault(id(strategy), (strategy, []))[1].append(request_idx)
+    actions: List[Tuple[str, int]] = [('check', 0)] * len(requests)
+    pending = []
+    for strategy, request_indices in batches.values():
+        views = [requests[request_idx][1] for request_idx in request_indices]
+        if strategy.time_budget is None:
+            results = strategy.decide_batch(views)
+            for request_idx, view, action in zip(request_indices, views, results):
+                actions[request_idx] = _valid_action(action, view)
+            continue
+        with _running_batches_lock:
+            if id(strategy) in _running_batches:
+                continue  # still working on a late batch
+            if _DECISION_POOL is None:
+                _DECISION_POOL = ThreadPoolExecutor(_DECISION_WORKERS, thread_name_prefix='poker-strategy')
+            future = _DECISION_POOL.submit(strategy.decide_batch, views)
+            _running_batches[id(strategy)] = (strategy, future)
+        future.add_done_callback(functools.partial(_batch_done, id(strategy)))
+        pending.append((time.monotonic() + strategy.time_budget, request_indices, views, future))
+    for deadline, request_indices, views, future in pending:
+        try:
+            results = future.result(timeout=max(0.0, deadline - time.monotonic()))
+        except FutureTimeoutError:
+            continue
+        except Exception:  # a broken strategy must not stop the table
+            continue
+        for request_idx, view, action in zip(request_indices, views, results):
+            actions[request_idx] = _valid_action(action, view)
+    return actions
+
+
 class Poker(object):
     """
     Poker game object.
+
+    Games are kept small so a server can hold many of them: the deck is a bytearray of card codes, cash and done
+    flags are arrays indexed by player, and hands and community cards refer to the shared cards in CARDS.
     """
-    def __init__(self, num_players: int = 2, starting_cash: int = 1000):
+    __slots__ = ('_num_players', '_card_stack', '_player_stacks', '_community_stack', '_best_hands', '_player_cash',
+                 'the_pot', '_bet_amount', '_player_dones', '_actions', '_strategies')
+
+    def __init__(self, num_players: int = 2, starting_cash: Union[int, Sequence[int]] = 1000, seed: int = None,
+                 strategies: Optional[List[Strategy]] = None):
         """
         Constructor for the poker game object.
 
         :param num_players: number of players in this game; defaults to 2 players
-        :param starting_cash: amount of cash each player starts with
+        :param starting_cash: amount of cash each player starts with, or a list of each player's amount
+        :param seed: seed for shuffling the deck, so the same seed always deals the same game; random if None
+        :param strategies: strategy of each player for run(); everyone plays at the console if None
         """
-        self._SUITS = ("S", "H", "C", "D")
-        self._NUMBERS = list(range(2, 15))
         self._num_players = num_players
-        self._card_stack = self._create_stack()
+        self._card_stack = self._create_stack(seed)
         self._player_stacks = [[] for _ in range(self._num_players)]
         self._community_stack = []
         self._best_hands = {}
-        self._player_cash = [starting_cash for _ in range(self._num_players)]
+        if isinstance(starting_cash, int):
+            self._player_cash = array('q', [starting_cash]) * self._num_players
+        else:
+            self._player_cash = array('q', starting_cash)
         self.the_pot = 0
         self._bet_amount = 0
-        self._player_dones = [False for _ in range(self._num_players)]
+        self._player_dones = bytearray(self._num_players)
+        self._actions = []
+        self._strategies = strategies
+
+    def to_bytes(self) -> bytes:
+        """
+        Serializes the game state (deck order, hands, community cards, cash, pot and bet state) into a compact,
+        versioned binary snapshot. Best hands are not stored; they are recomputed by compute_winner().
+
+        :return: the snapshot
+        """
+        parts = [_SNAPSHOT_HEADER.pack(_SNAPSHOT_MAGIC, _SNAPSHOT_VERSION, self._num_players, self.the_pot,
+                                       self._bet_amount, len(self._card_stack), len(self._community_stack)),
+                 bytes(self._card_stack),
+                 bytes(_CARD_TO_CODE[(card.suit, card.number)] for card in self._community_stack)]
+        for player_idx in range(self._num_players):
+            player_stack = self._player_stacks[player_idx]
+            parts.append(_SNAPSHOT_PLAYER.pack(self._player_cash[player_idx], self._player_dones[player_idx],
+                                               len(player_stack)))
+            parts.append(bytes(_CARD_TO_CODE[(card.suit, card.number)] for card in player_stack))
+        parts.append(_SNAPSHOT_ACTIONS.pack(len(self._actions)))
+        parts.extend(_SNAPSHOT_ACTION.pack(player_idx, ACTION_KINDS.index(kind), amount)
+                     for player_idx, kind, amount in self._actions)
+        return b''.join(parts)
+
+    @classmethod
+    def from_bytes(cls, snapshot: bytes) -> 'Poker':
+        """
+        Restores a game from a snapshot made by to_bytes().
+
+        :raises: ValueError if the snapshot is not a Poker snapshot or has an unsupported version
+        :param snapshot: the snapshot
+        :return: the restored game
+        """
+        magic, version, num_players, the_pot, bet_amount, deck_len, community_len = \
+            _SNAPSHOT_HEADER.unpack_from(snapshot, 0)
+        if magic != _SNAPSHOT_MAGIC:
+            raise ValueError('Not a Poker snapshot.')
+        if version not in (1, _SNAPSHOT_VERSION):
+            raise ValueError(f'Unsupported Poker snapshot version {version}.')
+        offset = _SNAPSHOT_HEADER.size
+        the_game = cls.__new__(cls)
+        the_game._num_players = num_players
+        the_game._card_stack = bytearray(snapshot[offset:offset + deck_len])
+        offset += deck_len
+        the_game._community_stack = [CARDS[code] for code in snapshot[offset:offset + community_len]]
+        offset += community_len
+        the_game._player_stacks = []
+        the_game._player_cash = array('q')
+        the_game._player_dones = bytearray()
+        for _ in range(num_players):
+            cash, done, hand_len = _SNAPSHOT_PLAYER.unpack_from(snapshot, offset)
+            offset += _SNAPSHOT_PLAYER.size
+            the_game._player_stacks.append([CARDS[code] for code in snapshot[offset:offset + hand_len]])
+            offset += hand_len
+            the_game._player_cash.append(cash)
+            the_game._player_dones.append(done)
+        the_game._actions = []
+        if version >= 2:
+            num_actions, = _SNAPSHOT_ACTIONS.unpack_from(snapshot, offset)
+            offset += _SNAPSHOT_ACTIONS.size
+            for player_idx, kind, amount in _SNAPSHOT_ACTION.iter_unpack(
+                    snapshot[offset:offset + num_actions * _SNAPSHOT_ACTION.size]):
+                the_game._actions.append((player_idx, ACTION_KINDS[kind], amount))
+        the_game._best_hands = {}
+        the_game._strategies = None
+        the_game.the_pot = the_pot
+        the_game._bet_amount = bet_amount
+        return the_game
 
     @staticmethod
     def _score_four_of_a_kind(numbers) -> float:
@@ -239,16 +551,18 @@ class Poker(object):
             score = self._score_high_card(numbers)
         return hand_type, score
 
-    def _create_stack(self) -> List[Card]:
+    def _create_stack(self, seed: int = None) -> bytearray:
         """
         Creates the stack of the cards (52 * num_decks), shuffled.
 
-        :return: stack of all card objects, shuffled.
+        :param seed: seed for the shuffle; random if None
+        :return: stack of all card codes, shuffled.
         """
-        stack = []
-        for suit in self._SUITS:
-            stack.extend([Card(suit, num) for num in self._NUMBERS])
-        random.shuffle(stack)
+        stack = bytearray(_FULL_DECK)
+        if seed is None:
+            random.shuffle(stack)
+        else:
+            random.Random(seed).shuffle(stack)
         return stack
 
     def _draw_card(self) -> Card:
@@ -257,7 +571,7 @@ class Poker(object):
 
         :return: Card object
         """
-        return self._card_stack.pop()
+        return CARDS[self._card_stack.pop()]
 
     def _player_draw(self, player_idx: int) -> Card:
         """
@@ -318,6 +632,31 @@ class Poker(object):
     def get_best_hands(self):
         return self._best_hands
 
+    def get_actions(self) -> List[Tuple[int, str, int]]:
+        """
+        :return: the actions taken this hand, as (player index, 'check' or 'bet', amount)
+        """
+        return self._actions
+
+    def bet(self, player_idx: int, amount: int):
+        """
+        Moves a player's bet into the pot and records the action.
+
+        :param player_idx: Player index
+        :param amount: Amount to bet
+        """
+        self._player_cash[player_idx] -= amount
+        self.the_pot += amount
+        self._actions.append((player_idx, 'bet', amount))
+
+    def check(self, player_idx: int):
+        """
+        Records that a player checked.
+
+        :param player_idx: Player index
+        """
+        self._actions.append((player_idx, 'check', 0))
+
     def _print_cash_standing(self, num_players: int):
         """
         Prints every player's cash standing
@@ -370,35 +709,119 @@ class Poker(object):
         winning_player_idx = max(self._best_hands, key=lambda x: self._best_hands[x].get('score'))
         return winning_player_idx
 
+    def contributions(self) -> List[int]:
+        """
+        :return: the amount each player has bet this hand, indexed by player
+        """
+        contributed = [0] * self._num_players
+        for player_idx, kind, amount in self._actions:
+            if kind == 'bet':
+                contributed[player_idx] += amount
+        return contributed
+
+    def showdown(self, contributions: Optional[List[int]] = None) -> Showdown:
+        """
+        Ranks every player's best hand and settles the main pot and the side pots without paying them out.
+
+        The part of the biggest bet that nobody else matched is returned to the bettor. The rest is divided into one
+        pot per contribution level, and a player is only eligible for the pots up to their own contribution. Every
+        pot goes to the best eligible tie group, split evenly, with odd chips going to the winners in seat order.
+        Money in the pot beyond the contributions goes to the main pot.
+        Also fills get_best_hands(), with the strength as the 'score'.
+
+        :param contributions: amount each player put into the pot; defaults to the bets of this hand
+        :return: the showdown
+        """
+        if contributions is None:
+            contributions = self.contributions()
+        strengths = []
+        for player_idx in range(self._num_players):
+            best_strength, best_hand = -1, None
+            for hand in itertools.combinations(self._player_stacks[player_idx] + self._community_stack, 5):
+                strength = hand_strength(hand)
+                if strength > best_strength:
+                    best_strength, best_hand = strength, hand
+            strengths.append(best_strength)
+            self._best_hands[player_idx] = {'hand': best_hand, 'hand type': strength_hand_type(best_strength),
+                                            'score': best_strength}
+        by_strength = sorted(range(self._num_players), key=lambda idx: strengths[idx], reverse=True)
+        ranking = [list(group) for _, group in itertools.groupby(by_strength, key=lambda idx: strengths[idx])]
+
+        dead_money = self.the_pot - sum(contributions)
+        returned = [0] * self._num_players
+        if contributions:
+            top_idx = max(range(self._num_players), key=lambda idx: contributions[idx])
+            called = max((contributed for idx, contributed in enumerate(contributions) if idx != top_idx), default=0)
+            returned[top_idx] = contributions[top_idx] - called
+            contributions = list(contributions)
+            contributions[top_idx] = called
+        pots = []
+        previous_level = 0
+        for level in sorted(set(contributions)):
+            if level == 0:
+                continue
+            eligible = [idx for idx in range(self._num_players) if contributions[idx] >= level]
+            pots.append(Pot((level - previous_level) * len(eligible), eligible))
+            previous_level = level
+        if dead_money > 0:
+            if pots:
+                pots[0].amount += dead_money
+            else:
+                pots.append(Pot(dead_money, list(range(self._num_players))))
+
+        payouts = [0] * self._num_players
+        for pot in pots:
+            pot.winners = next(sorted(idx for idx in group if idx in pot.eligible) for group in ranking
+                               if any(idx in pot.eligible for idx in group))
+            share, odd_chips = divmod(pot.amount, len(pot.winners))
+            for position, idx in enumerate(pot.winners):
+                payouts[idx] += share + (1 if position < odd_chips else 0)
+        return Showdown(strengths, ranking, pots, payouts, returned)
+
+    def pay_out(self, the_showdown: Showdown):
+        """
+        Pays the pots settled by showdown() to their winners, returns uncalled bets and empties the pot.
+
+        :param the_showdown: the result of showdown()
+        """
+        for player_idx, (amount, returned) in enumerate(zip(the_showdown.payouts, the_showdown.returned)):
+            self._player_cash[player_idx] += amount + returned
+        self.the_pot = 0
+
+    def decision_view(self, player_idx: int) -> DecisionView:
+        """
+        :param player_idx: Player index
+        :return: what the player can see of the game
+        """
+        return DecisionView(player_idx, self._num_players, list(self._player_stacks[player_idx]),
+                            list(self._community_stack), self.the_pot, self._player_cash[player_idx])
+
     def _player_choice(self, player_idx: int):
         """
-        Asks the player for the choice.
+        Asks the player's strategy for the choice. A bet is called by every other player.
 
         :param player_idx: Player index
         """
-        player_input = 'g'
-        while player_input not in ('b', 'k'):
-            player_input = input(f"Player {player_idx}: {POKER_INSTRUCTIONS['English']['PLAYER_CHOICE']} ")
-            if player_input == 'b':
-                self._bet_amount = int(input(f"Player {player_idx}: "
-                                             f"{POKER_INSTRUCTIONS['English']['PLAYER_BET_AMT']} "))
-                self._player_cash[player_idx] -= self._bet_amount
-                self.the_pot += self._bet_amount
-                print(f"Player {player_idx} bets for ${self._bet_amount}. Pot: ${self._the_pot}. "
-                      f"Player {player_idx} now has ${self._player_cash[player_idx]} ")
-                # Automatically 'Call' for everyone but player_idx
-                for idx in range(self._num_players):
-                    if idx == player_idx:
-                        continue
-                    else:
-                        self._player_cash[idx] -= self._bet_amount
-                        self.the_pot += self._bet_amount
-                        print(f"Player {idx} has called. Pot: ${self.the_pot}. "
-                              f"Player {idx} now has ${self._player_cash[idx]}. ")
-                return 'bet'
-            elif player_input == 'k':
-                print(f"Player {player_idx} checks. Pot: ${self.the_pot}. ")
-                return 'check'
+        strategy = self._strategies[player_idx] if self._strategies is not None else ConsoleStrategy()
+        kind, amount = decide_all([(strategy, self.decision_view(player_idx))])[0]
+        if kind == 'bet':
+            self._bet_amount = amount
+            self.bet(player_idx, self._bet_amount)
+            print(f"Player {player_idx} bets for ${self._bet_amount}. Pot: ${self.the_pot}. "
+                  f"Player {player_idx} now has ${self._player_cash[player_idx]} ")
+            # Automatically 'Call' for everyone but player_idx
+            for idx in range(self._num_players):
+                if idx == player_idx:
+                    continue
+                else:
+                    self.bet(idx, self._bet_amount)
+                    print(f"Player {idx} has called. Pot: ${self.the_pot}. "
+                          f"Player {idx} now has ${self._player_cash[idx]}. ")
+            return 'bet'
+        else:
+            self.check(player_idx)
+            print(f"Player {player_idx} checks. Pot: ${self.the_pot}. ")
+            return 'check'
 
     def run(self):
         print(POKER_INSTRUCTIONS['English']['START'])
@@ -419,7 +842,7 @@ class Poker(object):
                         self._player_dones[player_idx] = True
                         continue
             break
-        self._player_dones = [False for _ in range(self._num_players)]
+        self._player_dones = bytearray(self._num_players)
 
         """ **************************** THE FLOP **************************** """
 
@@ -436,7 +859,7 @@ class Poker(object):
                         self._player_dones[player_idx] = True
                         continue
             break
-        self._player_dones = [False for _ in range(self._num_players)]
+        self._player_dones = bytearray(self._num_players)
 
         """ **************************** THE TURN **************************** """
 
@@ -452,7 +875,7 @@ class Poker(object):
                         self._player_dones[player_idx] = True
                         continue
             break
-        self._player_dones = [False for _ in range(self._num_players)]
+        self._player_dones = bytearray(self._num_players)
 
         """ *************************** THE RIVER *************************** """
 
@@ -1,5 +1,8 @@
 from unittest import TestCase, mock
-from poker import Poker, Card
+import threading
+import time
+import poker
+from poker import Poker, Card, Strategy, hand_strength, strength_hand_type, decide_all
 
 
 class TestPoker(TestCase):
@@ -71,3 +74,158 @@ class TestPoker(TestCase):
                                      [Card('H', 5), Card('H', 8)]]      # Player 2: Flush
         """
         self.assertEqual(self.poker.compute_winner(), 2)   # Player 2 should win with his Flush
+
+    def test_snapshot_round_trip(self):
+        self.poker.check(0)
+        self.poker.bet(1, 200)
+        self.poker._player_dones[0] = True
+        restored = Poker.from_bytes(self.poker.to_bytes())
+        self.assertEqual(restored._card_stack, self.poker._card_stack)
+        self.assertEqual(restored.get_player_stacks(), self.poker.get_player_stacks())
+        self.assertEqual(restored.get_community_stack(), self.poker.get_community_stack())
+        self.assertEqual(list(restored.get_player_cash()), [1000, 800, 1000])
+        self.assertEqual(restored.the_pot, 200)
+        self.assertEqual(list(restored._player_dones), [True, False, False])
+        self.assertEqual(restored.get_actions(), [(0, 'check', 0), (1, 'bet', 200)])
+        self.assertEqual(restored.compute_winner(), 2)
+
+    def test_snapshot_rejects_other_data(self):
+        with self.assertRaises(ValueError):
+            Poker.from_bytes(b'XYZ' + self.poker.to_bytes()[3:])
+
+    def test_hand_strength(self):
+        wheel = hand_strength([Card('S', 14), Card('D', 2), Card('H', 3), Card('S', 4), Card('C', 5)])
+        six_high = hand_strength([Card('S', 6), Card('D', 2), Card('H', 3), Card('S', 4), Card('C', 5)])
+        self.assertEqual(strength_hand_type(wheel), 'Straight')
+        self.assertLess(wheel, six_high)
+        royal = hand_strength([Card('S', 14), Card('S', 13), Card('S', 12), Card('S', 11), Card('S', 10)])
+        self.assertEqual(strength_hand_type(royal), 'Royal Flush')
+        # Same pair, decided by the third kicker
+        pair_kicker_4 = hand_strength([Card('S', 9), Card('D', 9), Card('H', 13), Card('S', 7), Card('C', 4)])
+        pair_kicker_3 = hand_strength([Card('H', 9), Card('C', 9), Card('D', 13), Card('C', 7), Card('D', 3)])
+        self.assertGreater(pair_kicker_4, pair_kicker_3)
+        self.assertEqual(pair_kicker_4, hand_strength([Card('H', 9), Card('C', 9), Card('D', 13), Card('C', 7),
+                                                       Card('D', 4)]))
+
+    def test_showdown_ranks_players(self):
+        self.poker.the_pot = 300
+        the_showdown = self.poker.showdown(contributions=[0, 0, 0])
+        self.assertEqual(the_showdown.ranking, [[2], [0], [1]])
+        self.assertEqual(the_showdown.payouts, [0, 0, 300])
+        self.assertEqual(self.poker.get_best_hands()[2]['hand type'], 'Flush')
+        self.poker.pay_out(the_showdown)
+        self.assertEqual(list(self.poker.get_player_cash()), [1000, 1000, 1300])
+        self.assertEqual(self.poker.the_pot, 0)
+
+    def test_showdown_splits_ties_with_odd_chips(self):
+        self.poker._player_stacks = [[Card('S', 2), Card('D', 3)],
+                                     [Card('C', 2), Card('H', 3)],
+                                     [Card('C', 4), Card('D', 4)]]
+        self.poker._community_stack = [Card('S', 14), Card('S', 13), Card('D', 12), Card('H', 11), Card('C', 10)]
+        for player_idx in range(3):
+            self.poker.bet(player_idx, 101)
+        the_showdown = self.poker.showdown()
+        self.assertEqual(the_showdown.ranking, [[0, 1, 2]])
+        self.assertEqual(the_showdown.payouts, [101, 101, 101])
+        self.poker.the_pot += 2  # e.g. left over from an earlier hand
+        self.assertEqual(self.poker.showdown().payouts, [102, 102, 101])
+
+    def test_showdown_side_pots(self):
+        # Player 2 has the best hand but only covered 50, so players 0 and 1 play for the rest. Nobody matched the last
+        # 100 of player 1's bet, so it goes back to player 1.
+        self.poker.bet(0, 200)
+        self.poker.bet(1, 300)
+        self.poker.bet(2, 50)
+        the_showdown = self.poker.showdown()
+        self.assertEqual([(pot.amount, pot.eligible, pot.winners) for pot in the_showdown.pots],
+                         [(150, [0, 1, 2], [2]), (300, [0, 1], [0])])
+        self.assertEqual(the_showdown.payouts, [300, 0, 150])
+        self.assertEqual(the_showdown.returned, [0, 100, 0])
+        self.assertEqual(sum(the_showdown.payouts) + sum(the_showdown.returned), self.poker.the_pot)
+
+    def test_showdown_returns_uncalled_bet(self):
+        # Player 0 bets 100 with 7-2 offsuit and player 1 checks with aces: nobody called, so nobody wins anything
+        the_game = Poker(num_players=2, starting_cash=1000)
+        the_game._player_stacks = [[Card('S', 7), Card('D', 2)], [Card('H', 14), Card('C', 14)]]
+        the_game._community_stack = [Card('S', 13), Card('H', 9), Card('D', 5), Card('C', 4), Card('S', 3)]
+        the_game.bet(0, 100)
+        the_game.check(1)
+        the_showdown = the_game.showdown()
+        self.assertEqual(the_showdown.pots, [])
+        self.assertEqual(the_showdown.payouts, [0, 0])
+        self.assertEqual(the_showdown.returned, [100, 0])
+        # Once player 1 calls 40 of it, they play for 80 and player 0 gets 60 back
+        the_game.bet(1, 40)
+        the_showdown = the_game.showdown()
+        self.assertEqual([(pot.amount, pot.eligible, pot.winners) for pot in the_showdown.pots], [(80, [0, 1], [1])])
+        self.assertEqual(the_showdown.returned, [60, 0])
+        the_game.pay_out(the_showdown)
+        self.assertEqual(list(the_game.get_player_cash()), [960, 1040])
+
+    def test_starting_cash_per_player(self):
+        the_game = Poker(3, [100, 250, 40])
+        self.assertEqual(list(the_game.get_player_cash()), [100, 250, 40])
+        self.assertEqual(the_game.decision_view(2).cash, 40)
+
+    def test_strategy_replaces_console(self):
+        class AlwaysBet(Strategy):
+            def decide(self, view):
+                return 'bet', view.cash // 10
+
+        the_game = Poker(num_players=2, starting_cash=1000, seed=1, strategies=[AlwaysBet(), AlwaysBet()])
+        the_game.initial_deal()
+        with mock.patch('builtins.print'):
+            self.assertEqual(the_game._player_choice(0), 'bet')
+        self.assertEqual(list(the_game.get_player_cash()), [900, 900])
+        self.assertEqual(the_game.the_pot, 200)
+
+    def test_decide_all_enforces_budget_and_validity(self):
+        class Slow(Strategy):
+            time_budget = 0.01
+
+            def decide(self, view):
+                time.sleep(0.2)
+                return 'bet', 1
+
+        class Invalid(Strategy):
+            def decide(self, view):
+                return 'bet', view.cash + 1
+
+        class Batching(Strategy):
+            calls = 0
+
+            def decide_batch(self, views):
+                Batching.calls += 1
+                return [('bet', view.player_idx + 1) for view in views]
+
+        batching = Batching()
+        views = [self.poker.decision_view(player_idx) for player_idx in range(3)]
+        actions = decide_all([(Slow(), views[0]), (Invalid(), views[1]), (batching, views[2]), (batching, views[0])])
+        self.assertEqual(actions, [('check', 0), ('check', 0), ('bet', 3), ('bet', 1)])
+        self.assertEqual(Batching.calls, 1)
+
+    def test_decide_all_waits_for_a_late_batch(self):
+        class Blocking(Strategy):
+            time_budget = 0.01
+
+            def __init__(self):
+                self.calls = 0
+                self.release = threading.Event()
+
+            def decide_batch(self, views):
+                self.calls += 1
+                self.release.wait(5)
+                return [('bet', 1)] * len(views)
+
+        blocking = Blocking()
+        view = self.poker.decision_view(0)
+        self.assertEqual(decide_all([(blocking, view)]), [('check', 0)])
+        # The late batch is still running, so the strategy is not called again
+        self.assertEqual(decide_all([(blocking, view)]), [('check', 0)])
+        self.assertEqual(blocking.calls, 1)
+        blocking.release.set()
+        while poker._running_batches:
+            time.sleep(0.001)
+        blocking.time_budget = 5
+        self.assertEqual(decide_all([(blocking, view)]), [('bet', 1)])
+        self.assertEqual(blocking.calls, 2)
@@ -0,0 +1,120 @@
+from typing import List, Tuple, Dict, Optional
+import itertools
+import random
+from poker.poker import Card, CARDS, DecisionView, Strategy, card_to_code, hand_strength
+
+
+class RandomBot(Strategy):
+    """
+    Bets a random part of its cash with probability bet_probability, and checks otherwise.
+    """
+    def __init__(self, bet_probability: float = 0.3, max_bet_fraction: float = 0.1, seed: Optional[int] = None):
+        """
+        Constructor for the random bot.
+
+        :param bet_probability: probability of betting
+        :param max_bet_fraction: largest bet, as a fraction of the bot's cash
+        :param seed: seed for the bot's decisions; random if None
+        """
+        self._bet_probability = bet_probability
+        self._max_bet_fraction = max_bet_fraction
+        self._rng = random.Random(seed)
+
+    def decide(self, view: DecisionView) -> Tuple[str, int]:
+        max_bet = int(view.cash * self._max_bet_fraction)
+        if max_bet < 1 or self._rng.random() >= self._bet_probability:
+            return 'check', 0
+        return 'bet', self._rng.randint(1, max_bet)
+
+
+def _equity_key(hole_cards: List[Card], community_cards: List[Card], num_opponents: int) -> Tuple:
+    """
+    Key under which an equity estimate is shared. Before the flop only the two numbers and whether they are suited
+    matter, which leaves 169 starting hands; after it, the exact cards.
+    """
+    if not community_cards:
+        numbers = tuple(sorted((card.number for card in hole_cards), reverse=True))
+        return numbers, hole_cards[0].suit == hole_cards[1].suit, num_opponents
+    return (frozenset(card_to_code(card) for card in hole_cards),
+            frozenset(card_to_code(card) for card in community_cards), num_opponents)
+
+
+def _best_strength(cards: List[Card]) -> int:
+    return max(hand_strength(hand) for hand in itertools.combinations(cards, 5))
+
+
+def estimate_equity(hole_cards: List[Card], community_cards: List[Card], num_opponents: int, samples: int,
+                    rng: random.Random) -> float:
+    """
+    Estimates the share of the pot a hand wins at the showdown against random hands, by dealing out the rest of the
+    board and the opponents' cards samples times. Ties count as a split.
+
+    :param hole_cards: the player's two cards
+    :param community_cards: the community cards dealt so far
+    :param num_opponents: number of opponents
+    :param samples: number of random deals
+    :param rng: random number generator
+    :return: the expected share of the pot, from 0 to 1
+    """
+    known = {card_to_code(card) for card in hole_cards + community_cards}
+    deck = [code for code in range(52) if code not in known]
+    missing_board = 5 - len(community_cards)
+    equity = 0.0
+    for _ in range(samples):
+        dealt = rng.sample(deck, missing_board + 2 * num_opponents)
+        board = community_cards + [CARDS[code] for code in dealt[:missing_board]]
+        mine = _best_strength(hole_cards + board)
+        theirs = [_best_strength([CARDS[dealt[missing_board + 2 * i]], CARDS[dealt[missing_board + 2 * i + 1]]] +
+                                 board) for i in range(num_opponents)]
+        best = max(theirs)
+        if mine > best:
+            equity += 1
+        elif mine == best:
+            equity += 1 / (1 + theirs.count(best))
+    return equity / samples
+
+
+class PotOddsBot(Strategy):
+    """
+    Bets bet_fraction of the pot when the bet is worth more than checking, given its equity against random hands.
+
+    Every other player calls a bet, so betting b with n players adds equity * n * b - b to the expected value of
+    checking. Equity estimates are cached, so the 169 starting hands are only estimated once, and a batch of decisions
+    estimates each distinct situation once. An estimate that overruns the time budget makes the engine check for the
+    bot, but it still finishes and is cached for the next time.
+    """
+    def __init__(self, bet_fraction: float = 0.5, samples: int = 100, seed: Optional[int] = None,
+                 cache_size: int = 100000, time_budget: float = 0.1):
+        """
+        Constructor for the pot-odds bot.
+
+        :param bet_fraction: bet size as a fraction of the pot; at least 1 even with an empty pot
+        :param samples: random deals per equity estimate
+        :param seed: seed for the equity estimates; random if None
+        :param cache_size: number of equity estimates kept; the cache is cleared when it is full
+        :param time_budget: seconds the engine waits for a decision
+        """
+        self.time_budget = time_budget
+        self._bet_fraction = bet_fraction
+        self._samples = samples
+        self._rng = random.Random(seed)
+        self._cache_size = cache_size
+        self._equities: Dict[Tuple, float] = {}
+
+    def equity(self, view: DecisionView) -> float:
+        key = _equity_key(view.hole_cards, view.community_cards, view.num_players - 1)
+        equity = self._equities.get(key)
+        if equity is None:
+            if len(self._equities) >= self._cache_size:
+                self._equities.clear()
+            equity = self._equities[key] = estimate_equity(view.hole_cards, view.community_cards,
+                                                           view.num_players - 1, self._samples, self._rng)
+        return equity
+
+    def decide(self, view: DecisionView) -> Tuple[str, int]:
+        if len(view.hole_cards) != 2:
+            return 'check', 0
+        bet_amount = min(view.cash, max(1, int(view.pot * self._bet_fraction)))
+        if bet_amount >= 1 and self.equity(view) * view.num_players * bet_amount > bet_amount:
+            return 'bet', bet_amount
+        return 'check', 0
@@ -0,0 +1,188 @@
+from typing import Dict, Tuple, Union, Any, Callable, Awaitable
+from collections import OrderedDict
+from dataclasses import dataclass
+import asyncio
+import time
+from poker.poker import Poker
+from poker_db import AsyncPokerGameDB, PokerGameInfo
+from tracing import traced
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    coalesced: int = 0
+    evictions: int = 0
+    expirations: int = 0
+    invalidations: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses + self.coalesced
+        if lookups == 0:
+            return 0.0
+        return (self.hits + self.coalesced) / lookups
+
+
+class AsyncPokerGameCache(object):
+    """
+    Read-through cache in front of AsyncPokerGameDB.
+
+    Lookups of get_game and get_game_info are served from a bounded LRU with a TTL. Writes (add_game, add_player)
+    go straight to the database and invalidate the affected room. Concurrent misses on the same room share a single
+    database query instead of each issuing their own.
+    """
+    def __init__(self, game_db: AsyncPokerGameDB, max_size: int = 1024, ttl: float = 5.0):
+        """
+        Constructor for the cache.
+
+        :param game_db: the database to read through to
+        :param max_size: maximum number of cached entries before the least recently used one is evicted
+        :param ttl: number of seconds an entry stays fresh
+        """
+        self._game_db = game_db
+        self._max_size = max_size
+        self._ttl = ttl
+        self._entries: 'OrderedDict[Tuple[str, str], Tuple[float, Any]]' = OrderedDict()
+        self._in_flight: Dict[Tuple[str, str], asyncio.Future] = {}
+        self.stats = CacheStats()
+
+    async def _read_through(self, key: Tuple[str, str], query: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Returns the cached value for key, or runs the query once and caches its result.
+
+        :param key: (kind, room_number)
+        :param query: coroutine function that fetches the value from the database
+        :return: the cached or freshly queried value
+        """
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires_at, value = entry
+            if expires_at > time.monotonic():
+                self._entries.move_to_end(key)
+                self.stats.hits += 1
+                return value
+            del self._entries[key]
+            self.stats.expirations += 1
+
+        pending = self._in_flight.get(key)
+        if pending is not None:
+            self.stats.coalesced += 1
+            return await asyncio.shield(pending)
+
+        self.stats.misses += 1
+        pending = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = pending
+        try:
+            value = await query()
+        except asyncio.CancelledError:
+            pending.cancel()
+            raise
+        except Exception as error:
+            pending.set_exception(error)
+            pending.exception()  # mark retrieved, waiters re-raise it themselves
+            raise
+        else:
+            pending.set_result(value)
+        finally:
+            # Only the query that is still current may fill the cache; an invalidation removes it from _in_flight.
+            current = self._in_flight.get(key) is pending
+            if current:
+                del self._in_flight[key]
+        if current and value is not None:
+            self._store(key, value)
+        return value
+
+    def _store(self, key: Tuple[str, str], value: Any):
+        """
+        Inserts a value into the LRU, evicting the least recently used entry if the cache is full.
+        """
+        self._entries[key] = (time.monotonic() + self._ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self._max_size:
+            self._entries.popitem(last=False)
+            self.stats.evictions += 1
+
+    def invalidate(self, room_number: str):
+        """
+        Drops every cached entry for a room.
+
+        :param room_number: the room number
+        """
+        for kind in ('game', 'game_info'):
+            key = (kind, room_number)
+            self._in_flight.pop(key, None)
+            if self._entries.pop(key, None) is not None:
+                self.stats.invalidations += 1
+
+    def clear(self):
+        """
+        Drops every cached entry.
+        """
+        self._entries.clear()
+        self._in_flight.clear()
+
+    @traced('cache.get_game')
+    async def get_game(self, room_number: str) -> Union[Poker, None]:
+        """
+        Cached AsyncPokerGameDB.get_game.
+
+        :param room_number: the room number
+        :return: None if the game was not found, otherwise pointer to the Poker object
+        """
+        return await self._read_through(('game', room_number), lambda: self._game_db.get_game(room_number))
+
+    @traced('cache.get_game_info')
+    async def get_game_info(self, room_number: str) -> PokerGameInfo:
+        """
+        Cached AsyncPokerGameDB.get_game_info.
+
+        :raises: KeyError if the game was not found
+        :param room_number: the room number of the specific game
+        :return: the game info
+        """
+        return await self._read_through(('game_info', room_number),
+                                        lambda: self._game_db.get_game_info(room_number))
+
+    async def add_game(self, room_number: str, num_players: int = 2, starting_cash: int = 1000,
+                       seed: int = None) -> str:
+        """
+        Write-through AsyncPokerGameDB.add_game.
+
+        :param room_number: room number
+        :param num_players: number of players
+        :param starting_cash: amount of money each player starts with
+        :param seed: seed for shuffling the game's deck; random if None
+        :return: the room number of the game
+        """
+        self.invalidate(room_number)
+        try:
+            return await self._game_db.add_game(room_number, num_players, starting_cash, seed)
+        finally:
+            self.invalidate(room_number)
+
+    async def add_player(self, room_number: str, username: str) -> int:
+        """
+        Write-through AsyncPokerGameDB.add_player.
+
+        :param room_number: the room number of the specific game
+        :param username: the username of the player joining
+        :return: the index of the player within the game
+        """
+        try:
+            return await self._game_db.add_player(room_number, username)
+        finally:
+            self.invalidate(room_number)
+
+    async def remove_player(self, room_number: str, username: str):
+        """
+        Write-through AsyncPokerGameDB.remove_player.
+
+        :param room_number: the room number of the specific game
+        :param username: the username of the player leaving
+        """
+        try:
+            await self._game_db.remove_player(room_number, username)
+        finally:
+            self.invalidate(room_number)
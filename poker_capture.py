@@ -0,0 +1,97 @@
+from typing import List, Tuple, Iterator, Optional
+from dataclasses import dataclass, field
+import json
+import time
+
+# Publishes carrying credentials are captured without their payload
+SECRET_TOPIC_SUFFIXES = ('/password', '/session')
+# The lobby reflects every room at the moment it is published, so it depends on how concurrent commands interleave
+UNVERIFIED_TOPICS = ('lobby',)
+
+
+@dataclass
+class CapturedCommand:
+    t: float
+    command: str
+    seed: Optional[int] = None
+    publishes: List[Tuple[str, str]] = field(default_factory=list)
+    error: bool = False
+
+
+class CaptureWriter(object):
+    """
+    Records every command the server accepts, with its arrival time (seconds since the first capture), the RNG seed it
+    ran with and the publishes it produced, as JSON lines. Passwords and session tokens are never written.
+    """
+    def __init__(self, path: str = 'capture.jsonl'):
+        self._path = path
+        self._file = None
+        self._start: Optional[float] = None
+
+    def now(self) -> float:
+        """
+        :return: seconds since the first captured command
+        """
+        if self._start is None:
+            self._start = time.monotonic()
+        return time.monotonic() - self._start
+
+    def write(self, captured: CapturedCommand):
+        if self._file is None:
+            self._file = open(self._path, 'a')
+        self._file.write(json.dumps(vars(captured)) + '\n')
+        self._file.flush()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def read_capture(path: str) -> Iterator[CapturedCommand]:
+    """
+    Reads a capture written by CaptureWriter, in arrival order.
+
+    :param path: the capture file
+    :return: iterator of captured commands
+    """
+    with open(path) as f:
+        for line in f:
+            captured = json.loads(line)
+            captured['publishes'] = [tuple(publish) for publish in captured['publishes']]
+            yield CapturedCommand(**captured)
+
+
+class CapturingClient(object):
+    """
+    Wraps an MQTT client and remembers every publish made through it. With client None, publishes go nowhere else.
+    """
+    def __init__(self, client=None):
+        self._client = client
+        self.publishes: List[Tuple[str, str]] = []
+
+    async def publish(self, topic, payload=None, qos=0, retain=False):
+        self.publishes.append((topic, '' if topic.endswith(SECRET_TOPIC_SUFFIXES) else str(payload)))
+        if self._client is not None:
+            await self._client.publish(topic, payload, qos=qos, retain=retain)
+
+
+def redact_command(message_str: str) -> str:
+    """
+    Drops the password of a create_user or login command and the session token of a logout command.
+
+    :param message_str: the command, with any session token of a player command already removed
+    :return: the command as it may be stored in a capture
+    """
+    if message_str.startswith(("create_user", "login", "logout")):
+        return message_str.split(",", 1)[0]
+    return message_str
+
+
+def verifiable(publishes: List[Tuple[str, str]]) -> List[Tuple[str, str]]:
+    """
+    :param publishes: (topic, payload) pairs of one command
+    :return: the publishes a replay must reproduce exactly
+    """
+    return [(topic, payload) for topic, payload in publishes
+            if topic not in UNVERIFIED_TOPICS and not topic.endswith(SECRET_TOPIC_SUFFIXES)]
@@ -1,55 +1,221 @@
-from typing import List, Tuple, Dict, Union
+from typing import List, Tuple, Dict, Union, Optional, Set
 from poker.poker import Poker
 import asyncio
+import contextlib
+import json
+import os
+import struct
+import time
 from user_db import UserDB
-from dataclasses import dataclass
+from poker_lobby import LobbyIndex, LobbyEntry
+from tracing import traced
+from dataclasses import dataclass, asdict, field
 
 
 @dataclass
 class PokerGameInfo:
+    __slots__ = ('room_number', 'num_players', 'starting_cash', 'players')
     room_number: str
     num_players: int
     starting_cash: int
     players: List[str]
 
 
+@dataclass
+class _RoomLock:
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+    users: int = 0  # commands holding or waiting for the lock
+
+
 class AsyncPokerGameDB(object):
-    def __init__(self, user_db: UserDB):
+    def __init__(self, user_db: UserDB, hibernate_dir: str = 'hibernated_rooms'):
         self._current_games: Dict[str, Poker] = {}
         self._current_games_info: Dict[str, PokerGameInfo] = {}
         self._QUERY_TIME: float = 0.05
         self._user_db = user_db
+        self.lobby = LobbyIndex()
+        self._hibernate_dir = hibernate_dir
+        self._hibernated: Set[str] = set()
+        self.last_activity: Dict[str, float] = {}
+        self.rehydrations = 0
+        self._room_locks: Dict[str, _RoomLock] = {}
+
+    @contextlib.asynccontextmanager
+    async def room_lock(self, room_number: str):
+        """
+        Holds the lock that serializes commands on one room. A command that reads a game, awaits, and then
+        mutates it must hold the room's lock for the whole sequence, or concurrent commands can lose updates.
+        Commands on different rooms never wait for each other.
+
+        A room's lock only exists while a command holds or waits for it, so commands naming rooms that do not exist
+        leave nothing behind.
+
+        :param room_number: the room number
+        """
+        room_lock = self._room_locks.get(room_number)
+        if room_lock is None:
+            room_lock = self._room_locks[room_number] = _RoomLock()
+        room_lock.users += 1
+        try:
+            async with room_lock.lock:
+                yield
+        finally:
+            room_lock.users -= 1
+            if room_lock.users == 0:
+                del self._room_locks[room_number]
+
+    def is_room_locked(self, room_number: str) -> bool:
+        room_lock = self._room_locks.get(room_number)
+        return room_lock is not None and room_lock.lock.locked()
+
+    def _hibernate_path(self, room_number: str) -> str:
+        # Room numbers come straight from user messages, so hex-encode them to get a safe file name.
+        return os.path.join(self._hibernate_dir, room_number.encode('utf-8').hex() + '.room')
+
+    def _touch(self, room_number: str):
+        """
+        Records activity in a room and brings it back into memory if it was hibernated.
+
+        :raises: KeyError if the game was not found
+        :param room_number: the room number
+        """
+        if room_number in self._hibernated:
+            with open(self._hibernate_path(room_number), 'rb') as f:
+                the_game, game_info = self._load_room(f.read())
+            os.remove(self._hibernate_path(room_number))
+            self._hibernated.discard(room_number)
+            self._current_games[room_number] = the_game
+            self._current_games_info[room_number] = game_info
+            self.rehydrations += 1
+        elif room_number not in self._current_games_info:
+            raise KeyError(room_number)
+        self.last_activity[room_number] = time.monotonic()
+
+    @staticmethod
+    def _dump_room(the_game: Poker, game_info: PokerGameInfo) -> bytes:
+        """
+        Serializes a room as the length-prefixed Poker snapshot followed by the game info as JSON.
+        """
+        game_snapshot = the_game.to_bytes()
+        return struct.pack('<I', len(game_snapshot)) + game_snapshot + json.dumps(asdict(game_info)).encode('utf-8')
+
+    @staticmethod
+    def _load_room(data: bytes) -> Tuple[Poker, PokerGameInfo]:
+        """
+        Restores a room serialized by _dump_room.
+        """
+        snapshot_len, = struct.unpack_from('<I', data, 0)
+        the_game = Poker.from_bytes(data[4:4 + snapshot_len])
+        game_info = PokerGameInfo(**json.loads(data[4 + snapshot_len:].decode('utf-8')))
+        return the_game, game_info
+
+    def dump_rooms(self) -> Dict[str, bytes]:
+        """
+        Serializes every room, resident or hibernated, e.g. for a checkpoint.
+
+        :return: dict of room number to serialized room
+        """
+        rooms = {room_number: self._dump_room(self._current_games[room_number], game_info)
+                 for room_number, game_info in self._current_games_info.items()}
+        for room_number in self._hibernated:
+            with open(self._hibernate_path(room_number), 'rb') as f:
+                rooms[room_number] = f.read()
+        return rooms
+
+    def restore_rooms(self, rooms: Dict[str, bytes]):
+        """
+        Loads rooms serialized by dump_rooms into memory, replacing any rooms with the same room number.
+
+        :param rooms: dict of room number to serialized room
+        """
+        for room_number, data in rooms.items():
+            self.delete_game(room_number)
+            the_game, game_info = self._load_room(data)
+            self._current_games[room_number] = the_game
+            self._current_games_info[room_number] = game_info
+            self.last_activity[room_number] = time.monotonic()
+            self.lobby.add_room(room_number, game_info.num_players, game_info.starting_cash)
+            for _ in game_info.players:
+                self.lobby.player_joined(room_number)
+
+    def is_hibernated(self, room_number: str) -> bool:
+        return room_number in self._hibernated
+
+    def resident_rooms(self) -> List[str]:
+        return list(self._current_games_info)
+
+    def hibernate_game(self, room_number: str):
+        """
+        Writes a game to disk and drops it from memory. The next access to the room transparently loads it again.
+
+        :raises: KeyError if the game is not in memory
+        :param room_number: the room number
+        """
+        os.makedirs(self._hibernate_dir, exist_ok=True)
+        the_game = self._current_games[room_number]
+        game_info = self._current_games_info[room_number]
+        with open(self._hibernate_path(room_number), 'wb') as f:
+            f.write(self._dump_room(the_game, game_info))
+        del self._current_games[room_number]
+        del self._current_games_info[room_number]
+        self._hibernated.add(room_number)
 
-    async def add_game(self, room_number: str, num_players: int = 2, starting_cash: int = 1000) -> str:
+    def delete_game(self, room_number: str):
+        """
+        Deletes a game from memory, disk and the lobby. Does nothing if the game does not exist.
+
+        :param room_number: the room number
+        """
+        self._current_games.pop(room_number, None)
+        self._current_games_info.pop(room_number, None)
+        if room_number in self._hibernated:
+            self._hibernated.discard(room_number)
+            os.remove(self._hibernate_path(room_number))
+        self.last_activity.pop(room_number, None)
+        self.lobby.remove_room(room_number)
+
+    @traced('db.add_game')
+    async def add_game(self, room_number: str, num_players: int = 2, starting_cash: int = 1000,
+                       seed: int = None) -> str:
         """
         Asks the database to create a new game.
 
         :param room_number: room number
         :param num_players: number of players
         :param starting_cash: amount of money each player starts with
+        :param seed: seed for shuffling the game's deck; random if None
         :return: the room number of the game
         """
-        if room_number in self._current_games_info:
+        if room_number in self._current_games_info or room_number in self._hibernated:
             raise KeyError('That room number is taken.')
         await asyncio.sleep(self._QUERY_TIME)  # simulate query time
-        self._current_games[room_number] = Poker(num_players, starting_cash)
+        self._current_games[room_number] = Poker(num_players, starting_cash, seed)
         self._current_games_info[room_number] = PokerGameInfo(
             room_number,
             num_players,
             starting_cash,
             list(),
             )
+        self.last_activity[room_number] = time.monotonic()
+        self.lobby.add_room(room_number, num_players, starting_cash)
         return room_number
 
-    # async def list_games(self) -> List[Tuple[str, int]]:
-    #     """
-    #     Asks the database for a list of all active games.
-    #
-    #     :return: list of (game_id, number of players in game)
-    #     """
-    #     await asyncio.sleep(self._QUERY_TIME)  # simulate query time
-    #     return [(game_id, game._num_players) for game_id, game in self._current_games.items()]
+    @traced('db.list_games')
+    async def list_games(self, min_cash: int = 0, max_cash: Optional[int] = None, limit: int = 20,
+                         after: Optional[Tuple[int, str]] = None) -> Tuple[List[LobbyEntry], Optional[Tuple[int, str]]]:
+        """
+        Asks the database for a page of games with open seats, answered from the lobby index.
 
+        :param min_cash: lowest starting_cash to include
+        :param max_cash: highest starting_cash to include; None for no upper bound
+        :param limit: page size
+        :param after: cursor returned with the previous page; None for the first page
+        :return: (page of lobby entries, cursor for the next page or None if this was the last page)
+        """
+        await asyncio.sleep(self._QUERY_TIME)  # simulate query time
+        return self.lobby.open_rooms(min_cash, max_cash, limit, after)
+
+    @traced('db.get_game')
     async def get_game(self, room_number: str) -> Union[Poker, None]:
         """
         Asks the database for a pointer to a specific game.
@@ -58,8 +224,13 @@ class AsyncPokerGameDB(object):
         :return: None if the game was not found, otherwise pointer to the Poker object
         """
         await asyncio.sleep(self._QUERY_TIME)  # simulate query time
-        return self._current_games.get(room_number, None)
+        try:
+            self._touch(room_number)
+        except KeyError:
+            return None
+        return self._current_games[room_number]
 
+    @traced('db.get_game_info')
     async def get_game_info(self, room_number: str):
         """
         Asks the database for num_players, list of players, and termination password for a specific game.
@@ -67,4 +238,44 @@ class AsyncPokerGameDB(object):
         :param room_number: the room number of the specific game
         :return: list of players in the game game_id
         """
+        self._touch(room_number)
         return self._current_games_info[room_number]
+
+    @traced('db.add_player')
+    async def add_player(self, room_number: str, username: str) -> int:
+        """
+        Asks the database to seat a player in a specific game.
+
+        :raises: KeyError if the game was not found
+        :raises: ValueError if the game is already full
+        :param room_number: the room number of the specific game
+        :param username: the username of the player joining
+        :return: the index of the player within the game
+        """
+        self._touch(room_number)
+        game_info = self._current_games_info[room_number]
+        if len(game_info.players) == game_info.num_players:
+            raise ValueError('Room is full; cannot add player!')
+        await asyncio.sleep(self._QUERY_TIME)  # simulate query time
+        game_info.players.append(username)
+        self.lobby.player_joined(room_number)
+        return game_info.players.index(username)
+
+    @traced('db.remove_player')
+    async def remove_player(self, room_number: str, username: str):
+        """
+        Asks the database to free a player's seat in a specific game. Players can only leave before the initial deal,
+        since player indices are fixed once cards are dealt.
+
+        :raises: KeyError if the game was not found
+        :raises: ValueError if the player is not in the game or the cards were already dealt
+        :param room_number: the room number of the specific game
+        :param username: the username of the player leaving
+        """
+        self._touch(room_number)
+        game_info = self._current_games_info[room_number]
+        if any(self._current_games[room_number].get_player_stacks()):
+            raise ValueError('Cannot leave a game in progress!')
+        await asyncio.sleep(self._QUERY_TIME)  # simulate query time
+        game_info.players.remove(username)
+        self.lobby.player_left(room_number)
@@ -0,0 +1,298 @@
+from typing import List, Tuple, Dict, Sequence, Optional, Iterator
+from dataclasses import dataclass
+from concurrent.futures import ProcessPoolExecutor
+import argparse
+import itertools
+import math
+import os
+import random
+from poker.poker import Card, CARDS, card_to_code, hand_strength
+
+_RANKS = '23456789TJQKA'
+_SUITS = {'s': 'S', 'h': 'H', 'c': 'C', 'd': 'D'}
+Combo = Tuple[int, int]  # the two card codes of a starting hand, lower code first
+Range = Dict[Combo, float]  # combo -> weight
+
+
+def parse_card(text: str) -> Card:
+    """
+    :param text: a card such as 'As' or 'Td'
+    :return: the card
+    """
+    if len(text) != 2 or text[0].upper() not in _RANKS or text[1].lower() not in _SUITS:
+        raise ValueError(f'Invalid card "{text}".')
+    return Card(_SUITS[text[1].lower()], _RANKS.index(text[0].upper()) + 2)
+
+
+def parse_board(text: str) -> List[Card]:
+    """
+    :param text: cards without separators, e.g. 'AsKd7c'
+    :return: the cards
+    """
+    text = text.replace(' ', '')
+    return [parse_card(text[i:i + 2]) for i in range(0, len(text), 2)]
+
+
+def _combo(card_1: Card, card_2: Card) -> Combo:
+    code_1, code_2 = card_to_code(card_1), card_to_code(card_2)
+    return (code_1, code_2) if code_1 < code_2 else (code_2, code_1)
+
+
+def _class_combos(high: int, low: int, kind: str) -> List[Combo]:
+    """
+    :param high: the higher card number
+    :param low: the lower card number; equal to high for a pair
+    :param kind: 's' for suited, 'o' for offsuit, '' for both
+    :return: every combo of a starting hand class such as AKs
+    """
+    combos = []
+    for suit_1, suit_2 in itertools.product(_SUITS.values(), repeat=2):
+        if high == low and suit_1 >= suit_2:
+            continue
+        if high != low and ((kind == 's' and suit_1 != suit_2) or (kind == 'o' and suit_1 == suit_2)):
+            continue
+        combos.append(_combo(Card(suit_1, high), Card(suit_2, low)))
+    return combos
+
+
+def chen_score(high: int, low: int, suited: bool) -> int:
+    """
+    Bill Chen's quick score of a starting hand; a higher score is a stronger hand.
+
+    :param high: the higher card number
+    :param low: the lower card number
+    :param suited: whether the cards are of the same suit
+    :return: the score, rounded up
+    """
+    score = {14: 10, 13: 8, 12: 7, 11: 6}.get(high, high / 2)
+    if high == low:
+        return math.ceil(max(5, score * 2))
+    gap = high - low - 1
+    score += 2 if suited else 0
+    score -= (0, 1, 2, 4)[gap] if gap < 4 else 5
+    if gap <= 1 and high < 12:
+        score += 1
+    return math.ceil(score)
+
+
+def _starting_hand_classes() -> List[Tuple[int, int, str]]:
+    """
+    :return: the 169 starting hand classes as (high, low, 's'/'o'/''), strongest first by chen_score
+    """
+    classes = []
+    for high in range(2, 15):
+        for low in range(2, high + 1):
+            for kind in (('',) if high == low else ('s', 'o')):
+                classes.append((high, low, kind))
+    return sorted(classes, key=lambda hand_class: (chen_score(hand_class[0], hand_class[1], hand_class[2] == 's'),
+                                                   hand_class[0], hand_class[1], hand_class[2] == 's'), reverse=True)
+
+
+def _top_percent(percent: float) -> List[Combo]:
+    combos = []
+    for high, low, kind in _starting_hand_classes():
+        if len(combos) >= 1326 * percent / 100:
+            break
+        combos.extend(_class_combos(high, low, kind))
+    return combos
+
+
+def _parse_class(text: str) -> Tuple[int, int, str]:
+    if len(text) not in (2, 3) or text[0] not in _RANKS or text[1] not in _RANKS or text[2:] not in ('', 's', 'o'):
+        raise ValueError(f'Invalid starting hand "{text}".')
+    high, low = sorted((_RANKS.index(text[0]) + 2, _RANKS.index(text[1]) + 2), reverse=True)
+    if high == low and text[2:]:
+        raise ValueError(f'A pair cannot be suited or offsuit: "{text}".')
+    return high, low, text[2:]
+
+
+def _parse_token(token: str) -> List[Combo]:
+    lowered = token.lower()
+    if lowered in ('random', 'any'):
+        return list(itertools.combinations(range(52), 2))
+    if lowered in ('pairs', 'pocket pairs'):
+        return [combo for number in range(2, 15) for combo in _class_combos(number, number, '')]
+    if lowered.endswith('%'):
+        return _top_percent(float(lowered[:-1].replace('top', '').strip()))
+    if len(token) == 4 and token[1].lower() in _SUITS and token[3].lower() in _SUITS:
+        return [_combo(parse_card(token[:2]), parse_card(token[2:]))]
+    if token.endswith('+'):
+        high, low, kind = _parse_class(token[:-1].upper().replace('S', 's').replace('O', 'o'))
+        if high == low:  # e.g. TT+: TT up to AA
+            return [combo for number in range(low, 15) for combo in _class_combos(number, number, '')]
+        # e.g. A2s+: the kicker goes up to one below the high card
+        return [combo for kicker in range(low, high) for combo in _class_combos(high, kicker, kind)]
+    if '-' in token:
+        first, last = (_parse_class(part.strip().upper().replace('S', 's').replace('O', 'o'))
+                       for part in token.split('-'))
+        if first[0] == first[1] and last[0] == last[1]:  # e.g. 22-55
+            return [combo for number in range(min(first[0], last[0]), max(first[0], last[0]) + 1)
+                    for combo in _class_combos(number, number, '')]
+        if first[0] != last[0] or first[2] != last[2]:
+            raise ValueError(f'Invalid range "{token}": both ends need the same high card and suitedness.')
+        return [combo for kicker in range(min(first[1], last[1]), max(first[1], last[1]) + 1)
+                for combo in _class_combos(first[0], kicker, first[2])]
+    return _class_combos(*_parse_class(token.upper().replace('S', 's').replace('O', 'o')))
+
+
+def parse_range(text: str) -> Range:
+    """
+    Parses a weighted hand range: comma-separated parts, each optionally followed by ":weight" (default 1). A part
+    is a starting hand (AA, AKs, AKo, AK), a run of them (TT+, A2s+, 22-55, A5s-A2s), exact cards (AsKh),
+    "top 15%" (the strongest 15% of combos by chen_score), "pairs" or "random". Later parts override the weight of
+    combos named earlier.
+
+    :param text: the range, e.g. "QQ+, AKs, AJs-ATs:0.5"
+    :return: dict of combo to weight
+    """
+    the_range: Range = {}
+    for token in text.split(','):
+        token = token.strip()
+        if not token:
+            continue
+        weight = 1.0
+        if ':' in token:
+            token, weight_text = token.rsplit(':', 1)
+            token, weight = token.strip(), float(weight_text)
+        for combo in _parse_token(token):
+            the_range[combo] = weight
+    if not the_range:
+        raise ValueError(f'Empty range "{text}".')
+    return the_range
+
+
+def combo_name(combo: Combo) -> str:
+    return ''.join(_RANKS[CARDS[code].number - 2] + CARDS[code].suit.lower()
+                   for code in sorted(combo, key=lambda code: CARDS[code].number, reverse=True))
+
+
+@dataclass
+class EquityResult:
+    equities: List[float]  # weighted equity of each range
+    combo_equities: List[Dict[str, float]]  # equity of each combo of each range that could be dealt
+    boards: int  # number of complete boards evaluated
+    exhaustive: bool  # every runout was enumerated, rather than sampled
+
+
+def _board_chunk(ranges: List[Range], boards: List[Tuple[int, ...]]) -> Tuple[List[Dict[Combo, float]],
+                                                                               List[Dict[Combo, float]]]:
+    """
+    Plays every range against the others on each complete board.
+
+    Each combo is evaluated once per board, and the matchups then only compare the precomputed strengths. Combos
+    that share a card with the board or with each other are never dealt together.
+
+    :return: (weighted pot shares won, total weights) per combo of each range
+    """
+    won: List[Dict[Combo, float]] = [{} for _ in ranges]
+    weights: List[Dict[Combo, float]] = [{} for _ in ranges]
+    for board in boards:
+        board_cards = [CARDS[code] for code in board]
+        board_set = set(board)
+        live = []
+        for the_range in ranges:
+            strengths = {}
+            for combo, weight in the_range.items():
+                if combo[0] in board_set or combo[1] in board_set:
+                    continue
+                strengths[combo] = (max(hand_strength(hand) for hand in itertools.combinations(
+                    [CARDS[combo[0]], CARDS[combo[1]]] + board_cards, 5)), weight)
+            live.append(list(strengths.items()))
+        for matchup in itertools.product(*live):
+            cards = [code for combo, _ in matchup for code in combo]
+            if len(set(cards)) != len(cards):
+                continue
+            weight = 1.0
+            for _, (_, combo_weight) in matchup:
+                weight *= combo_weight
+            best = max(strength for _, (strength, _) in matchup)
+            winners = sum(strength == best for _, (strength, _) in matchup)
+            for range_idx, (combo, (strength, _)) in enumerate(matchup):
+                weights[range_idx][combo] = weights[range_idx].get(combo, 0.0) + weight
+                if strength == best:
+                    won[range_idx][combo] = won[range_idx].get(combo, 0.0) + weight / winners
+    return won, weights
+
+
+def _runouts(board: Sequence[Card], samples: int, max_exhaustive: int,
+             rng: random.Random) -> Tuple[List[Tuple[int, ...]], bool]:
+    known = [card_to_code(card) for card in board]
+    deck = [code for code in range(52) if code not in known]
+    missing = 5 - len(board)
+    if math.comb(len(deck), missing) <= max_exhaustive:
+        return [tuple(known) + rest for rest in itertools.combinations(deck, missing)], True
+    return [tuple(known) + tuple(rng.sample(deck, missing)) for _ in range(samples)], False
+
+
+def _chunks(items: List, num_chunks: int) -> Iterator[List]:
+    for chunk_idx in range(num_chunks):
+        chunk = items[chunk_idx::num_chunks]
+        if chunk:
+            yield chunk
+
+
+def range_equity(ranges: List[Range], board: Sequence[Card] = (), samples: int = 2000, max_exhaustive: int = 2000,
+                 workers: Optional[int] = None, seed: Optional[int] = None) -> EquityResult:
+    """
+    Computes the showdown equity of two or more ranges on a board.
+
+    Every runout of the board is enumerated when there are at most max_exhaustive of them (e.g. from the flop on);
+    otherwise samples random runouts are played. The runouts are split over a process pool, and each worker plays
+    every allowed combination of combos on each of its boards.
+
+    :param ranges: the ranges, e.g. from parse_range()
+    :param board: the community cards dealt so far, 0 to 5
+    :param samples: number of random runouts when not enumerating
+    :param max_exhaustive: largest number of runouts to enumerate
+    :param workers: number of processes; one per core if None, and no pool if 1
+    :param seed: seed for the sampled runouts; random if None
+    :return: the equities
+    """
+    if len(ranges) < 2:
+        raise ValueError('At least two ranges are needed.')
+    boards, exhaustive = _runouts(board, samples, max_exhaustive, random.Random(seed))
+    won: List[Dict[Combo, float]] = [{} for _ in ranges]
+    weights: List[Dict[Combo, float]] = [{} for _ in ranges]
+    if workers == 1:
+        results = [_board_chunk(ranges, boards)]
+    else:
+        workers = workers or os.cpu_count()
+        with ProcessPoolExecutor(workers) as pool:
+            results = list(pool.map(_board_chunk, itertools.repeat(ranges), _chunks(boards, 4 * workers)))
+    for chunk_won, chunk_weights in results:
+        for range_idx in range(len(ranges)):
+            for combo, weight in chunk_weights[range_idx].items():
+                weights[range_idx][combo] = weights[range_idx].get(combo, 0.0) + weight
+            for combo, share in chunk_won[range_idx].items():
+                won[range_idx][combo] = won[range_idx].get(combo, 0.0) + share
+    total_weight = sum(weights[0].values())
+    if total_weight == 0:
+        raise ValueError('The ranges cannot be dealt together on this board.')
+    return EquityResult(
+        [sum(won[range_idx].values()) / total_weight for range_idx in range(len(ranges))],
+        [{combo_name(combo): won[range_idx].get(combo, 0.0) / weight
+          for combo, weight in weights[range_idx].items()} for range_idx in range(len(ranges))],
+        len(boards), exhaustive)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Equity of hand ranges against each other.')
+    parser.add_argument('ranges', nargs='+', help='two or more ranges, e.g. "top 15%%" "pairs"')
+    parser.add_argument('--board', default='', help='community cards, e.g. AsKd7c')
+    parser.add_argument('--samples', type=int, default=2000, help='random runouts when not enumerating')
+    parser.add_argument('--workers', type=int, default=None, help='processes (default: one per core)')
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--combos', action='store_true', help='also print the equity of every combo')
+    args = parser.parse_args()
+    result = range_equity([parse_range(text) for text in args.ranges], parse_board(args.board), args.samples,
+                          workers=args.workers, seed=args.seed)
+    print(f'{result.boards:,} {"enumerated" if result.exhaustive else "sampled"} boards')
+    for text, equity, combo_equities in zip(args.ranges, result.equities, result.combo_equities):
+        print(f'{text}: {100 * equity:.2f}%')
+        if args.combos:
+            for combo, combo_equity in sorted(combo_equities.items(), key=lambda item: -item[1]):
+                print(f'    {combo}: {100 * combo_equity:.2f}%')
+
+
+if __name__ == '__main__':
+    main()
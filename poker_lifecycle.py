@@ -0,0 +1,161 @@
+from typing import Optional, Set
+from dataclasses import dataclass
+import asyncio
+import sys
+import time
+from poker_db import AsyncPokerGameDB
+from poker_cache import AsyncPokerGameCache
+from spectator_feed import SpectatorFeed
+from action_clock import ActionClock
+from poker_wal import WriteAheadLog
+
+# Write-ahead log command recording that a sweep deleted a room, e.g. "room_deleted 2"
+ROOM_DELETED = "room_deleted"
+
+
+def _deep_sizeof(obj, seen=None) -> int:
+    """
+    Approximates the memory held by an object graph by summing sys.getsizeof over every reachable object once.
+
+    :param obj: root of the object graph
+    :param seen: ids of objects already counted
+    :return: size in bytes
+    """
+    if seen is None:
+        seen = set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(_deep_sizeof(k, seen) + _deep_sizeof(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(_deep_sizeof(i, seen) for i in obj)
+    elif hasattr(obj, '__dict__'):
+        size += _deep_sizeof(vars(obj), seen)
+    elif hasattr(obj, '__slots__'):
+        size += sum(_deep_sizeof(getattr(obj, slot), seen)
+                    for slot in obj.__slots__ if hasattr(obj, slot))
+    return size
+
+
+@dataclass
+class LifecycleStats:
+    hibernations: int = 0
+    deletions: int = 0
+    sweeps: int = 0
+
+
+def _deletion_logged(committed):
+    if committed.exception() is not None:
+        print(f'Error "{committed.exception()}" while logging a room deletion.')
+
+
+class RoomLifecycleManager(object):
+    """
+    Keeps memory use of AsyncPokerGameDB bounded.
+
+    Each sweep hibernates rooms that have been idle for idle_timeout seconds to disk (the DB rehydrates them on their
+    next access), deletes finished rooms after finished_retention seconds, and deletes any room, finished or not,
+    after retention seconds without activity.
+
+    Activity is recorded by the DB itself, so reads served by an AsyncPokerGameCache only count once per cache TTL;
+    keep idle_timeout well above the cache TTL.
+    """
+    def __init__(self, game_db: AsyncPokerGameDB, cache: Optional[AsyncPokerGameCache] = None,
+                 idle_timeout: float = 600, finished_retention: float = 3600, retention: float = 86400,
+                 spectators: Optional[SpectatorFeed] = None, action_clock: Optional[ActionClock] = None,
+                 wal: Optional[WriteAheadLog] = None):
+        """
+        Constructor for the lifecycle manager.
+
+        :param game_db: the game database to manage
+        :param cache: cache in front of game_db whose entries must be dropped when a room leaves memory
+        :param idle_timeout: seconds without activity before a room is hibernated
+        :param finished_retention: seconds without activity before a finished room is deleted
+        :param retention: seconds without activity before any room is deleted
+        :param spectators: spectator feed whose retained view of a deleted room must be cleared
+        :param action_clock: action clock whose turn timer of a deleted room must be stopped
+        :param wal: write-ahead log that records deletions, so recovery does not bring deleted rooms back
+        """
+        self._game_db = game_db
+        self._cache = cache
+        self._idle_timeout = idle_timeout
+        self._finished_retention = finished_retention
+        self._retention = retention
+        self._spectators = spectators
+        self._action_clock = action_clock
+        self._wal = wal
+        self._finished_hibernated: Set[str] = set()
+        self.stats = LifecycleStats()
+
+    @staticmethod
+    def _is_finished(the_game) -> bool:
+        # the_river pays out the pot after the fifth community card, which ends the hand.
+        return len(the_game.get_community_stack()) == 5 and the_game.the_pot == 0
+
+    def _forget(self, room_number: str):
+        if self._cache is not None:
+            self._cache.invalidate(room_number)
+
+    def sweep(self, now: Optional[float] = None):
+        """
+        Hibernates idle rooms and deletes expired ones. With a write-ahead log, must run inside the event loop.
+
+        :param now: current time.monotonic() value; defaults to the real clock
+        """
+        if now is None:
+            now = time.monotonic()
+        self.stats.sweeps += 1
+        for room_number, last_activity in list(self._game_db.last_activity.items()):
+            if self._game_db.is_room_locked(room_number):
+                continue  # a command is working on the room's objects right now
+            idle = now - last_activity
+            if self._game_db.is_hibernated(room_number):
+                finished = room_number in self._finished_hibernated
+            else:
+                finished = self._is_finished(self._game_db._current_games[room_number])
+            if idle >= self._retention or (finished and idle >= self._finished_retention):
+                self._forget(room_number)
+                self._game_db.delete_game(room_number)
+                if self._wal is not None:
+                    # Logged before any later command can reuse the room number
+                    self._wal.append_nowait(ROOM_DELETED + room_number).add_done_callback(_deletion_logged)
+                if self._spectators is not None:
+                    self._spectators.mark_dirty(room_number)
+                if self._action_clock is not None:
+                    self._action_clock.stop(room_number)
+                self._finished_hibernated.discard(room_number)
+                self.stats.deletions += 1
+            elif idle >= self._idle_timeout and not self._game_db.is_hibernated(room_number):
+                self._forget(room_number)
+                self._game_db.hibernate_game(room_number)
+                if finished:
+                    self._finished_hibernated.add(room_number)
+                self.stats.hibernations += 1
+            elif not self._game_db.is_hibernated(room_number):
+                self._finished_hibernated.discard(room_number)  # rehydrated since the last sweep
+
+    def memory_per_room(self) -> float:
+        """
+        Average approximate bytes held in memory by each resident room (Poker object plus PokerGameInfo).
+
+        :return: bytes per resident room; 0 if no room is resident
+        """
+        rooms = self._game_db.resident_rooms()
+        if not rooms:
+            return 0.0
+        total = sum(_deep_sizeof((self._game_db._current_games[room_number],
+                                  self._game_db._current_games_info[room_number]))
+                    for room_number in rooms)
+        return total / len(rooms)
+
+    async def run(self, interval: float = 60):
+        """
+        Sweeps forever, once every interval seconds.
+
+        :param interval: seconds between sweeps
+        """
+        while True:
+            await asyncio.sleep(interval)
+            self.sweep()
@@ -0,0 +1,126 @@
+from typing import List, Tuple, Dict, Optional
+from dataclasses import dataclass
+import bisect
+
+
+@dataclass
+class LobbyEntry:
+    room_number: str
+    starting_cash: int
+    num_players: int
+    seated: int
+
+    @property
+    def open_seats(self) -> int:
+        return self.num_players - self.seated
+
+
+class LobbyIndex(object):
+    """
+    Incrementally maintained index of the rooms in the lobby.
+
+    Rooms with open seats are kept sorted by (starting_cash, room_number), so a page of rooms within a starting_cash
+    range is found with one bisection and then read off in order: O(log n + page size) per query.
+    """
+    def __init__(self):
+        self._entries: Dict[str, LobbyEntry] = {}
+        self._open_keys: List[Tuple[int, str]] = []
+        self.version = 0
+
+    @staticmethod
+    def _key(entry: LobbyEntry) -> Tuple[int, str]:
+        return entry.starting_cash, entry.room_number
+
+    def _set_open(self, entry: LobbyEntry, was_open: bool):
+        """
+        Keeps the sorted list of open rooms in sync after an entry's seat count changed.
+
+        :param entry: the lobby entry that changed
+        :param was_open: whether the entry had open seats before the change
+        """
+        key = self._key(entry)
+        if was_open and entry.open_seats <= 0:
+            del self._open_keys[bisect.bisect_left(self._open_keys, key)]
+        elif not was_open and entry.open_seats > 0:
+            bisect.insort(self._open_keys, key)
+        self.version += 1
+
+    def add_room(self, room_number: str, num_players: int, starting_cash: int):
+        """
+        Adds an empty room to the lobby.
+
+        :param room_number: room number
+        :param num_players: number of seats in the room
+        :param starting_cash: amount of money each player starts with
+        """
+        entry = LobbyEntry(room_number, starting_cash, num_players, 0)
+        self._entries[room_number] = entry
+        self._set_open(entry, was_open=False)
+
+    def remove_room(self, room_number: str):
+        """
+        Removes a room from the lobby. Does nothing if the room is not in the lobby.
+
+        :param room_number: room number
+        """
+        entry = self._entries.pop(room_number, None)
+        if entry is None:
+            return
+        was_open = entry.open_seats > 0
+        entry.seated = entry.num_players
+        self._set_open(entry, was_open)
+
+    def player_joined(self, room_number: str):
+        """
+        Records that a seat in a room was taken.
+
+        :param room_number: room number
+        """
+        entry = self._entries[room_number]
+        was_open = entry.open_seats > 0
+        entry.seated += 1
+        self._set_open(entry, was_open)
+
+    def player_left(self, room_number: str):
+        """
+        Records that a seat in a room was freed.
+
+        :param room_number: room number
+        """
+        entry = self._entries[room_number]
+        was_open = entry.open_seats > 0
+        entry.seated -= 1
+        self._set_open(entry, was_open)
+
+    def get(self, room_number: str) -> Optional[LobbyEntry]:
+        return self._entries.get(room_number)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def open_rooms(self, min_cash: int = 0, max_cash: Optional[int] = None, limit: int = 20,
+                   after: Optional[Tuple[int, str]] = None) -> Tuple[List[LobbyEntry], Optional[Tuple[int, str]]]:
+        """
+        Returns one page of rooms with open seats, ordered by starting cash and then room number.
+
+        :param min_cash: lowest starting_cash to include
+        :param max_cash: highest starting_cash to include; None for no upper bound
+        :param limit: page size
+        :param after: cursor returned with the previous page; None for the first page
+        :return: (page of lobby entries, cursor for the next page or None if this was the last page)
+        """
+        if after is None or after < (min_cash, ''):
+            start = bisect.bisect_left(self._open_keys, (min_cash, ''))
+        else:
+            start = bisect.bisect_right(self._open_keys, after)
+        page = []
+        for key in self._open_keys[start:start + limit]:
+            if max_cash is not None and key[0] > max_cash:
+                return page, None
+            page.append(self._entries[key[1]])
+        next_idx = start + len(page)
+        if not page or next_idx >= len(self._open_keys):
+            return page, None
+        if max_cash is not None and self._open_keys[next_idx][0] > max_cash:
+            return page, None
+        return page, self._key(page[-1])
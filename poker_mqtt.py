@@ -1,58 +1,347 @@
 import asyncio
+import functools
+import json
+import os
+import secrets
+from typing import Set, Union
 from asyncio_mqtt import Client, MqttError
-from poker_db import AsyncPokerGameDB
-from user_db import UserDB
+from tracing import TRACER, JsonLinesExporter
+from poker_capture import CaptureWriter, CapturedCommand, CapturingClient, redact_command
+import event_loop
+
+# Game commands written to the write-ahead log. User accounts are not rebuilt from the log.
+LOGGED_COMMANDS = ("create_game", "add_player_to_game", "remove_player_from_game", "init_game", "bet", "check",
+                   "the_flop", "the_turn", "the_river")
+# Commands a player sends on their own behalf. They end with ", session_token" from the login command, and the
+# token must belong to the username given in the command.
+AUTHENTICATED_COMMANDS = ("add_player_to_game", "remove_player_from_game", "bet", "check")
+BROKER_HOST = "localhost"
+CHECKPOINT_EVERY = 1000  # [records]
+LOBBY_PAGE_SIZE = 50
+TRACE_SAMPLE_RATE = 0.01  # fraction of commands traced end to end
+CAPTURE_PATH = None  # e.g. 'capture.jsonl' to record every accepted command for poker_replay.py
+TURN_TIMEOUT = 30  # [seconds] a player gets to act before being checked automatically
+# The account store lives beside the server rather than in whatever directory it happens to be started from
+ACCOUNTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'user_accounts')
+
+
+class PokerServer(object):
+    """
+    The server's databases, logs and background services.
 
-USER_DB = UserDB()
-POKER_DB = AsyncPokerGameDB(USER_DB)
+    Each part is created the first time it is used, so importing this module does not load the password hashing
+    library or touch the files under the working directory, and a process only builds the parts it needs.
+    """
+    def __init__(self, accounts_dir: str = ACCOUNTS_DIR, capture_path: str = None,
+                 trace_path: str = 'traces.jsonl', trace_sample_rate: float = TRACE_SAMPLE_RATE,
+                 turn_timeout: float = TURN_TIMEOUT):
+        """
+        Constructor for the server.
+
+        :param accounts_dir: directory of the user account store
+        :param capture_path: file to record every accepted command to for poker_replay.py; no capture if None
+        :param trace_path: file the sampled traces are written to
+        :param trace_sample_rate: fraction of commands traced end to end
+        :param turn_timeout: seconds a player gets to act before being checked automatically
+        """
+        self._accounts_dir = accounts_dir
+        self._capture_path = capture_path
+        self._trace_path = trace_path
+        self._trace_sample_rate = trace_sample_rate
+        self._turn_timeout = turn_timeout
+        self.published_lobby_version = -1
+        self.replaying = False  # True while recover() replays the write-ahead log
+        self.command_tasks: Set[asyncio.Task] = set()  # strong references, so running commands are not collected
+
+    @functools.cached_property
+    def user_db(self):
+        from user_db import UserDB
+        from user_store import ShardedAccountStore
+        return UserDB(accounts=ShardedAccountStore(self._accounts_dir))
+
+    @functools.cached_property
+    def poker_db(self):
+        from poker_db import AsyncPokerGameDB
+        return AsyncPokerGameDB(self.user_db)
+
+    @functools.cached_property
+    def poker_cache(self):
+        from poker_cache import AsyncPokerGameCache
+        return AsyncPokerGameCache(self.poker_db)
+
+    @functools.cached_property
+    def spectators(self):
+        from spectator_feed import SpectatorFeed
+        return SpectatorFeed(self.poker_db, tick_interval=0.2)
+
+    @functools.cached_property
+    def lifecycle(self):
+        from poker_lifecycle import RoomLifecycleManager
+        return RoomLifecycleManager(self.poker_db, self.poker_cache, spectators=self.spectators,
+                                    action_clock=self.action_clock, wal=self.wal)
+
+    @functools.cached_property
+    def wal(self):
+        from poker_wal import WriteAheadLog
+        return WriteAheadLog()
+
+    @functools.cached_property
+    def hand_history(self):
+        from hand_history import HandHistoryWriter
+        return HandHistoryWriter()
+
+    @functools.cached_property
+    def action_clock(self):
+        from action_clock import ActionClock
+        return ActionClock(_turn_timed_out, self._turn_timeout)
+
+    @functools.cached_property
+    def capture(self) -> Union[CaptureWriter, None]:
+        return CaptureWriter(self._capture_path) if self._capture_path else None
+
+    @functools.cached_property
+    def tracer(self):
+        TRACER.configure(self._trace_sample_rate, JsonLinesExporter(self._trace_path))
+        return TRACER
+
+
+SERVER = PokerServer(capture_path=CAPTURE_PATH)
+
+
+def _turn_timed_out(client, room_number, username):
+    # Act for the player as if they had sent the command themselves
+    command_task = dispatch(client, "check" + room_number + "," + username, authenticated=True)
+    command_task.add_done_callback(functools.partial(_timeout_action_done, room_number, username))
+
+
+def _timeout_action_done(room_number, username, command_task: asyncio.Task):
+    if command_task.cancelled() or command_task.exception() is not None:
+        # The check never reached the clock, so stop waiting for it
+        SERVER.action_clock.timeout_failed(room_number, username)
 
 
 async def message_handler():
     """
     Runs the MQTT client and handles messages via topic filters.
     """
-    async with Client("localhost") as client:
+    async with Client(BROKER_HOST) as client:
         await client.subscribe("game_command")
-        async with client.unfiltered_messages() as messages:
-            async for message in messages:
-                message_str = message.payload.decode()
+        # Spectators get coalesced room updates on a fixed tick instead of every publish of every command
+        spectator_task = asyncio.create_task(SERVER.spectators.run(client))
+        # One timing wheel runs the turn timers of every room
+        clock_task = asyncio.create_task(SERVER.action_clock.run(client))
+        try:
+            async with client.unfiltered_messages() as messages:
+                async for message in messages:
+                    dispatch(client, message.payload.decode())
+        finally:
+            spectator_task.cancel()
+            clock_task.cancel()
+
+
+def dispatch(client, message_str, seed: int = None, authenticated: bool = False) -> asyncio.Task:
+    """
+    Starts running a command message in its own task.
+
+    :param client: The MQTT client
+    :param message_str: The whole message string
+    :param seed: Seed for shuffling the deck if the command creates a game; random if None
+    :param authenticated: The message was authenticated already and carries no session token, e.g. in a replay
+    :return: The command's task
+    """
+    # Commands run concurrently; commands on the same room are serialized by the room's lock
+    command_task = asyncio.create_task(run_command(client, message_str, seed, authenticated))
+    SERVER.command_tasks.add(command_task)
+    command_task.add_done_callback(SERVER.command_tasks.discard)
+    command_task.add_done_callback(_command_done)
+    return command_task
+
+
+def _command_done(command_task: asyncio.Task):
+    if not command_task.cancelled() and command_task.exception() is not None:
+        print(f'Error "{command_task.exception()}" while handling a command.')
+
+
+def _command_room_number(message_str) -> Union[str, None]:
+    """
+    Extracts the room number a game command applies to.
+
+    :param message_str: The whole message string
+    :return: The room number, or None for commands that are not tied to a room
+    """
+    if not message_str.startswith(LOGGED_COMMANDS):
+        return None
+    command = message_str.split(" ", 1)[0]
+    return message_str.replace(command, '', 1).split(",")[0]
+
+
+async def run_command(client, message_str, seed: int = None, authenticated: bool = False):
+    """
+    Logs and runs a single command message while holding its room's lock, then publishes the lobby if it changed.
+
+    :param client: The MQTT client
+    :param message_str: The whole message string
+    :param seed: Seed for shuffling the deck if the command creates a game; random if None
+    :param authenticated: The message was authenticated already and carries no session token
+    """
+    arrival = SERVER.capture.now() if SERVER.capture is not None else 0.0
+    with SERVER.tracer.span('game_command', command=message_str.split(" ", 1)[0]) as command_span:
+        if command_span is not None:
+            client = _TracedClient(client)
+        if message_str.startswith(AUTHENTICATED_COMMANDS) and not authenticated:
+            message_str = await authenticate(client, message_str)
+        if seed is None and message_str.startswith("create_game"):
+            seed = secrets.randbits(32)
+        capturing_client = CapturingClient(client) if SERVER.capture is not None else None
+        failed = True
+        try:
+            await _apply_command(capturing_client or client, message_str, seed)
+            failed = False
+        finally:
+            if capturing_client is not None:
+                SERVER.capture.write(CapturedCommand(arrival, redact_command(message_str), seed,
+                                              capturing_client.publishes, failed))
+        if SERVER.wal.records_since_checkpoint >= CHECKPOINT_EVERY:
+            with SERVER.tracer.span('wal.checkpoint'):
+                await SERVER.wal.checkpoint(SERVER.poker_db.dump_rooms)
+
+
+async def _apply_command(client, message_str, seed):
+    room_number = _command_room_number(message_str)
+    if room_number is None:
+        await handle_command(client, message_str, seed)
+    else:
+        async with SERVER.wal.command(), SERVER.poker_db.room_lock(room_number):
+            # Make the command durable before any of its effects are published
+            with SERVER.tracer.span('wal.append'):
+                await SERVER.wal.append(message_str, seed)
+            await handle_command(client, message_str, seed)
+        SERVER.spectators.mark_dirty(room_number)
+    await publish_lobby(client)
+
+
+class _TracedClient(object):
+    """
+    Wraps the MQTT client of a traced command so every publish gets a span.
+    """
+    def __init__(self, client):
+        self._client = client
+
+    async def publish(self, topic, payload=None, qos=0, retain=False):
+        with SERVER.tracer.span('mqtt.publish', topic=topic):
+            await self._client.publish(topic, payload, qos=qos, retain=retain)
+
+
+async def authenticate(client, message_str):
+    """
+    Checks the session token at the end of a player command against the command's username.
 
-                if message_str.startswith("create_user"):
-                    # Delete the command portion of the message ("create_user")
-                    message_params = message_str.replace("create_user", '')
-                    # Then feed the remaining message of only the parameter(s) (username).
-                    await create_user(client, message_params, test=False)
+    :param client: The MQTT client
+    :param message_str: The whole message string, ending with ", session_token"
+    :return: The message string without the session token
+    """
+    message_str, token = message_str.rsplit(",", 1)
+    command = message_str.split(" ", 1)[0]
+    username = message_str.replace(command, '', 1).split(",")[1]
+    if SERVER.user_db.check_session(token.strip()) != username:
+        await client.publish("users/" + str(username) + "/error", "Invalid session!", qos=1)
+        raise MqttError("Invalid session!")
+    return message_str
+
+
+async def handle_command(client, message_str, seed: int = None):
+    """
+    Runs a single game command message.
+
+    :param client: The MQTT client
+    :param message_str: The whole message string
+    :param seed: Seed for shuffling the deck of a game created by this command
+    """
+    if message_str.startswith("create_user"):
+        # Delete the command portion of the message ("create_user")
+        message_params = message_str.replace("create_user", '', 1)
+        # Then feed the remaining message of only the parameter(s) (username).
+        await create_user(client, message_params, test=False)
+
+    elif message_str.startswith("login"):
+        message_params = message_str.replace("login", '', 1)
+        await login(client, message_params, test=False)
 
-                elif message_str.startswith("create_game"):
-                    message_params = message_str.replace("create_game", '')
-                    await create_game(client, message_params, test=False)
+    elif message_str.startswith("logout"):
+        message_params = message_str.replace("logout", '', 1)
+        await logout(client, message_params)
 
-                elif message_str.startswith("add_player_to_game"):
-                    message_params = message_str.replace("add_player_to_game", '')
-                    await add_player_to_game(client, message_params, test=False)
+    elif message_str.startswith("create_game"):
+        message_params = message_str.replace("create_game", '')
+        await create_game(client, message_params, test=False, seed=seed)
 
-                elif message_str.startswith("init_game"):
-                    message_params = message_str.replace("init_game", '')
-                    await init_game(client, message_params)
+    elif message_str.startswith("add_player_to_game"):
+        message_params = message_str.replace("add_player_to_game", '')
+        await add_player_to_game(client, message_params, test=False)
 
-                elif message_str.startswith("bet"):
-                    message_params = message_str.replace("bet", '')
-                    await bet(client, message_params)
+    elif message_str.startswith("remove_player_from_game"):
+        message_params = message_str.replace("remove_player_from_game", '')
+        await remove_player_from_game(client, message_params, test=False)
 
-                elif message_str.startswith("the_flop"):
-                    message_params = message_str.replace("the_flop", '')
-                    await the_flop(client, message_params)
+    elif message_str.startswith("init_game"):
+        message_params = message_str.replace("init_game", '')
+        await init_game(client, message_params, test=False)
 
-                elif message_str.startswith("the_turn"):
-                    message_params = message_str.replace("the_turn", '')
-                    await the_turn(client, message_params)
+    elif message_str.startswith("bet"):
+        message_params = message_str.replace("bet", '')
+        await bet(client, message_params, test=False)
 
-                elif message_str.startswith("the_river"):
-                    message_params = message_str.replace("the_river", '')
-                    await the_river(client, message_params)
+    elif message_str.startswith("check"):
+        message_params = message_str.replace("check", '', 1)
+        await check(client, message_params, test=False)
 
+    elif message_str.startswith("the_flop"):
+        message_params = message_str.replace("the_flop", '')
+        await the_flop(client, message_params)
 
-async def create_game(client, message_params, test: bool):
+    elif message_str.startswith("the_turn"):
+        message_params = message_str.replace("the_turn", '')
+        await the_turn(client, message_params)
+
+    elif message_str.startswith("the_river"):
+        message_params = message_str.replace("the_river", '')
+        await the_river(client, message_params)
+
+
+class _ReplayClient(object):
+    """
+    Stands in for the MQTT client while replaying the write-ahead log. The replayed publishes already went out
+    before the crash, so they are dropped.
+    """
+    async def publish(self, topic, payload=None, qos=0, retain=False):
+        pass
+
+
+async def recover():
+    """
+    Rebuilds the game database from the last checkpoint and the write-ahead log records written after it.
+    """
+    from poker_lifecycle import ROOM_DELETED
+    checkpoint_seq, rooms = SERVER.wal.load_checkpoint()
+    SERVER.poker_db.restore_rooms(rooms)
+    replay_client = _ReplayClient()
+    SERVER.replaying = True
+    try:
+        for record in SERVER.wal.read_records(after_seq=checkpoint_seq):
+            if record.command.startswith(ROOM_DELETED):
+                # Deleted by a lifecycle sweep, which is not a command clients can send
+                SERVER.poker_db.delete_game(record.command.replace(ROOM_DELETED, '', 1))
+                continue
+            try:
+                await handle_command(replay_client, record.command, record.seed)
+            except Exception as error:
+                # The command was rejected the same way when it was first handled
+                print(f'Replaying "{record.command}" failed: {error!r}')
+    finally:
+        SERVER.replaying = False
+
+
+async def create_game(client, message_params, test: bool, seed: int = None):
     """
     Creates a game according to user input parameters, and adds the game to the game database.
 
@@ -66,13 +355,15 @@ async def create_game(client, message_params, test: bool):
     :param client: The MQTT client
     :param message_params: The parameters portion of the message string
     :param test: Test mode enable/disable
+    :param seed: Seed for shuffling the game's deck; random if None
     """
 
     message_split = message_params.split(",")
-    await POKER_DB.add_game(room_number=str(message_split[0]),
-                            num_players=int(message_split[1]),
-                            starting_cash=int(message_split[2]))
-    game_info = await POKER_DB.get_game_info(message_split[0])
+    await SERVER.poker_cache.add_game(room_number=str(message_split[0]),
+                               num_players=int(message_split[1]),
+                               starting_cash=int(message_split[2]),
+                               seed=seed)
+    game_info = await SERVER.poker_cache.get_game_info(message_split[0])
     if not test:
         try:
             await client.publish(("game_rooms/" + str(message_split[0])) + "/num_players", game_info.num_players, qos=1)
@@ -92,24 +383,33 @@ async def create_game(client, message_params, test: bool):
 
 async def create_user(client, message_params, test: bool):
     """
-    Adds a user with the input username to the user database, with a randomly generated password.
-    The user must publish a message of his desired username under the designated topic and message format below.
+    Adds a user with the input username and the password the user chose to the user database. Only the password's
+    hash is stored, and the password is never published.
+    The user must publish a message of his desired username and password under the designated topic and message
+    format below.
 
     Topic: "game_command"
-    Message format: "create_user username"
+    Message format: "create_user username, password" (Important: the parameters MUST be separated by a comma!"
 
-    Example: User publishes string message "create_user john_doe" under topic "user_command/create" to create a new
-             user with username john_doe
+    Example: User publishes string message "create_user john_doe, <password>" under topic "game_command" to create a
+             new user with username john_doe
 
     :param client: The MQTT client
     :param message_params: The parameters portion of the message string
     :param test: Test mode enable/disable
-    :return: The username and the password
+    :return: In test mode, the success topic and message
     """
+    message_split = message_params.split(",", 1)
+    username = message_split[0]
+    if len(message_split) < 2 or not message_split[1].strip():
+        await client.publish(("users/" + str(username) + "/error"), "Please choose a password!", qos=1)
+        raise MqttError("Please choose a password!")
     try:
-        new_username, new_password = USER_DB.create_user(message_params)
+        # The password hash is deliberately slow, so it must not hold up the other rooms' commands
+        new_username, _ = await asyncio.get_running_loop().run_in_executor(None, SERVER.user_db.create_user,
+                                                                           username, message_split[1].strip())
     except ValueError:
-        await client.publish(("users/" + str(message_params) + "/error"),
+        await client.publish(("users/" + str(username) + "/error"),
                              "That username already exists!", qos=1)
         raise MqttError("That username already exists!")
     if not test:
@@ -118,6 +418,61 @@ async def create_user(client, message_params, test: bool):
         return "users/" + str(new_username) + "/create_success=True"
 
 
+async def login(client, message_params, test: bool):
+    """
+    Checks a user's password and issues a session token for the user's player commands.
+
+    The token is published sealed with a public key the client sends along (see user_db.new_session_keys()), so
+    only the client holding the private key can read it, even though anyone may subscribe to the topic.
+
+    Topic: "game_command"
+    Message format: "login username, password, public_key" (Important: the parameters MUST be separated by a comma!"
+
+    Example: User publishes string message "login john_doe, <password>, <public key>" under topic "game_command" to
+             get a sealed session token for john_doe under topic "users/john_doe/session"
+
+    :param client: The MQTT client
+    :param message_params: The parameters portion of the message string
+    :param test: Test mode enable/disable
+    :return: In test mode, the sealed session token
+    """
+    from user_db import seal_session
+    # Passwords may contain commas, usernames and public keys do not
+    credentials, _, public_key = message_params.rpartition(",")
+    username, _, password = credentials.partition(",")
+    if not credentials:
+        username = public_key
+    try:
+        # Only login pays for the slow password hash; every later command checks the cheap session token
+        token = await asyncio.get_running_loop().run_in_executor(None, SERVER.user_db.login,
+                                                                 username, password.strip())
+        sealed_token = seal_session(token, public_key.strip())
+    except ValueError:
+        await client.publish("users/" + str(username) + "/error",
+                             "Invalid username, password or public key!", qos=1)
+        raise MqttError("Invalid username, password or public key!")
+    if not test:
+        await client.publish("users/" + str(username) + "/session", sealed_token, qos=1)
+    else:
+        return sealed_token
+
+
+async def logout(client, message_params):
+    """
+    Revokes a session token.
+
+    Topic: "game_command"
+    Message format: "logout username, session_token"
+
+    :param client: The MQTT client
+    :param message_params: The parameters portion of the message string
+    """
+    message_split = message_params.split(",")
+    username = message_split[0]
+    SERVER.user_db.revoke_session(message_split[1].strip())
+    await client.publish("users/" + str(username) + "/session", "", qos=1)
+
+
 async def add_player_to_game(client, message_params, test: bool):
     """
     Adds a player to a game that exists in the database.
@@ -137,17 +492,14 @@ async def add_player_to_game(client, message_params, test: bool):
     room_number = message_split[0]
     username = message_split[1]
     try:
-        game_info = await POKER_DB.get_game_info(room_number)
-        player_list = game_info.players
+        player_idx = await SERVER.poker_cache.add_player(room_number, username)
     except KeyError:
         await client.publish("game_rooms/" + str(room_number) + "/error/",
                              "Please enter message in correct format!", qos=1)
         raise MqttError("Please enter message in correct format!")
-    if len(player_list) == game_info.num_players:
+    except ValueError:
         await client.publish("game_rooms/" + str(room_number) + "Error", "Room is full; cannot add player!", qos=1)
         raise MqttError("Room is full; cannot add player!")
-    player_list.append(username)
-    player_idx = player_list.index(username)
     if not test:
         await client.publish("game_rooms/" + str(room_number) + "/players/" + str(username),
                              "player_idx: "+str(player_idx), qos=1)
@@ -155,6 +507,58 @@ async def add_player_to_game(client, message_params, test: bool):
         return "game_rooms/" + str(room_number) + "/players/" + str(username) + "=" + "player_idx: " + str(player_idx)
 
 
+async def remove_player_from_game(client, message_params, test: bool):
+    """
+    Removes a player from a game that has not been dealt yet, freeing the seat.
+
+    Topic: "game_command"
+    Message format: "remove_player_from_game game_number, username" (Important: the parameters MUST be
+                    separated by a comma!"
+
+    Example: User publishes string message "remove_player_from_game 3, john_doe" under topic "game_command"
+             to remove user john_doe from game room number 3
+
+    :param client: The MQTT client
+    :param message_params: The parameters portion of the message string
+    :param test: Test mode enable/disable
+    """
+    message_split = message_params.split(",")
+    room_number = message_split[0]
+    username = message_split[1]
+    try:
+        await SERVER.poker_cache.remove_player(room_number, username)
+    except (KeyError, ValueError):
+        await client.publish("game_rooms/" + str(room_number) + "/error/",
+                             "Cannot remove player from this game!", qos=1)
+        raise MqttError("Cannot remove player from this game!")
+    if not test:
+        await client.publish("game_rooms/" + str(room_number) + "/players/" + str(username), "", qos=1)
+    else:
+        return "game_rooms/" + str(room_number) + "/players/" + str(username) + "="
+
+
+async def publish_lobby(client, test: bool = False):
+    """
+    Publishes the first page of rooms with open seats to the retained "lobby" topic, if the lobby changed since the
+    last publish.
+
+    :param client: The MQTT client
+    :param test: Test mode enable/disable
+    :return: In test mode, the lobby payload, or None if the lobby did not change
+    """
+    if SERVER.poker_db.lobby.version == SERVER.published_lobby_version:
+        return None
+    SERVER.published_lobby_version = SERVER.poker_db.lobby.version
+    open_rooms, _ = SERVER.poker_db.lobby.open_rooms(limit=LOBBY_PAGE_SIZE)
+    payload = json.dumps([{'room_number': entry.room_number.strip(),
+                           'starting_cash': entry.starting_cash,
+                           'open_seats': entry.open_seats} for entry in open_rooms])
+    if not test:
+        await client.publish("lobby", payload, qos=1, retain=True)
+    else:
+        return payload
+
+
 async def get_game(room_number):
     """
     Gets a game from the poker game database.
@@ -162,7 +566,7 @@ async def get_game(room_number):
     :param room_number: Game room number
     :return: The room's game of poker
     """
-    the_game = await POKER_DB.get_game(room_number)
+    the_game = await SERVER.poker_cache.get_game(room_number)
     if the_game is None:
         raise MqttError("Game not found!")
     return the_game
@@ -176,7 +580,7 @@ async def get_player_idx(room_number, username):
     :param username: The target username
     :return: The index of the user within the game room number
     """
-    game_info = await POKER_DB.get_game_info(room_number)
+    game_info = await SERVER.poker_cache.get_game_info(room_number)
     player_list = game_info.players
     player_idx = player_list.index(username)
     return player_idx
@@ -196,8 +600,9 @@ async def init_game(client, room_number, test: bool):
     :param test: Test mode enable/disable
     """
     the_game = await get_game(room_number)
-    the_game.initial_deal()
-    game_info = await POKER_DB.get_game_info(room_number)
+    with SERVER.tracer.span('poker.initial_deal'):
+        the_game.initial_deal()
+    game_info = await SERVER.poker_cache.get_game_info(room_number)
     player_list = game_info.players
     player_stacks = the_game.get_player_stacks()
     player_cash = the_game.get_player_cash()
@@ -208,6 +613,7 @@ async def init_game(client, room_number, test: bool):
                              str(player_stacks[player_idx]), qos=1)
         await client.publish("game_rooms/" + room_number + "/players/" + player + "/cash",
                              "$"+str(player_cash[player_idx]), qos=1)
+    SERVER.action_clock.start_round(room_number, player_list)
     if not test:
         await client.publish("game_rooms/" + room_number + "/community_cards_and_pot/the_pot", "$0", qos=1)
     else:
@@ -239,8 +645,8 @@ async def bet(client, message_params, test: bool):
     player_cash = the_game.get_player_cash()
 
     # Money flow
-    player_cash[player_idx] -= bet_amount
-    the_game.the_pot += bet_amount
+    the_game.bet(player_idx, bet_amount)
+    SERVER.action_clock.acted(room_number, username)
     if not test:
         await client.publish("game_rooms/" + room_number + "/players/" + username + "/cash",
                              "$" + str(player_cash[player_idx]), qos=1)
@@ -252,6 +658,32 @@ async def bet(client, message_params, test: bool):
         return test_player_cash, test_the_pot
 
 
+async def check(client, message_params, test: bool):
+    """
+    Passes a player's turn without betting. The server checks for a player who does not act within TURN_TIMEOUT.
+
+    Topic: "game_command"
+    Message format: "check room_number, username"
+
+    Example: To check for player1 in game room 2, the user would publish "check 2, player1" under topic "game_command".
+
+    :param client: The MQTT client
+    :param message_params: The parameters portion of the message string
+    :param test: Test mode enable/disable
+    """
+    message_split = message_params.split(",")
+    room_number = message_split[0]
+    username = message_split[1]
+    the_game = await get_game(room_number)
+    player_idx = await get_player_idx(room_number, username)
+    the_game.check(player_idx)
+    SERVER.action_clock.acted(room_number, username)
+    if not test:
+        await client.publish("game_rooms/" + room_number + "/players/" + username + "/action", "check", qos=1)
+    else:
+        return "game_rooms/" + room_number + "/players/" + username + "/action=check"
+
+
 async def the_flop(client, room_number):
     """
     Draw three community cards to reveal the flop.
@@ -265,11 +697,13 @@ async def the_flop(client, room_number):
     :param room_number: The room number
     """
     the_game = await get_game(room_number)
-    for _ in range(3):
-        the_game.community_draw()
+    with SERVER.tracer.span('poker.community_draw', cards=3):
+        for _ in range(3):
+            the_game.community_draw()
     community_stack = the_game.get_community_stack()
     await client.publish("game_rooms/" + room_number + "/community_cards_and_pot/community_cards",
                          str(community_stack), qos=1)
+    SERVER.action_clock.start_round(room_number, (await SERVER.poker_cache.get_game_info(room_number)).players)
 
 
 async def the_turn(client, room_number):
@@ -285,49 +719,65 @@ async def the_turn(client, room_number):
     :param room_number: The room number
     """
     the_game = await get_game(room_number)
-    the_game.community_draw()
+    with SERVER.tracer.span('poker.community_draw', cards=1):
+        the_game.community_draw()
     community_stack = the_game.get_community_stack()
     await client.publish("game_rooms/" + room_number + "/community_cards_and_pot/community_cards",
                          str(community_stack), qos=1)
+    SERVER.action_clock.start_round(room_number, (await SERVER.poker_cache.get_game_info(room_number)).players)
 
 
 async def the_river(client, room_number):
     """
-    Draw one community card to reveal the river and computes the winner. The pot goes to the winner.
+    Draw one community card to reveal the river and settles the showdown. Every pot, main and side, goes to the best
+    hand among the players who bet into it, and tied players split it. The part of a bet nobody matched goes back to
+    the bettor.
 
     Topic: "game_command"
-    Message format: "the_flop room_number"
+    Message format: "the_river room_number"
 
-    Example: To reveal the flop for game room 2, the user would publish "the_flop 2" under topic "game_command".
+    Example: To reveal the river for game room 2, the user would publish "the_river 2" under topic "game_command".
 
     :param client: The MQTT client
     :param room_number: The room number
     """
     the_game = await get_game(room_number)
-    the_game.community_draw()
+    with SERVER.tracer.span('poker.community_draw', cards=1):
+        the_game.community_draw()
     community_stack = the_game.get_community_stack()
     await client.publish("game_rooms/" + room_number + "/community_cards_and_pot/community_cards",
                          str(community_stack), qos=1)
-    # Compute winner
-    game_info = await POKER_DB.get_game_info(room_number)
+    # The showdown ends the hand, so nobody is left to act
+    SERVER.action_clock.stop(room_number)
+    # Rank every player and settle the pots
+    game_info = await SERVER.poker_cache.get_game_info(room_number)
     player_list = game_info.players
-    winning_player_idx = the_game.compute_winner()
-    winning_player_username = player_list[winning_player_idx]
+    with SERVER.tracer.span('poker.showdown'):
+        the_showdown = the_game.showdown()
     player_cash = the_game.get_player_cash()
     best_hands = the_game.get_best_hands()
     player_stacks = the_game.get_player_stacks()
 
+    if not SERVER.replaying:  # the hand was already recorded before the crash
+        try:
+            with SERVER.tracer.span('hand_history.append'):
+                SERVER.hand_history.append(room_number, the_game, the_showdown.ranking[0][0])
+        except Exception as error:
+            # The hand is settled even when it cannot be recorded
+            print(f'Recording the hand of room{room_number} failed: {error!r}')
+
     # Money flow
-    player_cash[winning_player_idx] += the_game.the_pot
-    await client.publish("game_rooms/" + room_number + "/players/" + winning_player_username + "/hand",
-                         str(player_stacks[winning_player_idx]) + "   WINNER! Wins $" +
-                         str(the_game.the_pot) + " with hand type " +
-                         str(best_hands[winning_player_idx]['hand type']) + " (score: " +
-                         str(best_hands[winning_player_idx]['score']) + ")", qos=1)
-    await client.publish("game_rooms/" + room_number + "/players/" + winning_player_username + "/cash",
-                         "$" + str(player_cash[winning_player_idx]), qos=1)
-    # Clear the pot
-    the_game.the_pot = 0
+    the_game.pay_out(the_showdown)
+    for player_idx, winnings in enumerate(the_showdown.payouts):
+        if winnings == 0 and the_showdown.returned[player_idx] == 0:
+            continue
+        if winnings > 0:
+            await client.publish("game_rooms/" + room_number + "/players/" + player_list[player_idx] + "/hand",
+                                 str(player_stacks[player_idx]) + "   WINNER! Wins $" + str(winnings) +
+                                 " with hand type " + str(best_hands[player_idx]['hand type']) + " (score: " +
+                                 str(best_hands[player_idx]['score']) + ")", qos=1)
+        await client.publish("game_rooms/" + room_number + "/players/" + player_list[player_idx] + "/cash",
+                             "$" + str(player_cash[player_idx]), qos=1)
     await client.publish("game_rooms/" + room_number + "/community_cards_and_pot/the_pot",
                          "$" + str(the_game.the_pot), qos=1)
 
@@ -335,6 +785,10 @@ async def the_river(client, room_number):
 async def main():
     # Run the message handler indefinitely. Reconnect automatically if the connection is lost.
     reconnect_interval = 3  # [seconds]
+    # Rebuild the games that were running when the server last stopped
+    await recover()
+    # Hibernate idle rooms and delete abandoned ones in the background
+    lifecycle_task = asyncio.create_task(SERVER.lifecycle.run())
     while True:
         try:
             await message_handler()
@@ -344,10 +798,8 @@ async def main():
             await asyncio.sleep(reconnect_interval)
 
 
-# Change to the "Selector" event loop
-asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
-# Run your async application as usual
 if __name__ == '__main__':
-    asyncio.run(main())
+    # Use the best event loop for the platform, e.g. the selector loop asyncio-mqtt needs on Windows
+    event_loop.run(main())
 
 
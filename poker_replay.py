@@ -0,0 +1,122 @@
+from typing import List, Tuple, Optional
+from dataclasses import dataclass, field
+import argparse
+import asyncio
+import os
+import tempfile
+from poker_capture import CapturedCommand, CapturingClient, read_capture, verifiable
+import event_loop
+
+
+@dataclass
+class Mismatch:
+    index: int
+    command: str
+    expected: List[Tuple[str, str]]
+    actual: List[Tuple[str, str]]
+
+
+@dataclass
+class ReplayReport:
+    commands: int = 0
+    skipped: int = 0
+    duration: float = 0.0  # [seconds]
+    latencies: List[float] = field(default_factory=list)  # [seconds], from scheduled arrival to completion
+    mismatches: List[Mismatch] = field(default_factory=list)
+
+    @property
+    def throughput(self) -> float:
+        """
+        :return: commands per second
+        """
+        if self.duration == 0:
+            return 0.0
+        return self.commands / self.duration
+
+    def latency_percentile(self, percentile: float) -> float:
+        if not self.latencies:
+            return 0.0
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * percentile / 100))]
+
+    def summary(self) -> str:
+        return (f'{self.commands} commands ({self.skipped} skipped) in {self.duration:.3f} s: '
+                f'{self.throughput:.1f} commands/s, latency p50 {1000 * self.latency_percentile(50):.2f} ms, '
+                f'p99 {1000 * self.latency_percentile(99):.2f} ms, max {1000 * self.latency_percentile(100):.2f} ms, '
+                f'{len(self.mismatches)} mismatched')
+
+
+async def replay(captured: List[CapturedCommand], speed: Optional[float] = 1.0) -> ReplayReport:
+    """
+    Feeds captured commands back through the server's command dispatch, with a stand-in client recording the
+    publishes of each command, and checks they match the captured ones.
+
+    Commands keep their captured seeds, so created games deal the same cards. They are dispatched as already
+    authenticated, because the capture holds no session tokens; create_user, login and logout commands are skipped,
+    because the capture holds no passwords either. The capture must have started on an empty server, and the replay runs against poker_mqtt.SERVER,
+    which should be empty as well (see main()).
+
+    :param captured: the captured commands, in arrival order
+    :param speed: replay speed relative to the capture, e.g. 10 for ten times faster; None for as fast as possible
+    :return: the replay report
+    """
+    import poker_mqtt
+    report = ReplayReport()
+    loop = asyncio.get_running_loop()
+    replayed: List[Tuple[int, CapturedCommand, CapturingClient, asyncio.Task]] = []
+    start = loop.time()
+
+    def completed(scheduled: float):
+        return lambda _: report.latencies.append(loop.time() - scheduled)
+
+    for index, captured_command in enumerate(captured):
+        if captured_command.command.startswith(("create_user", "login", "logout")):
+            report.skipped += 1
+            continue
+        scheduled = start
+        if speed is not None:
+            scheduled = start + captured_command.t / speed
+            if scheduled > loop.time():
+                await asyncio.sleep(scheduled - loop.time())
+        else:
+            await asyncio.sleep(0)  # let the loop run commands while the rest are dispatched
+            scheduled = loop.time()
+        stand_in_client = CapturingClient()
+        command_task = poker_mqtt.dispatch(stand_in_client, captured_command.command, captured_command.seed,
+                                           authenticated=True)
+        command_task.add_done_callback(completed(scheduled))
+        replayed.append((index, captured_command, stand_in_client, command_task))
+    await asyncio.gather(*(command_task for _, _, _, command_task in replayed), return_exceptions=True)
+    report.duration = loop.time() - start
+    report.commands = len(replayed)
+
+    for index, captured_command, stand_in_client, command_task in replayed:
+        expected = verifiable(captured_command.publishes)
+        actual = verifiable(stand_in_client.publishes)
+        failed = command_task.exception() is not None
+        if actual != expected or failed != captured_command.error:
+            report.mismatches.append(Mismatch(index, captured_command.command, expected, actual))
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Replay a capture recorded with poker_mqtt.CAPTURE_PATH.')
+    parser.add_argument('capture', help='capture file')
+    speed = parser.add_mutually_exclusive_group()
+    speed.add_argument('--speed', type=float, default=1.0, help='speed relative to the capture (default: 1)')
+    speed.add_argument('--max', action='store_true', help='replay as fast as possible')
+    args = parser.parse_args()
+    captured = list(read_capture(args.capture))
+    # poker_mqtt opens its write-ahead log and hand history relative to the working directory when they are first
+    # used, so running from an empty directory with its own account store gives the replay a fresh server
+    import poker_mqtt
+    os.chdir(tempfile.mkdtemp(prefix='poker_replay_'))
+    poker_mqtt.SERVER = poker_mqtt.PokerServer(accounts_dir=os.path.abspath('user_accounts'))
+    report = event_loop.run(replay(captured, None if args.max else args.speed))
+    for mismatch in report.mismatches:
+        print(f'#{mismatch.index} "{mismatch.command}": expected {mismatch.expected}, got {mismatch.actual}')
+    print(report.summary())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,326 @@
+from typing import List, Tuple, Dict, Callable, Optional
+from dataclasses import dataclass, field
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+import argparse
+import os
+import random
+import time
+from poker.poker import Poker, Strategy, decide_all
+from poker_bots import RandomBot, PotOddsBot
+
+
+@dataclass(frozen=True)
+class BlindLevel:
+    small_blind: int
+    big_blind: int
+    ante: int = 0
+
+
+DEFAULT_BLINDS = (BlindLevel(10, 20), BlindLevel(15, 30), BlindLevel(25, 50), BlindLevel(50, 100),
+                  BlindLevel(75, 150, 15), BlindLevel(100, 200, 25), BlindLevel(150, 300, 25),
+                  BlindLevel(200, 400, 50), BlindLevel(300, 600, 75), BlindLevel(400, 800, 100),
+                  BlindLevel(600, 1200, 150), BlindLevel(800, 1600, 200), BlindLevel(1000, 2000, 300))
+
+
+@dataclass(frozen=True)
+class TournamentConfig:
+    num_players: int = 27
+    table_size: int = 9
+    starting_stack: int = 1500
+    blinds: Tuple[BlindLevel, ...] = DEFAULT_BLINDS  # after the last level, the blinds and ante double every level
+    hands_per_level: int = 10
+    buy_in: int = 100
+    payouts: Tuple[float, ...] = (0.5, 0.3, 0.2)  # share of the prize pool for 1st, 2nd, ...
+    # Strategy classes (or partials) called with seed=..., assigned to the players in turn. Each makes one strategy
+    # object per tournament, which decides for all of its players at once. They must be picklable for the pool.
+    strategies: Tuple[Callable[..., Strategy], ...] = (RandomBot,)
+    max_hands: int = 10000  # after this many hands the remaining players finish in order of their stacks
+
+
+@dataclass
+class TournamentResult:
+    places: List[int]  # finishing place of each player, 1 for the winner
+    prizes: List[int]  # prize of each player
+    strategies: List[str]  # strategy name of each player
+    hands: int  # hands played at each table, i.e. rounds of simultaneous hands
+
+
+@dataclass
+class StrategyStats:
+    entries: int = 0
+    wins: int = 0
+    in_the_money: int = 0
+    total_place: int = 0
+    total_prize: int = 0
+
+    def summary(self, buy_in: int) -> str:
+        return (f'{self.entries:,} entries, {100 * self.wins / self.entries:.1f}% wins, '
+                f'{100 * self.in_the_money / self.entries:.1f}% in the money, '
+                f'average place {self.total_place / self.entries:.1f}, '
+                f'ROI {100 * (self.total_prize / (self.entries * buy_in) - 1):+.1f}%')
+
+
+@dataclass
+class TournamentStats:
+    tournaments: int = 0
+    total_hands: int = 0
+    min_hands: Optional[int] = None
+    max_hands: Optional[int] = None
+    by_strategy: Dict[str, StrategyStats] = field(default_factory=dict)
+    seconds: float = 0.0
+
+    def add(self, result: TournamentResult):
+        self.tournaments += 1
+        self.total_hands += result.hands
+        self.min_hands = result.hands if self.min_hands is None else min(self.min_hands, result.hands)
+        self.max_hands = result.hands if self.max_hands is None else max(self.max_hands, result.hands)
+        for place, prize, name in zip(result.places, result.prizes, result.strategies):
+            stats = self.by_strategy.setdefault(name, StrategyStats())
+            stats.entries += 1
+            stats.wins += place == 1
+            stats.in_the_money += prize > 0
+            stats.total_place += place
+            stats.total_prize += prize
+
+    def tournaments_per_minute(self) -> float:
+        return 60 * self.tournaments / self.seconds if self.seconds else 0.0
+
+
+def blind_level(config: TournamentConfig, hand_idx: int) -> BlindLevel:
+    """
+    :param config: the tournament
+    :param hand_idx: number of hands played so far
+    :return: the blinds of the next hand
+    """
+    level_idx = hand_idx // config.hands_per_level
+    if level_idx < len(config.blinds):
+        return config.blinds[level_idx]
+    last = config.blinds[-1]
+    factor = 2 ** (level_idx - len(config.blinds) + 1)
+    return BlindLevel(last.small_blind * factor, last.big_blind * factor, last.ante * factor)
+
+
+def prize_amounts(config: TournamentConfig) -> List[int]:
+    """
+    :param config: the tournament
+    :return: prize of each paid place, from 1st; rounding leftovers go to 1st
+    """
+    prize_pool = config.buy_in * config.num_players
+    prizes = [int(prize_pool * share) for share in config.payouts[:config.num_players]]
+    prizes[0] += prize_pool - sum(prizes)
+    return prizes
+
+
+def balance_tables(tables: List[List[int]], table_size: int) -> List[List[int]]:
+    """
+    Breaks the shortest table while the others have room for its players, and then moves players from the longest
+    tables to the shortest until they differ by at most one player. Moved players leave from the end of their table.
+
+    :param tables: the players at each table, in seat order; empty tables are removed
+    :param table_size: most players at a table
+    :return: the balanced tables
+    """
+    tables = [table for table in tables if table]
+    while len(tables) > 1 and sum(map(len, tables)) <= table_size * (len(tables) - 1):
+        broken = tables.pop(min(range(len(tables)), key=lambda table_idx: len(tables[table_idx])))
+        for player in broken:
+            min(tables, key=len).append(player)
+    while tables and len(max(tables, key=len)) - len(min(tables, key=len)) > 1:
+        min(tables, key=len).append(max(tables, key=len).pop())
+    return tables
+
+
+class _TableHand(object):
+    """
+    One hand at one table, played the way Poker.run() plays it: a betting round after the deal and after each
+    community card reveal, where each player acts once in turn and the first bet is called by everyone else, ending
+    the round. Players who cannot cover a blind or a call go all-in for what they have, and every hand goes to the
+    showdown, with side pots for the all-in players.
+    """
+    def __init__(self, seats: List[int], stacks: List[int], button: int, level: BlindLevel, seed: int):
+        self.seats = seats
+        num_seats = len(seats)
+        self.game = Poker(num_seats, [stacks[player] for player in seats], seed=seed)
+        small_blind = button if num_seats == 2 else (button + 1) % num_seats
+        big_blind = (small_blind + 1) % num_seats
+        for seat in range(num_seats):
+            self._post(seat, level.ante)
+        self._post(small_blind, level.small_blind)
+        self._post(big_blind, level.big_blind)
+        self.game.initial_deal()
+        self._first_postflop = (button + 1) % num_seats
+        self._start_round((big_blind + 1) % num_seats)
+
+    def _post(self, seat: int, amount: int):
+        amount = min(amount, self.game.get_player_cash()[seat])
+        if amount > 0:
+            self.game.bet(seat, amount)
+
+    def _start_round(self, first_seat: int):
+        cash = self.game.get_player_cash()
+        num_seats = len(self.seats)
+        order = [(first_seat + offset) % num_seats for offset in range(num_seats)]
+        self.to_act = [seat for seat in order if cash[seat] > 0]
+        if len(self.to_act) < 2:  # no one left to call a bet
+            self.to_act = []
+
+    def next_street(self, num_cards: int):
+        for _ in range(num_cards):
+            self.game.community_draw()
+        self._start_round(self._first_postflop)
+
+    def act(self, action: Tuple[str, int]):
+        seat = self.to_act.pop(0)
+        kind, amount = action
+        if kind != 'bet':
+            self.game.check(seat)
+            return
+        self.game.bet(seat, amount)
+        for other_seat in range(len(self.seats)):
+            if other_seat != seat:
+                self._post(other_seat, amount)
+        self.to_act = []
+
+    def finish(self, stacks: List[int]):
+        self.game.pay_out(self.game.showdown())
+        for seat, cash in enumerate(self.game.get_player_cash()):
+            stacks[self.seats[seat]] = cash
+
+
+def play_tournament(config: TournamentConfig, seed: int) -> TournamentResult:
+    """
+    Plays a whole tournament, with every table playing its next hand at the same time. Decisions of all tables are
+    collected with decide_all(), so each strategy decides for all of its waiting players in one batch. Strategies run
+    without a time budget, so a slow decision is waited for instead of turning into a check, and the result only
+    depends on the seed.
+
+    :param config: the tournament
+    :param seed: seed for the seating, the decks and the strategies
+    :return: the finishing places and prizes
+    """
+    rng = random.Random(seed)
+    strategy_objects = [make_strategy(seed=rng.getrandbits(32)) for make_strategy in config.strategies]
+    for strategy in strategy_objects:
+        strategy.time_budget = None
+    player_strategies = [strategy_objects[player % len(strategy_objects)] for player in range(config.num_players)]
+    stacks = [config.starting_stack] * config.num_players
+    places = [0] * config.num_players
+    players = list(range(config.num_players))
+    rng.shuffle(players)
+    num_tables = -(-config.num_players // config.table_size)
+    tables = balance_tables([players[table_idx::num_tables] for table_idx in range(num_tables)], config.table_size)
+    buttons = [rng.randrange(len(table)) for table in tables]
+    remaining = config.num_players
+    hand_idx = 0
+    while remaining > 1 and hand_idx < config.max_hands:
+        level = blind_level(config, hand_idx)
+        hands = [_TableHand(table, stacks, button % len(table), level, rng.getrandbits(64))
+                 for table, button in zip(tables, buttons) if len(table) > 1]
+        for num_cards in (0, 3, 1, 1):
+            if num_cards:
+                for hand in hands:
+                    hand.next_street(num_cards)
+            while True:
+                waiting = [hand for hand in hands if hand.to_act]
+                if not waiting:
+                    break
+                actions = decide_all([(player_strategies[hand.seats[hand.to_act[0]]],
+                                       hand.game.decision_view(hand.to_act[0])) for hand in waiting])
+                for hand, action in zip(waiting, actions):
+                    hand.act(action)
+        starting_stacks = {player: stacks[player] for table in tables for player in table}
+        for hand in hands:
+            hand.finish(stacks)
+        # Players knocked out in the same hand finish in order of their stacks before it
+        busted = sorted((player for player in starting_stacks if stacks[player] == 0),
+                        key=lambda player: (starting_stacks[player], -player), reverse=True)
+        for player in busted:
+            places[player] = remaining - len(busted) + 1 + busted.index(player)
+        remaining -= len(busted)
+        num_tables = len(tables)
+        tables = balance_tables([[player for player in table if stacks[player] > 0] for table in tables],
+                                config.table_size)
+        if len(tables) == num_tables:
+            buttons = [button + 1 for button in buttons]
+        else:  # a table was broken, and the players are redrawn for the button
+            buttons = [rng.randrange(len(table)) for table in tables]
+        hand_idx += 1
+    survivors = sorted((player for table in tables for player in table), key=lambda player: (-stacks[player], player))
+    for place, player in enumerate(survivors, start=1):
+        places[player] = place
+    prizes = prize_amounts(config)
+    return TournamentResult(places, [prizes[place - 1] if place <= len(prizes) else 0 for place in places],
+                            [type(strategy).__name__ for strategy in player_strategies], hand_idx)
+
+
+def _tournament_chunk(config: TournamentConfig, seeds: List[int]) -> List[TournamentResult]:
+    return [play_tournament(config, seed) for seed in seeds]
+
+
+def simulate(config: TournamentConfig, num_tournaments: int, seed: Optional[int] = None,
+             workers: Optional[int] = None, chunk_size: int = 10) -> TournamentStats:
+    """
+    Plays many tournaments on a process pool. Each tournament's seed comes from seed, so the same seed gives the
+    same statistics for any number of workers.
+
+    :param config: the tournament
+    :param num_tournaments: number of tournaments to play
+    :param seed: seed for the tournament seeds; random if None
+    :param workers: number of processes; one per core if None, and no pool if 1
+    :param chunk_size: tournaments per task sent to a worker
+    :return: the aggregated results
+    """
+    rng = random.Random(seed)
+    seeds = [rng.getrandbits(64) for _ in range(num_tournaments)]
+    chunks = [seeds[start:start + chunk_size] for start in range(0, num_tournaments, chunk_size)]
+    stats = TournamentStats()
+    start = time.perf_counter()
+    if workers == 1:
+        results = map(partial(_tournament_chunk, config), chunks)
+        for chunk_results in results:
+            for result in chunk_results:
+                stats.add(result)
+    else:
+        with ProcessPoolExecutor(workers) as pool:
+            for chunk_results in pool.map(partial(_tournament_chunk, config), chunks):
+                for result in chunk_results:
+                    stats.add(result)
+    stats.seconds = time.perf_counter() - start
+    return stats
+
+
+# Strategies for the command line, by name
+STRATEGIES = {'random': RandomBot,
+              'pot-odds': partial(PotOddsBot, samples=50)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Simulate multi-table tournaments and report finish statistics and '
+                                                 'tournaments per minute.')
+    parser.add_argument('--tournaments', type=int, default=1000, help='tournaments to play (default: 1000)')
+    parser.add_argument('--players', type=int, default=27, help='players per tournament (default: 27)')
+    parser.add_argument('--table-size', type=int, default=9, help='most players at a table (default: 9)')
+    parser.add_argument('--stack', type=int, default=1500, help='starting stack (default: 1500)')
+    parser.add_argument('--hands-per-level', type=int, default=10, help='hands per blind level (default: 10)')
+    parser.add_argument('--payouts', type=float, nargs='+', default=[0.5, 0.3, 0.2],
+                        help='prize pool share of each paid place (default: 0.5 0.3 0.2)')
+    parser.add_argument('--strategies', nargs='+', default=['random'], choices=list(STRATEGIES),
+                        help='strategies assigned to the players in turn (default: random)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='processes (default: one per core)')
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+    config = TournamentConfig(num_players=args.players, table_size=args.table_size, starting_stack=args.stack,
+                              hands_per_level=args.hands_per_level, payouts=tuple(args.payouts),
+                              strategies=tuple(STRATEGIES[name] for name in args.strategies))
+    stats = simulate(config, args.tournaments, args.seed, args.workers)
+    print(f'{stats.tournaments:,} tournaments of {config.num_players} players in {stats.seconds:.1f} s with '
+          f'{args.workers} workers: {stats.tournaments_per_minute():,.0f} tournaments/minute')
+    print(f'Hands per table: {stats.total_hands / stats.tournaments:.1f} on average, '
+          f'{stats.min_hands} to {stats.max_hands}')
+    for name, strategy_stats in stats.by_strategy.items():
+        print(f'  {name}: {strategy_stats.summary(config.buy_in)}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,229 @@
+from typing import List, Tuple, Dict, Iterator, Optional, Callable
+from dataclasses import dataclass
+import asyncio
+import contextlib
+import json
+import os
+import struct
+
+
+@dataclass
+class LogRecord:
+    seq: int
+    command: str
+    seed: Optional[int] = None
+
+
+@dataclass
+class WalStats:
+    records: int = 0
+    commits: int = 0
+    checkpoints: int = 0
+
+    @property
+    def records_per_commit(self) -> float:
+        if self.commits == 0:
+            return 0.0
+        return self.records / self.commits
+
+
+class WriteAheadLog(object):
+    """
+    Append-only log of accepted game commands, for rebuilding the game database after a crash.
+
+    Records are JSON lines. Appends are group committed: the first append of a batch waits commit_window seconds for
+    more appends, then the whole batch is written with a single fsync and every waiting append returns.
+
+    A checkpoint stores every room together with the sequence number of the last record it includes, then starts an
+    empty log, so recovery only replays the records written since the last checkpoint.
+    """
+    _CHECKPOINT_MAGIC = b'PKRCKPT1'
+
+    def __init__(self, log_path: str = 'poker_wal.log', checkpoint_path: str = 'poker_checkpoint.bin',
+                 commit_window: float = 0.002):
+        """
+        Constructor for the write-ahead log.
+
+        :param log_path: path of the log file
+        :param checkpoint_path: path of the checkpoint file
+        :param commit_window: seconds to wait for more records before committing a batch
+        """
+        self._log_path = log_path
+        self._checkpoint_path = checkpoint_path
+        self._commit_window = commit_window
+        self._pending: List[Tuple[LogRecord, asyncio.Future]] = []
+        self._commit_task: Optional[asyncio.Task] = None
+        self._checkpoint_seq, _ = self.load_checkpoint()
+        self._seq = max([self._checkpoint_seq] + [record.seq for record in self.read_records()])
+        self._log_file = None
+        self._commands_in_flight = 0
+        self._checkpoint_done: Optional[asyncio.Event] = None
+        self._drained: Optional[asyncio.Event] = None
+        self.stats = WalStats()
+
+    @property
+    def records_since_checkpoint(self) -> int:
+        return self._seq - self._checkpoint_seq
+
+    async def append(self, command: str, seed: Optional[int] = None) -> int:
+        """
+        Appends a command to the log and waits until it is durable on disk.
+
+        :param command: the game command message
+        :param seed: RNG seed the command needs to be replayed identically, if any
+        :return: the sequence number of the record
+        """
+        committed = self.append_nowait(command, seed)
+        seq = self._seq
+        await committed
+        return seq
+
+    def append_nowait(self, command: str, seed: Optional[int] = None) -> asyncio.Future:
+        """
+        Appends a command to the log without waiting. The record is ordered before every record appended after this
+        call returns, so it is durable by the time any of them is.
+
+        :param command: the game command message
+        :param seed: RNG seed the command needs to be replayed identically, if any
+        :return: future that is done when the record is durable on disk
+        """
+        self._seq += 1
+        record = LogRecord(self._seq, command, seed)
+        committed = asyncio.get_running_loop().create_future()
+        self._pending.append((record, committed))
+        if self._commit_task is None:
+            self._commit_task = asyncio.create_task(self._group_commit())
+        return committed
+
+    async def _group_commit(self):
+        """
+        Waits out the commit window, then writes and fsyncs every pending record at once.
+        """
+        await asyncio.sleep(self._commit_window)
+        batch, self._pending = self._pending, []
+        self._commit_task = None
+        try:
+            if self._log_file is None:
+                self._log_file = open(self._log_path, 'ab')
+            self._log_file.write(b''.join(json.dumps(vars(record)).encode('utf-8') + b'\n' for record, _ in batch))
+            self._log_file.flush()
+            os.fsync(self._log_file.fileno())
+        except OSError as error:
+            for _, committed in batch:
+                committed.set_exception(error)
+            return
+        self.stats.records += len(batch)
+        self.stats.commits += 1
+        for _, committed in batch:
+            committed.set_result(None)
+
+    @contextlib.asynccontextmanager
+    async def command(self):
+        """
+        Context manager around logging and applying one command. Checkpoints wait until no command is inside it,
+        and new commands wait while a checkpoint is being written.
+        """
+        while self._checkpoint_done is not None:
+            await self._checkpoint_done.wait()
+        self._commands_in_flight += 1
+        try:
+            yield
+        finally:
+            self._commands_in_flight -= 1
+            if self._commands_in_flight == 0 and self._drained is not None:
+                self._drained.set()
+
+    async def checkpoint(self, dump_rooms: Callable[[], Dict[str, bytes]]):
+        """
+        Waits for the commands in flight to finish, then writes a checkpoint. Does nothing if a checkpoint is
+        already in progress.
+
+        :param dump_rooms: returns every serialized room, e.g. AsyncPokerGameDB.dump_rooms
+        """
+        if self._checkpoint_done is not None:
+            return
+        self._checkpoint_done = asyncio.Event()
+        try:
+            if self._commands_in_flight:
+                self._drained = asyncio.Event()
+                await self._drained.wait()
+            self.write_checkpoint(dump_rooms())
+        finally:
+            checkpoint_done, self._checkpoint_done, self._drained = self._checkpoint_done, None, None
+            checkpoint_done.set()
+
+    def read_records(self, after_seq: int = 0) -> Iterator[LogRecord]:
+        """
+        Reads the records in the log. A torn last line from a crash during a write is ignored.
+
+        :param after_seq: only yield records with a greater sequence number
+        :return: iterator of log records
+        """
+        if not os.path.exists(self._log_path):
+            return
+        with open(self._log_path, 'rb') as f:
+            for line in f:
+                try:
+                    record = LogRecord(**json.loads(line))
+                except ValueError:
+                    return
+                if record.seq > after_seq:
+                    yield record
+
+    def write_checkpoint(self, rooms: Dict[str, bytes]):
+        """
+        Atomically writes a checkpoint of every room, then truncates the log.
+
+        Must be called with no command in between being logged and being applied, so rooms reflects exactly the
+        records logged so far; checkpoint() takes care of that when commands run concurrently.
+
+        :param rooms: dict of room number to serialized room, as returned by AsyncPokerGameDB.dump_rooms()
+        """
+        parts = [self._CHECKPOINT_MAGIC, struct.pack('<QI', self._seq, len(rooms))]
+        for room_number, data in rooms.items():
+            encoded_room_number = room_number.encode('utf-8')
+            parts.append(struct.pack('<II', len(encoded_room_number), len(data)))
+            parts.append(encoded_room_number)
+            parts.append(data)
+        tmp_path = self._checkpoint_path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(b''.join(parts))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self._checkpoint_path)
+        self._checkpoint_seq = self._seq
+        # Records up to _seq are now covered by the checkpoint; replay skips them even if truncation never happens.
+        if self._log_file is None:
+            self._log_file = open(self._log_path, 'ab')
+        self._log_file.truncate(0)
+        self.stats.checkpoints += 1
+
+    def load_checkpoint(self) -> Tuple[int, Dict[str, bytes]]:
+        """
+        Reads the last checkpoint.
+
+        :return: (sequence number of the last record included, dict of room number to serialized room)
+        """
+        if not os.path.exists(self._checkpoint_path):
+            return 0, {}
+        with open(self._checkpoint_path, 'rb') as f:
+            data = f.read()
+        if not data.startswith(self._CHECKPOINT_MAGIC):
+            raise ValueError('Not a poker checkpoint file.')
+        offset = len(self._CHECKPOINT_MAGIC)
+        seq, num_rooms = struct.unpack_from('<QI', data, offset)
+        offset += struct.calcsize('<QI')
+        rooms = {}
+        for _ in range(num_rooms):
+            room_number_len, data_len = struct.unpack_from('<II', data, offset)
+            offset += 8
+            room_number = data[offset:offset + room_number_len].decode('utf-8')
+            offset += room_number_len
+            rooms[room_number] = data[offset:offset + data_len]
+            offset += data_len
+        return seq, rooms
+
+    def close(self):
+        if self._log_file is not None:
+            self._log_file.close()
+            self._log_file = None
@@ -0,0 +1,99 @@
+from typing import Dict, Optional
+from dataclasses import dataclass, asdict
+import asyncio
+import json
+from poker_db import AsyncPokerGameDB
+
+
+@dataclass
+class SpectatorStats:
+    ticks: int = 0
+    publishes: int = 0
+    coalesced: int = 0  # changes folded into a publish that was already due
+
+
+class SpectatorFeed(object):
+    """
+    Publishes one coalesced view of each changed room per tick to "game_rooms/<room>/spectators", for any number of
+    spectators.
+
+    Commands only mark their room as changed; every tick_interval seconds each changed room is published once with
+    its latest state, so spectator traffic is at most one message per room per tick however fast the room plays.
+    Hole cards stay hidden until the hand is finished. Messages are retained, so a new spectator gets the current
+    state immediately.
+    """
+    def __init__(self, game_db: AsyncPokerGameDB, tick_interval: float = 0.2):
+        """
+        Constructor for the spectator feed.
+
+        :param game_db: the game database the rooms are read from
+        :param tick_interval: seconds between publishes of a changed room
+        """
+        self._game_db = game_db
+        self._tick_interval = tick_interval
+        self._dirty: Dict[str, None] = {}  # insertion-ordered set of changed rooms
+        self.stats = SpectatorStats()
+
+    def mark_dirty(self, room_number: str):
+        """
+        Schedules a room for the next tick.
+
+        :param room_number: the changed room
+        """
+        if room_number in self._dirty:
+            self.stats.coalesced += 1
+        else:
+            self._dirty[room_number] = None
+
+    def snapshot(self, room_number: str) -> Optional[str]:
+        """
+        Builds the spectator view of a room.
+
+        :param room_number: the room number
+        :return: the JSON payload, or None if the room no longer exists
+        """
+        the_game = self._game_db._current_games.get(room_number)
+        game_info = self._game_db._current_games_info.get(room_number)
+        if the_game is None or game_info is None:
+            return None
+        community_stack = the_game.get_community_stack()
+        # the_river pays out the pot after the fifth community card, which ends the hand with a showdown
+        showdown = len(community_stack) == 5 and the_game.the_pot == 0
+        player_stacks = the_game.get_player_stacks()
+        player_cash = the_game.get_player_cash()
+        players = []
+        for player_idx, username in enumerate(game_info.players):
+            hand = player_stacks[player_idx] if player_idx < len(player_stacks) else []
+            players.append({'username': username.strip(),
+                            'cash': player_cash[player_idx],
+                            'hand': [asdict(card) for card in hand] if showdown else [None] * len(hand)})
+        return json.dumps({'room_number': room_number.strip(),
+                           'pot': the_game.the_pot,
+                           'community_cards': [asdict(card) for card in community_stack],
+                           'players': players})
+
+    async def tick(self, client):
+        """
+        Publishes every room changed since the last tick.
+
+        :param client: The MQTT client
+        """
+        dirty, self._dirty = self._dirty, {}
+        self.stats.ticks += 1
+        for room_number in dirty:
+            if self._game_db.is_hibernated(room_number):
+                continue  # idle since its last publish, which is still retained
+            payload = self.snapshot(room_number)
+            # A deleted room's retained message is cleared with an empty payload
+            await client.publish("game_rooms/" + room_number + "/spectators", payload or "", qos=0, retain=True)
+            self.stats.publishes += 1
+
+    async def run(self, client):
+        """
+        Ticks forever.
+
+        :param client: The MQTT client
+        """
+        while True:
+            await asyncio.sleep(self._tick_interval)
+            await self.tick(client)
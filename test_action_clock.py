@@ -0,0 +1,68 @@
+from action_clock import ActionClock
+from timing_wheel import TimingWheel
+import pytest
+
+
+@pytest.fixture
+def base_clock():
+    timeouts = []
+    clock = ActionClock(lambda client, room_number, username: timeouts.append((room_number, username)),
+                        turn_timeout=3, wheel=TimingWheel(tick=1, slots=8))
+    return clock, timeouts
+
+
+def advance(clock, ticks):
+    for _ in range(ticks):
+        clock.wheel.advance()
+
+
+def test_players_act_in_seat_order(base_clock):
+    clock, timeouts = base_clock
+    clock.start_round('1', ['a', 'b', 'c'])
+    assert clock.on_clock('1') == 'a'
+    advance(clock, 2)
+    clock.acted('1', 'a')
+    assert clock.on_clock('1') == 'b'
+    advance(clock, 2)
+    assert timeouts == []
+    clock.acted('1', 'c')  # out of turn; b stays on the clock
+    advance(clock, 1)
+    assert timeouts == [('1', 'b')]
+    clock.acted('1', 'b')
+    assert clock.on_clock('1') is None
+    assert clock.wheel.pending == 0
+
+
+def test_timed_out_player_is_not_timed_out_again(base_clock):
+    clock, timeouts = base_clock
+    clock.start_round('1', ['a', 'b'])
+    advance(clock, 10)
+    assert timeouts == [('1', 'a')]
+    clock.acted('1', 'a')
+    advance(clock, 3)
+    assert timeouts == [('1', 'a'), ('1', 'b')]
+    assert clock.timeouts == 2
+
+
+def test_stop_and_new_round(base_clock):
+    clock, timeouts = base_clock
+    clock.start_round('1', ['a', 'b'])
+    clock.start_round('2', ['c', 'd'])
+    clock.stop('1')
+    advance(clock, 2)
+    clock.start_round('2', ['c', 'd'])
+    advance(clock, 2)
+    assert timeouts == []
+    advance(clock, 1)
+    assert timeouts == [('2', 'c')]
+
+
+def test_failed_timeout_action_ends_round(base_clock):
+    clock, timeouts = base_clock
+    clock.start_round('1', ['a', 'b'])
+    clock.timeout_failed('1', 'a')  # a is still on the clock with a timer
+    assert clock.on_clock('1') == 'a'
+    advance(clock, 3)
+    clock.timeout_failed('1', 'a')
+    assert clock.on_clock('1') is None
+    assert clock.wheel.pending == 0
@@ -0,0 +1,98 @@
+from hand_history import HandHistoryWriter, HandHistoryReader, _SEGMENT_HEADER, _V1_RECORD, _V1_ACTION
+from poker.poker import Poker
+import pytest
+
+
+def finished_game(seed):
+    the_game = Poker(num_players=3, starting_cash=1000, seed=seed)
+    the_game.initial_deal()
+    the_game.bet(0, 100)
+    the_game.check(1)
+    for _ in range(5):
+        the_game.community_draw()
+    return the_game, the_game.compute_winner()
+
+
+@pytest.fixture
+def base_history(tmp_path):
+    writer = HandHistoryWriter(str(tmp_path), records_per_segment=4)
+    games = []
+    for seed in range(10):
+        the_game, winner = finished_game(seed)
+        writer.append('room' + str(seed % 2), the_game, winner)
+        games.append((the_game, winner))
+    writer.close()
+    return HandHistoryReader(str(tmp_path)), games
+
+
+def test_round_trip(base_history, tmp_path):
+    reader, games = base_history
+    assert len(reader) == 10
+    assert len(list(tmp_path.glob('*.seg'))) == 3
+    records = list(reader.scan())
+    for record, (the_game, winner) in zip(records, games):
+        assert record.winner == winner
+        assert record.pot == 100
+        assert record.board == the_game.get_community_stack()
+        assert record.hole_cards == the_game.get_player_stacks()
+        assert record.actions == [(0, 'bet', 100), (1, 'check', 0)]
+        assert record.hand_type == the_game.get_best_hands()[winner]['hand type']
+    assert [record.hand_id for record in records] == list(range(1, 11))
+
+
+def test_filters(base_history):
+    reader, games = base_history
+    assert [record.hand_id for record in reader.scan(room_number='room1')] == [2, 4, 6, 8, 10]
+    counts = reader.count_hand_types()
+    assert sum(counts) == 10
+    pairs = list(reader.scan(hand_type='Pair'))
+    assert len(pairs) == counts[1]
+    assert all(record.hand_type == 'Pair' for record in pairs)
+
+
+def test_writer_continues_hand_ids(base_history, tmp_path):
+    writer = HandHistoryWriter(str(tmp_path), records_per_segment=4)
+    the_game, winner = finished_game(42)
+    assert writer.append('room0', the_game, winner) == 11
+    writer.close()
+    assert len(HandHistoryReader(str(tmp_path))) == 11
+
+
+def test_large_and_negative_amounts(tmp_path):
+    the_game, winner = finished_game(7)
+    the_game._actions += [(2, 'bet', 2 ** 40), (1, 'bet', -5)]
+    writer = HandHistoryWriter(str(tmp_path))
+    writer.append('room0', the_game, winner)
+    writer.close()
+    record, = HandHistoryReader(str(tmp_path)).scan()
+    assert record.actions[-2:] == [(2, 'bet', 2 ** 40), (1, 'bet', -5)]
+
+
+def test_version_1_segments_stay_readable(tmp_path):
+    the_game, winner = finished_game(3)
+    with open(tmp_path / 'hands_000000.seg', 'wb') as f:
+        f.write(_SEGMENT_HEADER.pack(b'PKRHH001', _V1_RECORD.size))
+        f.write(_V1_RECORD.pack(1, b'room0'.ljust(16, b'\0'), 100, 3, winner, 0, 1, b'\xff' * 5, b'\xff' * 20,
+                                _V1_ACTION.pack(0, 1, 100)))
+    writer = HandHistoryWriter(str(tmp_path))
+    assert writer.append('room0', the_game, winner) == 2
+    writer.close()
+    assert len(list(tmp_path.glob('*.seg'))) == 2
+    records = list(HandHistoryReader(str(tmp_path)).scan(room_number='room0'))
+    assert [record.hand_id for record in records] == [1, 2]
+    assert records[0].actions == [(0, 'bet', 100)]
+    assert records[1].actions == [(0, 'bet', 100), (1, 'check', 0)]
+
+
+def test_non_ascii_rooms(tmp_path):
+    room = ' a' + '\u00e9' * 10  # 21 bytes in UTF-8, cut inside an 'e acute' at 16
+    the_game, winner = finished_game(5)
+    writer = HandHistoryWriter(str(tmp_path))
+    writer.append(room, the_game, winner)
+    writer.close()
+    records = list(HandHistoryReader(str(tmp_path)).scan(room_number=room))
+    assert [record.room_number for record in records] == ['a' + '\u00e9' * 7]
+
+
+if __name__ == '__main__':
+    pytest.main()
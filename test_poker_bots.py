@@ -0,0 +1,33 @@
+import random
+from poker.poker import Card, DecisionView
+from poker_bots import RandomBot, PotOddsBot, estimate_equity
+
+
+def view_of(hole_cards, num_players=2, community_cards=(), pot=100, cash=1000):
+    return DecisionView(0, num_players, list(hole_cards), list(community_cards), pot, cash)
+
+
+def test_random_bot_is_seeded_and_bets_within_cash():
+    views = [view_of([Card('S', 2), Card('D', 7)], cash=cash) for cash in range(0, 1000, 10)]
+    actions = RandomBot(bet_probability=0.5, seed=1).decide_batch(views)
+    assert actions == RandomBot(bet_probability=0.5, seed=1).decide_batch(views)
+    assert {kind for kind, _ in actions} == {'bet', 'check'}
+    assert all(0 < amount <= view.cash // 10 for (kind, amount), view in zip(actions, views) if kind == 'bet')
+
+
+def test_estimate_equity():
+    rng = random.Random(1)
+    aces = estimate_equity([Card('S', 14), Card('H', 14)], [], 1, 400, rng)
+    assert 0.8 < aces < 0.9
+    made_flush = estimate_equity([Card('S', 14), Card('S', 13)],
+                                 [Card('S', 2), Card('S', 7), Card('S', 9), Card('D', 3), Card('C', 4)], 3, 100, rng)
+    assert made_flush == 1.0
+
+
+def test_pot_odds_bot_bets_strong_hands_and_caches():
+    bot = PotOddsBot(samples=200, seed=1)
+    assert bot.decide(view_of([Card('S', 14), Card('H', 14)])) == ('bet', 50)
+    assert bot.decide(view_of([Card('S', 2), Card('D', 7)], num_players=6)) == ('check', 0)
+    # Same starting hand in other suits shares the cached estimate
+    assert bot.decide(view_of([Card('C', 14), Card('D', 14)])) == ('bet', 50)
+    assert len(bot._equities) == 2
@@ -0,0 +1,58 @@
+import asyncio
+from poker_db import AsyncPokerGameDB
+from poker_cache import AsyncPokerGameCache
+from user_db import UserDB
+import pytest
+
+
+@pytest.fixture
+def base_cache():
+    game_db = AsyncPokerGameDB(UserDB())
+    game_db._QUERY_TIME = 0.01
+    return AsyncPokerGameCache(game_db, max_size=2, ttl=60)
+
+
+@pytest.mark.asyncio
+async def test_get_game_hits_after_first_read(base_cache):
+    await base_cache.add_game('1', 2, 1000)
+    first = await base_cache.get_game('1')
+    second = await base_cache.get_game('1')
+    assert first is second
+    assert base_cache.stats.misses == 1
+    assert base_cache.stats.hits == 1
+
+
+@pytest.mark.asyncio
+async def test_concurrent_misses_are_coalesced(base_cache):
+    await base_cache.add_game('1', 2, 1000)
+    games = await asyncio.gather(*[base_cache.get_game('1') for _ in range(5)])
+    assert all(game is games[0] for game in games)
+    assert base_cache.stats.misses == 1
+    assert base_cache.stats.coalesced == 4
+
+
+@pytest.mark.asyncio
+async def test_add_player_invalidates_game_info(base_cache):
+    await base_cache.add_game('1', 2, 1000)
+    await base_cache.get_game_info('1')
+    assert await base_cache.add_player('1', 'tester') == 0
+    game_info = await base_cache.get_game_info('1')
+    assert game_info.players == ['tester']
+    assert base_cache.stats.invalidations == 1
+
+
+@pytest.mark.asyncio
+async def test_lru_eviction_and_ttl(base_cache):
+    for room_number in ('1', '2', '3'):
+        await base_cache.add_game(room_number, 2, 1000)
+        await base_cache.get_game(room_number)
+    assert base_cache.stats.evictions == 1
+    base_cache._ttl = 0
+    base_cache.invalidate('3')
+    await base_cache.get_game('3')
+    await base_cache.get_game('3')
+    assert base_cache.stats.expirations == 1
+
+
+if __name__ == '__main__':
+    pytest.main()
@@ -0,0 +1,36 @@
+from poker_capture import CaptureWriter, CapturedCommand, CapturingClient, read_capture, redact_command, verifiable
+import pytest
+
+
+def test_capture_round_trip(tmp_path):
+    writer = CaptureWriter(str(tmp_path / 'capture.jsonl'))
+    captured = [CapturedCommand(writer.now(), 'create_game 2, 3, 5000', 1234,
+                                [('game_rooms/ 2/num_players', '3')]),
+                CapturedCommand(writer.now(), 'the_flop 2', None, [], True)]
+    for captured_command in captured:
+        writer.write(captured_command)
+    writer.close()
+    assert list(read_capture(str(tmp_path / 'capture.jsonl'))) == captured
+    assert captured[0].t <= captured[1].t
+
+
+@pytest.mark.asyncio
+async def test_capturing_client_hides_secrets():
+    inner = CapturingClient()
+    client = CapturingClient(inner)
+    await client.publish('users/ felix/password', 'hunter2', qos=1)
+    await client.publish('game_rooms/ 2/num_players', 3, qos=1)
+    assert client.publishes == [('users/ felix/password', ''), ('game_rooms/ 2/num_players', '3')]
+    assert len(inner.publishes) == 2
+
+
+def test_redact_command():
+    assert redact_command('create_user felix, hunter2') == 'create_user felix'
+    assert redact_command('login felix, hunter2, c2VhbGVk') == 'login felix'
+    assert redact_command('logout felix, 123.abc.def.ghi') == 'logout felix'
+    assert redact_command('bet 2, felix, 50') == 'bet 2, felix, 50'
+
+
+def test_verifiable_skips_lobby_and_secrets():
+    publishes = [('lobby', '[]'), ('users/ felix/session', ''), ('game_rooms/ 2/players', '')]
+    assert verifiable(publishes) == [('game_rooms/ 2/players', '')]
@@ -1,3 +1,4 @@
+import asyncio
 from poker_db import AsyncPokerGameDB
 from user_db import UserDB
 import pytest
@@ -23,5 +24,58 @@ async def test_add_game(base_game_db):
     assert base_game_db._current_games[room_number]._num_players == 2
 
 
+@pytest.mark.asyncio
+async def test_add_player(base_game_db):
+    room_number = await base_game_db.add_game('1', 1, 1000)
+    assert await base_game_db.add_player(room_number, TEST_USER) == 0
+    with pytest.raises(ValueError):
+        await base_game_db.add_player(room_number, 'other')
+
+
+@pytest.mark.asyncio
+async def test_list_games(base_game_db):
+    await base_game_db.add_game('1', 1, 1000)
+    await base_game_db.add_game('2', 2, 2000)
+    await base_game_db.add_player('1', TEST_USER)
+    open_games, _ = await base_game_db.list_games()
+    assert [entry.room_number for entry in open_games] == ['2']
+    await base_game_db.remove_player('1', TEST_USER)
+    open_games, _ = await base_game_db.list_games(max_cash=1000)
+    assert [entry.room_number for entry in open_games] == ['1']
+
+
+@pytest.mark.asyncio
+async def test_room_lock_prevents_lost_updates(base_game_db):
+    base_game_db._QUERY_TIME = 0.001
+    await base_game_db.add_game('1', 2, 1000)
+    await base_game_db.add_game('2', 2, 1000)
+
+    async def bet(room_number, player_idx):
+        # Same read-await-write sequence as the bet command in poker_mqtt
+        async with base_game_db.room_lock(room_number):
+            the_game = await base_game_db.get_game(room_number)
+            player_cash = the_game.get_player_cash()
+            cash, the_pot = player_cash[player_idx], the_game.the_pot
+            await base_game_db.get_game_info(room_number)
+            await asyncio.sleep(0)
+            player_cash[player_idx] = cash - 10
+            the_game.the_pot = the_pot + 10
+
+    await asyncio.gather(*[bet(room_number, i % 2) for i in range(100) for room_number in ('1', '2')])
+    for room_number in ('1', '2'):
+        the_game = await base_game_db.get_game(room_number)
+        assert the_game.the_pot == 1000
+        assert list(the_game.get_player_cash()) == [500, 500]
+    assert base_game_db._room_locks == {}
+
+
+@pytest.mark.asyncio
+async def test_room_lock_of_unknown_room_is_not_kept(base_game_db):
+    for i in range(100):
+        async with base_game_db.room_lock('no such room ' + str(i)):
+            assert base_game_db.is_room_locked('no such room ' + str(i))
+    assert base_game_db._room_locks == {}
+
+
 if __name__ == '__main__':
     pytest.main()
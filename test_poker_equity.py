@@ -0,0 +1,50 @@
+import pytest
+from poker_equity import parse_range, parse_board, range_equity, chen_score
+
+
+def test_parse_range():
+    assert len(parse_range('AA')) == 6
+    assert len(parse_range('AKs')) == 4
+    assert len(parse_range('AKo')) == 12
+    assert len(parse_range('AK')) == 16
+    assert len(parse_range('TT+')) == 5 * 6
+    assert len(parse_range('A2s+')) == 12 * 4
+    assert parse_range('22-55') == parse_range('55-22') == parse_range('22, 33, 44, 55')
+    assert parse_range('A5s-A2s') == parse_range('A2s, A3s, A4s, A5s')
+    assert len(parse_range('pairs')) == 13 * 6
+    assert len(parse_range('random')) == 1326
+    assert set(parse_range('QQ+, AKs:0.5').values()) == {1.0, 0.5}
+    assert parse_range('AsKh') == parse_range('KhAs')
+    with pytest.raises(ValueError):
+        parse_range('AAs')
+    with pytest.raises(ValueError):
+        parse_range('AKs-QJs')
+
+
+def test_top_percent_starts_with_the_strongest_hands():
+    assert chen_score(14, 14, False) == 20
+    assert chen_score(7, 2, False) == -1
+    top = parse_range('top 3%')
+    assert set(parse_range('AA, KK, QQ')) <= set(top)
+    assert len(top) >= 0.03 * 1326
+    assert set(parse_range('top 10%')) > set(top)
+
+
+def test_range_equity():
+    result = range_equity([parse_range('AA'), parse_range('KK')], samples=1000, workers=1, seed=1)
+    assert 0.78 < result.equities[0] < 0.86
+    assert result.equities[0] + result.equities[1] == pytest.approx(1)
+    assert not result.exhaustive
+    # On the river the made flush always wins, and no combo holding a board card is dealt
+    result = range_equity([parse_range('AsKs'), parse_range('QQ')], parse_board('2s7s9sQd3c'), workers=1)
+    assert result.exhaustive and result.boards == 1
+    assert result.equities == [1.0, 0.0]
+    assert set(result.combo_equities[1]) == {'QsQh', 'QsQc', 'QhQc'}
+    # Identical ranges split evenly, and the pool gives the same answer as a single process
+    board = parse_board('2s7s9d')
+    single = range_equity([parse_range('AK'), parse_range('AK')], board, workers=1)
+    assert single.equities[0] == pytest.approx(0.5)
+    assert range_equity([parse_range('AK'), parse_range('AK')], board, workers=2).equities == \
+        pytest.approx(single.equities)
+    with pytest.raises(ValueError):
+        range_equity([parse_range('AsKs'), parse_range('AsKs')], workers=1)
@@ -0,0 +1,73 @@
+from action_clock import ActionClock
+from poker_db import AsyncPokerGameDB
+from poker_lifecycle import RoomLifecycleManager
+from user_db import UserDB
+import pytest
+
+
+@pytest.fixture
+def base_game_db(tmp_path):
+    the_game_db = AsyncPokerGameDB(UserDB(), hibernate_dir=str(tmp_path))
+    the_game_db._QUERY_TIME = 0
+    return the_game_db
+
+
+@pytest.fixture
+def base_lifecycle(base_game_db):
+    return RoomLifecycleManager(base_game_db, idle_timeout=10, finished_retention=20, retention=100)
+
+
+@pytest.mark.asyncio
+async def test_idle_room_hibernates_and_rehydrates(base_game_db, base_lifecycle):
+    await base_game_db.add_game('1', 2, 1000)
+    await base_game_db.add_player('1', 'tester')
+    the_game = await base_game_db.get_game('1')
+    the_game.the_pot = 300
+    base_lifecycle.sweep(now=base_game_db.last_activity['1'] + 11)
+    assert base_game_db.is_hibernated('1')
+    assert base_game_db.resident_rooms() == []
+    the_game = await base_game_db.get_game('1')
+    assert the_game.the_pot == 300
+    assert (await base_game_db.get_game_info('1')).players == ['tester']
+    assert base_lifecycle.stats.hibernations == 1
+    assert base_game_db.rehydrations == 1
+
+
+@pytest.mark.asyncio
+async def test_abandoned_and_finished_rooms_are_deleted(base_game_db, base_lifecycle):
+    await base_game_db.add_game('1', 2, 1000)
+    await base_game_db.add_game('2', 2, 1000)
+    finished_game = await base_game_db.get_game('2')
+    for _ in range(5):
+        finished_game.community_draw()
+    start = max(base_game_db.last_activity.values())
+    base_lifecycle.sweep(now=start + 11)
+    base_lifecycle.sweep(now=start + 21)
+    assert await base_game_db.get_game('2') is None
+    assert base_game_db.is_hibernated('1')
+    base_lifecycle.sweep(now=start + 101)
+    assert await base_game_db.get_game('1') is None
+    assert base_lifecycle.stats.deletions == 2
+    assert len(base_game_db.lobby) == 0
+
+
+@pytest.mark.asyncio
+async def test_memory_per_room(base_game_db, base_lifecycle):
+    assert base_lifecycle.memory_per_room() == 0
+    await base_game_db.add_game('1', 2, 1000)
+    assert base_lifecycle.memory_per_room() > 0
+
+
+@pytest.mark.asyncio
+async def test_deleted_room_stops_its_action_clock(base_game_db):
+    action_clock = ActionClock(lambda client, room_number, username: None)
+    lifecycle = RoomLifecycleManager(base_game_db, retention=100, action_clock=action_clock)
+    await base_game_db.add_game('1', 2, 1000)
+    action_clock.start_round('1', ['tester', 'other'])
+    lifecycle.sweep(now=base_game_db.last_activity['1'] + 101)
+    assert action_clock.on_clock('1') is None
+    assert action_clock.wheel.pending == 0
+
+
+if __name__ == '__main__':
+    pytest.main()
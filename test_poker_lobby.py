@@ -0,0 +1,46 @@
+from poker_lobby import LobbyIndex
+import pytest
+
+
+@pytest.fixture
+def base_lobby():
+    the_lobby = LobbyIndex()
+    for room_number, starting_cash in (('1', 500), ('2', 1000), ('3', 1000), ('4', 5000)):
+        the_lobby.add_room(room_number, 2, starting_cash)
+    return the_lobby
+
+
+def test_open_rooms_pages_in_cash_order(base_lobby):
+    page, cursor = base_lobby.open_rooms(limit=2)
+    assert [entry.room_number for entry in page] == ['1', '2']
+    page, cursor = base_lobby.open_rooms(limit=2, after=cursor)
+    assert [entry.room_number for entry in page] == ['3', '4']
+    assert cursor is None
+
+
+def test_open_rooms_cash_range(base_lobby):
+    page, cursor = base_lobby.open_rooms(min_cash=600, max_cash=1000)
+    assert [entry.room_number for entry in page] == ['2', '3']
+    assert cursor is None
+
+
+def test_full_rooms_leave_the_index(base_lobby):
+    base_lobby.player_joined('2')
+    base_lobby.player_joined('2')
+    page, _ = base_lobby.open_rooms()
+    assert [entry.room_number for entry in page] == ['1', '3', '4']
+    base_lobby.player_left('2')
+    page, _ = base_lobby.open_rooms()
+    assert [entry.room_number for entry in page] == ['1', '2', '3', '4']
+    assert page[1].open_seats == 1
+
+
+def test_remove_room(base_lobby):
+    base_lobby.remove_room('1')
+    page, _ = base_lobby.open_rooms()
+    assert [entry.room_number for entry in page] == ['2', '3', '4']
+    assert len(base_lobby) == 3
+
+
+if __name__ == '__main__':
+    pytest.main()
@@ -2,10 +2,21 @@ import asyncio
 import pytest
 import poker_mqtt
 from asyncio_mqtt import Client, MqttError
+from event_loop import select_event_loop
+from poker_capture import CapturingClient
+from user_db import new_session_keys, open_session
 
 
-# Change to the "Selector" event loop
-asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
+# The selector event loop on Windows; asyncio's own loop elsewhere
+select_event_loop(prefer_uvloop=False)
+
+
+@pytest.fixture
+def fresh_server(tmp_path, monkeypatch):
+    # A server keeping its accounts and logs in a temporary directory, so tests start empty and leave the tree clean
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(poker_mqtt, 'SERVER', poker_mqtt.PokerServer(accounts_dir=str(tmp_path / 'user_accounts')))
+    return poker_mqtt.SERVER
 
 
 async def create_sample_game():
@@ -14,7 +25,7 @@ async def create_sample_game():
 
 
 @pytest.mark.asyncio
-async def test_create_game():
+async def test_create_game(fresh_server):
     async with Client("localhost") as client:
         test_message = "2,3,5000"
         test_response = await poker_mqtt.create_game(client, test_message, test=True)
@@ -24,15 +35,15 @@ async def test_create_game():
 
 
 @pytest.mark.asyncio
-async def test_create_user():
+async def test_create_user(fresh_server):
     async with Client("localhost") as client:
-        test_message = "player1"
+        test_message = "player1, hunter2"
         test_response = await poker_mqtt.create_user(client, test_message, test=True)
         assert test_response == "users/player1/create_success=True"
 
 
 @pytest.mark.asyncio
-async def test_add_player_to_game():
+async def test_add_player_to_game(fresh_server):
     async with Client("localhost") as client:
         await create_sample_game()
         test_message = "2,player1"
@@ -41,7 +52,7 @@ async def test_add_player_to_game():
 
 
 @pytest.mark.asyncio
-async def test_init_game():
+async def test_init_game(fresh_server):
     async with Client("localhost") as client:
         await create_sample_game()
         test_message = "2"
@@ -50,7 +61,7 @@ async def test_init_game():
 
 
 @pytest.mark.asyncio
-async def test_bet():
+async def test_bet(fresh_server):
     async with Client("localhost") as client:
         await create_sample_game()
         await poker_mqtt.add_player_to_game(client, "2,player1", test=True)
@@ -58,3 +69,111 @@ async def test_bet():
         test_response_1, test_response_2 = await poker_mqtt.bet(client, test_message, test=True)
         assert test_response_1 == "game_rooms/2/players/player1/cash=$4800"
         assert test_response_2 == "game_rooms/2/community_cards_and_pot/the_pot=200"
+
+
+class _SlowClient(object):
+    # Yields to the event loop on every publish, like a real client waiting for the broker
+    def __init__(self):
+        self.publishes = []
+
+    async def publish(self, topic, payload=None, qos=0, retain=False):
+        self.publishes.append((topic, payload))
+        await asyncio.sleep(0)
+
+
+@pytest.mark.asyncio
+async def test_credentials_are_never_published(fresh_server):
+    client = _SlowClient()
+    await poker_mqtt.dispatch(client, "create_user felix, hunter2")
+    private_key, public_key = new_session_keys()
+    await poker_mqtt.dispatch(client, "login felix, hunter2, " + public_key)
+    assert all("hunter2" not in str(payload) for _, payload in client.publishes)
+    sealed_token = dict(client.publishes)["users/ felix/session"]
+    token = open_session(sealed_token, private_key)
+    assert fresh_server.user_db.check_session(token) == " felix"
+    with pytest.raises(MqttError):
+        await poker_mqtt.dispatch(client, "create_user john")
+
+
+@pytest.mark.asyncio
+async def test_login_with_commas_in_the_password(fresh_server):
+    client = _SlowClient()
+    await poker_mqtt.dispatch(client, "create_user felix, pa,ss")
+    private_key, public_key = new_session_keys()
+    await poker_mqtt.dispatch(client, "login felix, pa,ss, " + public_key)
+    token = open_session(dict(client.publishes)["users/ felix/session"], private_key)
+    assert fresh_server.user_db.check_session(token) == " felix"
+    with pytest.raises(MqttError):
+        await poker_mqtt.dispatch(client, "login felix, pa, " + public_key)
+
+
+@pytest.mark.asyncio
+async def test_concurrent_bets_through_dispatch(fresh_server):
+    fresh_server.poker_db._QUERY_TIME = 0.001
+    client = CapturingClient(_SlowClient())
+    for message in ("create_game 2, 2, 5000", "add_player_to_game 2, alice", "add_player_to_game 2, bob",
+                    "init_game 2"):
+        await poker_mqtt.dispatch(client, message, authenticated=True)
+    client.publishes.clear()
+    await asyncio.gather(*(poker_mqtt.dispatch(client, "bet 2, " + username + ", 10", authenticated=True)
+                           for _ in range(50) for username in ("alice", "bob")))
+    the_game = await fresh_server.poker_db.get_game(" 2")
+    assert the_game.the_pot == 1000
+    assert list(the_game.get_player_cash()) == [4500, 4500]
+    # Each bet publishes the pot as it left it, so no other bet on the room ran in between
+    pots = [payload for topic, payload in client.publishes if topic.endswith("/the_pot")]
+    assert sorted(pots, key=int) == [str(10 * i) for i in range(1, 101)]
+    assert fresh_server.poker_db._room_locks == {}
+
+
+@pytest.mark.asyncio
+async def test_failed_hand_record_still_settles(fresh_server, monkeypatch):
+    def full_disk(*args):
+        raise OSError(28, 'No space left on device')
+
+    monkeypatch.setattr(fresh_server.hand_history, 'append', full_disk)
+    client = CapturingClient()
+    for message in ("create_game 2, 2, 5000", "add_player_to_game 2, alice", "add_player_to_game 2, bob",
+                    "init_game 2", "bet 2, alice, 100", "bet 2, bob, 100", "the_flop 2", "the_turn 2",
+                    "the_river 2"):
+        await poker_mqtt.dispatch(client, message, authenticated=True)
+    the_game = await fresh_server.poker_db.get_game(" 2")
+    assert the_game.the_pot == 0
+    assert sum(the_game.get_player_cash()) == 10000
+
+
+@pytest.mark.asyncio
+async def test_failed_timeout_action_stops_the_clock(fresh_server):
+    fresh_server.action_clock.start_round(" 2", ["alice", "bob"])
+    while fresh_server.action_clock.timeouts == 0:
+        fresh_server.action_clock.wheel.advance()
+    # Room 2 does not exist, so the check made for alice fails
+    await asyncio.gather(*fresh_server.command_tasks, return_exceptions=True)
+    await asyncio.sleep(0)
+    assert fresh_server.action_clock.on_clock(" 2") is None
+
+
+@pytest.mark.asyncio
+async def test_recovery_after_a_swept_room_is_created_again(fresh_server, monkeypatch, tmp_path):
+    client = CapturingClient()
+    await poker_mqtt.dispatch(client, "create_game 5, 2, 1000", authenticated=True)
+    await fresh_server.wal.checkpoint(fresh_server.poker_db.dump_rooms)
+    fresh_server.lifecycle.sweep(now=fresh_server.poker_db.last_activity[" 5"] + 86400)
+    await poker_mqtt.dispatch(client, "create_game 5, 6, 9999", authenticated=True)
+    # Crash, then start a new server on the same files
+    fresh_server.wal.close()
+    monkeypatch.setattr(poker_mqtt, 'SERVER', poker_mqtt.PokerServer(accounts_dir=str(tmp_path / 'user_accounts')))
+    await poker_mqtt.recover()
+    game_info = await poker_mqtt.SERVER.poker_db.get_game_info(" 5")
+    assert (game_info.num_players, game_info.starting_cash) == (6, 9999)
+
+
+@pytest.mark.asyncio
+async def test_a_new_server_publishes_its_own_lobby(fresh_server, monkeypatch, tmp_path):
+    await poker_mqtt.dispatch(CapturingClient(), "create_game 5, 2, 1000", authenticated=True)
+    monkeypatch.setattr(poker_mqtt, 'SERVER', poker_mqtt.PokerServer(accounts_dir=str(tmp_path / 'user_accounts')))
+    (tmp_path / 'restarted').mkdir()
+    monkeypatch.chdir(tmp_path / 'restarted')  # without the first server's write-ahead log
+    client = CapturingClient()
+    await poker_mqtt.dispatch(client, "create_game 5, 2, 1000", authenticated=True)
+    assert [topic for topic, _ in client.publishes if topic == "lobby"] == ["lobby"]
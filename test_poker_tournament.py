@@ -0,0 +1,57 @@
+from dataclasses import replace
+from functools import partial
+from poker_bots import RandomBot, PotOddsBot
+from poker_tournament import TournamentConfig, BlindLevel, blind_level, prize_amounts, balance_tables, \
+    play_tournament, simulate
+
+
+def test_blind_levels_double_after_the_schedule():
+    config = TournamentConfig(blinds=(BlindLevel(10, 20), BlindLevel(20, 40, 5)), hands_per_level=5)
+    assert blind_level(config, 4) == BlindLevel(10, 20)
+    assert blind_level(config, 5) == BlindLevel(20, 40, 5)
+    assert blind_level(config, 10) == BlindLevel(40, 80, 10)
+    assert blind_level(config, 15) == BlindLevel(80, 160, 20)
+
+
+def test_prize_amounts():
+    assert prize_amounts(TournamentConfig(num_players=10, buy_in=10, payouts=(0.5, 0.33, 0.17))) == [50, 33, 17]
+    assert prize_amounts(TournamentConfig(num_players=3, buy_in=1, payouts=(0.7, 0.3))) == [3, 0]
+
+
+def test_balance_tables():
+    # 12 players fit on two tables of 9, so the shortest table is broken
+    tables = balance_tables([[0, 1, 2, 3, 4], [5, 6, 7, 8], [9, 10, 11]], 9)
+    assert sorted(map(len, tables)) == [6, 6]
+    assert sorted(player for table in tables for player in table) == list(range(12))
+    assert sorted(map(len, balance_tables([[0, 1, 2, 3, 4, 5, 6, 7, 8], [9, 10, 11, 12], []], 9))) == [6, 7]
+
+
+def test_play_tournament_is_seeded_and_conserves_places():
+    config = TournamentConfig(num_players=20, table_size=6, starting_stack=500,
+                              strategies=(RandomBot, partial(RandomBot, bet_probability=0.8)))
+    result = play_tournament(config, 7)
+    assert result == play_tournament(config, 7)
+    assert sorted(result.places) == list(range(1, 21))
+    assert sum(result.prizes) == config.buy_in * config.num_players
+    assert result.prizes[result.places.index(1)] == prize_amounts(config)[0]
+    assert 0 < result.hands < config.max_hands
+
+
+def test_simulate_does_not_depend_on_workers():
+    config = TournamentConfig(num_players=12, table_size=6, starting_stack=300)
+    single = simulate(config, 6, seed=1, workers=1, chunk_size=4)
+    pooled = simulate(config, 6, seed=1, workers=2, chunk_size=4)
+    assert single.tournaments == pooled.tournaments == 6
+    assert single.by_strategy == pooled.by_strategy
+    assert single.by_strategy['RandomBot'].entries == 72
+    assert single.by_strategy['RandomBot'].wins == 6
+
+
+def test_pot_odds_tournaments_do_not_depend_on_load():
+    config = TournamentConfig(num_players=6, table_size=6, starting_stack=300,
+                              strategies=(partial(PotOddsBot, samples=10), RandomBot))
+    # A budget no decision can meet would turn every pot-odds decision into a check if it were enforced
+    impatient = replace(config, strategies=(partial(PotOddsBot, samples=10, time_budget=1e-9), RandomBot))
+    assert play_tournament(impatient, 3) == play_tournament(config, 3)
+    assert simulate(config, 2, seed=3, workers=2, chunk_size=1).by_strategy == \
+        simulate(impatient, 2, seed=3, workers=1, chunk_size=1).by_strategy
@@ -0,0 +1,78 @@
+import asyncio
+from poker_db import AsyncPokerGameDB
+from poker_wal import WriteAheadLog
+from user_db import UserDB
+import pytest
+
+
+@pytest.fixture
+def base_wal(tmp_path):
+    the_wal = WriteAheadLog(str(tmp_path / 'wal.log'), str(tmp_path / 'checkpoint.bin'), commit_window=0.01)
+    yield the_wal
+    the_wal.close()
+
+
+@pytest.mark.asyncio
+async def test_group_commit(base_wal):
+    seqs = await asyncio.gather(*[base_wal.append('bet 2, player1, ' + str(i)) for i in range(10)])
+    assert seqs == list(range(1, 11))
+    assert base_wal.stats.commits == 1
+    assert base_wal.stats.records_per_commit == 10
+    assert [record.command for record in base_wal.read_records(after_seq=8)] == ['bet 2, player1, 8',
+                                                                                 'bet 2, player1, 9']
+
+
+@pytest.mark.asyncio
+async def test_torn_record_is_ignored(base_wal, tmp_path):
+    await base_wal.append('create_game 2, 3, 5000', seed=7)
+    base_wal.close()
+    with open(tmp_path / 'wal.log', 'ab') as f:
+        f.write(b'{"seq": 2, "comm')
+    records = list(WriteAheadLog(str(tmp_path / 'wal.log'), str(tmp_path / 'checkpoint.bin')).read_records())
+    assert [(record.command, record.seed) for record in records] == [('create_game 2, 3, 5000', 7)]
+
+
+@pytest.mark.asyncio
+async def test_checkpoint_restores_rooms(base_wal, tmp_path):
+    game_db = AsyncPokerGameDB(UserDB(), hibernate_dir=str(tmp_path))
+    game_db._QUERY_TIME = 0
+    await base_wal.append('create_game 1, 2, 1000', seed=1)
+    await game_db.add_game('1', 2, 1000, seed=1)
+    await base_wal.append('add_player_to_game 1, tester')
+    await game_db.add_player('1', 'tester')
+    base_wal.write_checkpoint(game_db.dump_rooms())
+    assert list(base_wal.read_records()) == []
+
+    recovered_db = AsyncPokerGameDB(UserDB(), hibernate_dir=str(tmp_path))
+    checkpoint_seq, rooms = WriteAheadLog(str(tmp_path / 'wal.log'), str(tmp_path / 'checkpoint.bin')).load_checkpoint()
+    recovered_db.restore_rooms(rooms)
+    assert checkpoint_seq == 2
+    assert (await recovered_db.get_game_info('1')).players == ['tester']
+    assert (await recovered_db.get_game('1')).to_bytes() == (await game_db.get_game('1')).to_bytes()
+    assert recovered_db.lobby.get('1').open_seats == 1
+
+
+@pytest.mark.asyncio
+async def test_checkpoint_waits_for_commands_in_flight(base_wal):
+    events = []
+
+    async def command():
+        async with base_wal.command():
+            await base_wal.append('the_flop 2')
+            await asyncio.sleep(0.02)
+            events.append('command')
+
+    def dump_rooms():
+        events.append('checkpoint')
+        return {}
+
+    command_task = asyncio.create_task(command())
+    await asyncio.sleep(0.001)
+    await base_wal.checkpoint(dump_rooms)
+    await command_task
+    assert events == ['command', 'checkpoint']
+    assert base_wal.records_since_checkpoint == 0
+
+
+if __name__ == '__main__':
+    pytest.main()
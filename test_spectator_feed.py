@@ -0,0 +1,64 @@
+import json
+from dataclasses import asdict
+from poker_capture import CapturingClient
+from poker_db import AsyncPokerGameDB
+from spectator_feed import SpectatorFeed
+from user_db import UserDB
+import pytest
+
+
+@pytest.fixture
+def base_game_db(tmp_path):
+    the_game_db = AsyncPokerGameDB(UserDB(), hibernate_dir=str(tmp_path))
+    the_game_db._QUERY_TIME = 0
+    return the_game_db
+
+
+@pytest.fixture
+def base_feed(base_game_db):
+    return SpectatorFeed(base_game_db, tick_interval=0.01)
+
+
+@pytest.mark.asyncio
+async def test_changes_are_coalesced_per_tick(base_game_db, base_feed):
+    await base_game_db.add_game('1', 2, 1000)
+    await base_game_db.add_game('2', 2, 1000)
+    for _ in range(10):
+        base_feed.mark_dirty('1')
+    base_feed.mark_dirty('2')
+    client = CapturingClient()
+    await base_feed.tick(client)
+    assert [topic for topic, _ in client.publishes] == ['game_rooms/1/spectators', 'game_rooms/2/spectators']
+    assert base_feed.stats.coalesced == 9
+    await base_feed.tick(client)
+    assert len(client.publishes) == 2
+
+
+@pytest.mark.asyncio
+async def test_hole_cards_hidden_until_showdown(base_game_db, base_feed):
+    await base_game_db.add_game('1', 2, 1000)
+    await base_game_db.add_player('1', 'tester1')
+    await base_game_db.add_player('1', 'tester2')
+    the_game = await base_game_db.get_game('1')
+    the_game.initial_deal()
+    the_game.bet(0, 100)
+    view = json.loads(base_feed.snapshot('1'))
+    assert view['pot'] == 100
+    assert [player['hand'] for player in view['players']] == [[None, None], [None, None]]
+    for _ in range(5):
+        the_game.community_draw()
+    the_game.compute_winner()
+    the_game.the_pot = 0
+    view = json.loads(base_feed.snapshot('1'))
+    assert len(view['community_cards']) == 5
+    assert view['players'][0]['hand'][0] == asdict(the_game.get_player_stacks()[0][0])
+
+
+@pytest.mark.asyncio
+async def test_deleted_room_is_cleared(base_game_db, base_feed):
+    await base_game_db.add_game('1', 2, 1000)
+    base_game_db.delete_game('1')
+    base_feed.mark_dirty('1')
+    client = CapturingClient()
+    await base_feed.tick(client)
+    assert client.publishes == [('game_rooms/1/spectators', '')]
@@ -0,0 +1,60 @@
+import asyncio
+from timing_wheel import TimingWheel
+import pytest
+
+
+@pytest.fixture
+def base_wheel():
+    return TimingWheel(tick=1, slots=4, levels=3)
+
+
+def advance_until_fired(wheel, fired, max_ticks=1000):
+    for _ in range(max_ticks):
+        if fired:
+            return wheel.now
+        wheel.advance()
+    return None
+
+
+@pytest.mark.parametrize('delay', [1, 3, 4, 5, 15, 16, 17, 40, 63, 64, 100])
+def test_fires_exactly_at_deadline(base_wheel, delay):
+    base_wheel.advance()  # start away from slot boundaries
+    start = base_wheel.now
+    fired = []
+    base_wheel.schedule(delay, lambda: fired.append(base_wheel.now))
+    assert advance_until_fired(base_wheel, fired) == start + delay
+    assert fired == [start + delay]
+    assert base_wheel.pending == 0
+
+
+def test_cancel(base_wheel):
+    fired = []
+    timers = [base_wheel.schedule(delay, lambda delay=delay: fired.append(delay)) for delay in (2, 20, 50)]
+    base_wheel.cancel(timers[1])
+    base_wheel.cancel(timers[1])
+    assert base_wheel.pending == 2
+    for _ in range(60):
+        base_wheel.advance()
+    assert fired == [2, 50]
+    base_wheel.cancel(timers[0])
+    assert base_wheel.pending == 0
+
+
+def test_many_timers_fire_in_deadline_order():
+    wheel = TimingWheel(tick=1, slots=8, levels=3)
+    fired = []
+    for delay in range(300, 0, -1):
+        wheel.schedule(delay, lambda delay=delay: fired.append((delay, wheel.now)))
+    for _ in range(300):
+        wheel.advance()
+    assert fired == [(delay, delay) for delay in range(1, 301)]
+
+
+@pytest.mark.asyncio
+async def test_run_in_real_time():
+    wheel = TimingWheel(tick=0.01)
+    fired = asyncio.Event()
+    wheel.schedule(0.05, fired.set)
+    run_task = asyncio.create_task(wheel.run())
+    await asyncio.wait_for(fired.wait(), 1)
+    run_task.cancel()
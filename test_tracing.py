@@ -0,0 +1,57 @@
+import asyncio
+import json
+from tracing import Tracer, JsonLinesExporter
+import pytest
+
+
+@pytest.fixture
+def base_tracer(tmp_path):
+    return Tracer(1.0, JsonLinesExporter(str(tmp_path / 'traces.jsonl'))), tmp_path / 'traces.jsonl'
+
+
+def read_spans(tracer, path):
+    tracer.exporter.flush()
+    with open(path) as f:
+        return [json.loads(line) for line in f]
+
+
+@pytest.mark.asyncio
+async def test_nested_spans_across_tasks(base_tracer):
+    tracer, path = base_tracer
+
+    async def query():
+        with tracer.span('db.get_game'):
+            await asyncio.sleep(0)
+
+    with tracer.span('game_command', command='bet') as root:
+        await asyncio.gather(query(), query())
+    spans = read_spans(tracer, path)
+    assert [span['name'] for span in spans] == ['db.get_game', 'db.get_game', 'game_command']
+    assert all(span['traceId'] == spans[-1]['traceId'] for span in spans)
+    assert all(span['parentSpanId'] == spans[-1]['spanId'] for span in spans[:2])
+    assert spans[-1]['attributes'] == {'command': 'bet'}
+    assert spans[-1]['endTimeUnixNano'] >= spans[-1]['startTimeUnixNano']
+    assert root is not None
+
+
+def test_error_status(base_tracer):
+    tracer, path = base_tracer
+    with pytest.raises(KeyError):
+        with tracer.span('db.get_game_info'):
+            raise KeyError('1')
+    assert read_spans(tracer, path)[0]['status'] == 'ERROR'
+
+
+def test_unsampled_trace_records_nothing(base_tracer):
+    tracer, path = base_tracer
+    tracer.sample_rate = 0
+    with tracer.span('game_command') as root:
+        with tracer.span('db.get_game') as child:
+            pass
+    assert root is None and child is None
+    tracer.exporter.flush()
+    assert not path.exists()
+
+
+if __name__ == '__main__':
+    pytest.main()
@@ -1,5 +1,7 @@
+from concurrent.futures import ThreadPoolExecutor
+import threading
 import pytest
-from user_db import UserDB
+from user_db import UserDB, new_session_keys, seal_session, open_session
 
 
 @pytest.fixture
@@ -14,6 +16,27 @@ def test_create_user(empty_userdb):
     assert passtoken != empty_userdb._accounts[username]
 
 
+def test_create_user_with_chosen_password(empty_userdb):
+    assert empty_userdb.create_user('jimbo', 'hunter2') == ('jimbo', 'hunter2')
+    assert empty_userdb.is_valid('jimbo', 'hunter2')
+    assert b'hunter2' not in empty_userdb._accounts['jimbo']
+    with pytest.raises(ValueError):
+        empty_userdb.create_user('jumbo', '')
+
+
+def test_sealed_session(empty_userdb):
+    empty_userdb.create_user('jimbo', 'hunter2')
+    private_key, public_key = new_session_keys()
+    token = empty_userdb.login('jimbo', 'hunter2')
+    sealed_token = seal_session(token, public_key)
+    assert token not in sealed_token
+    assert open_session(sealed_token, private_key) == token
+    with pytest.raises(Exception):
+        open_session(sealed_token, new_session_keys()[0])
+    with pytest.raises(ValueError):
+        seal_session(token, 'not a key')
+
+
 def test_check_login(empty_userdb):
     test_username = 'rdwrer'
     username, passtoken = empty_userdb.create_user(test_username)
@@ -25,5 +48,62 @@ def test_check_login(empty_userdb):
         test_username, passtoken) is True
 
 
+def test_session(empty_userdb):
+    username, passtoken = empty_userdb.create_user('rdwrer')
+    with pytest.raises(ValueError):
+        empty_userdb.login(username, 'baddpasstoken')
+    token = empty_userdb.login(username, passtoken)
+    assert empty_userdb.check_session(token) == username
+    assert empty_userdb.check_session(token) == username  # served from the verified-token cache
+    assert empty_userdb.check_session(token[:-2] + 'AA') is None
+    assert empty_userdb.check_session('not a token') is None
+    empty_userdb.revoke_session(token)
+    assert empty_userdb.check_session(token) is None
+
+
+def test_session_expiry():
+    the_user_db = UserDB(session_ttl=-1)
+    username, passtoken = the_user_db.create_user('jimbo')
+    assert the_user_db.check_session(the_user_db.login(username, passtoken)) is None
+
+
+def test_session_key():
+    issuer = UserDB(session_key=b'k' * 32)
+    username, passtoken = issuer.create_user('jimbo')
+    token = issuer.login(username, passtoken)
+    assert UserDB(session_key=b'k' * 32).check_session(token) == username
+    assert UserDB().check_session(token) is None
+
+
+def test_create_users():
+    the_user_db = UserDB(cost_profile='test')
+    the_user_db.create_user('jimbo')
+    with pytest.raises(ValueError):
+        the_user_db.create_users(['a', 'jimbo'])
+    with pytest.raises(ValueError):
+        the_user_db.create_users(['a', 'a'])
+    created = the_user_db.create_users(['user' + str(i) for i in range(20)], max_workers=2)
+    assert [username for username, _ in created] == ['user' + str(i) for i in range(20)]
+    assert all(the_user_db.is_valid(username, passtoken) for username, passtoken in created)
+    assert 'a' not in the_user_db._accounts
+
+
+def test_concurrent_creations_claim_a_username_once():
+    the_user_db = UserDB(cost_profile='test')
+    start = threading.Barrier(8)
+
+    def create(password):
+        start.wait()
+        try:
+            return the_user_db.create_user('jimbo', password)
+        except ValueError:
+            return None
+
+    with ThreadPoolExecutor(8) as pool:
+        created = [result for result in pool.map(create, ['password' + str(i) for i in range(8)]) if result]
+    assert len(created) == 1
+    assert the_user_db.is_valid('jimbo', created[0][1])
+
+
 if __name__ == '__main__':
     pytest.main()
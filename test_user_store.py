@@ -0,0 +1,93 @@
+from concurrent.futures import ThreadPoolExecutor
+import json
+from user_store import ShardedAccountStore
+from user_db import UserDB
+import pytest
+
+
+@pytest.fixture
+def base_store(tmp_path):
+    the_store = ShardedAccountStore(str(tmp_path / 'accounts'), num_shards=4)
+    yield the_store
+    the_store.close()
+
+
+def test_set_and_get(base_store):
+    accounts = {'user' + str(i): ('hash' + str(i)).encode() for i in range(500)}
+    base_store.update(accounts.items())
+    assert len(base_store) == 500
+    assert all(base_store[username] == value for username, value in accounts.items())
+    assert 'nobody' not in base_store
+    with pytest.raises(KeyError):
+        base_store['nobody']
+    base_store['user7'] = b'new hash'
+    assert base_store['user7'] == b'new hash'
+    assert len(base_store) == 500
+    assert sorted(base_store) == sorted(accounts)
+
+
+def test_every_shard_receives_accounts(base_store, tmp_path):
+    base_store.update(('user' + str(i), b'hash') for i in range(200))
+    shard_sizes = [len(base_store._shard(shard_idx)) for shard_idx in range(4)]
+    assert all(size > 20 for size in shard_sizes)
+    assert len(list((tmp_path / 'accounts').glob('shard_*.dat'))) == 4
+
+
+def test_store_with_odd_shards_stays_readable(tmp_path):
+    # Stores created before the shard key was recorded put every account on an odd shard
+    (tmp_path / 'accounts').mkdir()
+    (tmp_path / 'accounts' / 'store.json').write_text(json.dumps({'num_shards': 4}))
+    the_store = ShardedAccountStore(str(tmp_path / 'accounts'))
+    the_store.update(('user' + str(i), b'hash') for i in range(50))
+    assert sorted(path.name for path in (tmp_path / 'accounts').glob('shard_*.dat')) == ['shard_0001.dat',
+                                                                                        'shard_0003.dat']
+    assert len(the_store) == 50 and the_store['user7'] == b'hash'
+    the_store.close()
+
+
+def test_concurrent_reads(base_store):
+    accounts = {'user' + str(i): ('hash' * (i % 7 + 1) + str(i)).encode() for i in range(200)}
+    base_store.update(accounts.items())
+    usernames = list(accounts) * 50
+
+    def lookup(username):
+        return base_store[username] == accounts[username]
+
+    with ThreadPoolExecutor(8) as pool:
+        assert all(pool.map(lookup, usernames, chunksize=100))
+
+
+def test_reopen(base_store, tmp_path):
+    base_store['jimbo'] = b'hash'
+    base_store.close()
+    reopened = ShardedAccountStore(str(tmp_path / 'accounts'), num_shards=16)
+    assert reopened['jimbo'] == b'hash'
+    assert reopened._num_shards == 4
+    reopened.close()
+
+
+def test_index_is_rebuilt_from_data(base_store, tmp_path):
+    for i in range(100):
+        base_store['user' + str(i)] = b'hash'
+    base_store.close()
+    for index_path in (tmp_path / 'accounts').glob('*.idx'):
+        index_path.unlink()
+    reopened = ShardedAccountStore(str(tmp_path / 'accounts'))
+    assert len(reopened) == 100
+    assert reopened['user42'] == b'hash'
+    reopened.close()
+
+
+def test_user_db_survives_restart(tmp_path):
+    the_user_db = UserDB(cost_profile='test', accounts=ShardedAccountStore(str(tmp_path / 'accounts')))
+    username, passtoken = the_user_db.create_user('rdwrer')
+    the_user_db._accounts.close()
+    restarted = UserDB(accounts=ShardedAccountStore(str(tmp_path / 'accounts')))
+    assert restarted.is_valid(username, passtoken) is True
+    with pytest.raises(ValueError):
+        restarted.create_user('rdwrer')
+    restarted._accounts.close()
+
+
+if __name__ == '__main__':
+    pytest.main()
@@ -0,0 +1,109 @@
+from typing import Callable, List, Set, Optional
+import asyncio
+
+
+class Timer(object):
+    """
+    Handle of a callback scheduled on a TimingWheel.
+    """
+    __slots__ = ('deadline', 'callback', '_slot')
+
+    def __init__(self, deadline: int, callback: Callable[[], None]):
+        self.deadline = deadline  # [ticks]
+        self.callback = callback
+        self._slot: Optional[Set['Timer']] = None
+
+
+class TimingWheel(object):
+    """
+    Hierarchical timing wheel: schedules any number of callbacks with tick resolution at O(1) cost per schedule and
+    per cancel, and O(1) amortized per tick.
+
+    Level 0 has one slot per tick for the next `slots` ticks; each level above has slots `slots` times as wide as
+    the level below. A timer goes into the lowest level that reaches its deadline, and timers in a higher level slot
+    are moved down once the lower level has turned far enough to reach them.
+    """
+    def __init__(self, tick: float = 0.1, slots: int = 256, levels: int = 4):
+        """
+        Constructor for the timing wheel.
+
+        :param tick: seconds per tick
+        :param slots: slots per level
+        :param levels: number of levels; deadlines beyond slots ** levels ticks fire late, at the farthest slot
+        """
+        self.tick = tick
+        self._slots = slots
+        self._levels: List[List[Set[Timer]]] = [[set() for _ in range(slots)] for _ in range(levels)]
+        self.now = 0  # [ticks]
+        self.pending = 0
+
+    def schedule(self, delay: float, callback: Callable[[], None]) -> Timer:
+        """
+        Schedules a callback.
+
+        :param delay: seconds from now; rounded up to whole ticks
+        :param callback: called without arguments by advance() once the delay has passed
+        :return: handle for cancel()
+        """
+        timer = Timer(self.now + max(1, -int(-delay // self.tick)), callback)
+        self._insert(timer)
+        self.pending += 1
+        return timer
+
+    def _insert(self, timer: Timer):
+        delta = timer.deadline - self.now
+        span = self._slots
+        for level, level_slots in enumerate(self._levels):
+            if delta < span or level == len(self._levels) - 1:
+                slot_idx = min(timer.deadline, self.now + span - 1) // (span // self._slots) % self._slots
+                timer._slot = level_slots[slot_idx]
+                timer._slot.add(timer)
+                return
+            span *= self._slots
+
+    def cancel(self, timer: Timer):
+        """
+        Cancels a scheduled callback. Does nothing if it already fired or was cancelled.
+
+        :param timer: the handle returned by schedule()
+        """
+        if timer._slot is not None:
+            timer._slot.discard(timer)
+            timer._slot = None
+            self.pending -= 1
+
+    def advance(self):
+        """
+        Moves the wheel forward one tick and calls the callbacks that are due.
+        """
+        self.now += 1
+        # Move timers down from every level whose slot boundary was just crossed, highest level first
+        span = self._slots ** (len(self._levels) - 1)
+        for level in range(len(self._levels) - 1, 0, -1):
+            if self.now % span == 0:
+                slot = self._levels[level][self.now // span % self._slots]
+                timers = list(slot)
+                slot.clear()
+                for timer in timers:
+                    self._insert(timer)
+            span //= self._slots
+        slot = self._levels[0][self.now % self._slots]
+        due = [timer for timer in slot if timer.deadline <= self.now]
+        for timer in due:
+            slot.discard(timer)
+            timer._slot = None
+            self.pending -= 1
+        for timer in due:
+            timer.callback()
+
+    async def run(self):
+        """
+        Advances the wheel in real time forever, catching up on ticks missed while the event loop was busy.
+        """
+        loop = asyncio.get_running_loop()
+        start = loop.time() - self.now * self.tick
+        while True:
+            await asyncio.sleep(self.tick)
+            target = int((loop.time() - start) / self.tick)
+            while self.now < target:
+                self.advance()
@@ -0,0 +1,149 @@
+from typing import List, Dict, Optional, Any
+from contextvars import ContextVar
+import asyncio
+import contextlib
+import functools
+import json
+import random
+import time
+
+
+class Span(object):
+    """
+    One timed operation within a trace.
+    """
+    __slots__ = ('trace_id', 'span_id', 'parent_span_id', 'name', 'start_ns', 'end_ns', 'attributes', 'status')
+
+    def __init__(self, trace_id: int, parent_span_id: Optional[int], name: str, attributes: Dict[str, Any]):
+        self.trace_id = trace_id
+        self.span_id = random.getrandbits(64)
+        self.parent_span_id = parent_span_id
+        self.name = name
+        self.start_ns = time.time_ns()
+        self.end_ns = 0
+        self.attributes = attributes
+        self.status = 'OK'
+
+    def set_attribute(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        :return: the span with the field names of OpenTelemetry's OTLP/JSON encoding
+        """
+        return {'traceId': '%032x' % self.trace_id,
+                'spanId': '%016x' % self.span_id,
+                'parentSpanId': '' if self.parent_span_id is None else '%016x' % self.parent_span_id,
+                'name': self.name,
+                'startTimeUnixNano': self.start_ns,
+                'endTimeUnixNano': self.end_ns,
+                'attributes': self.attributes,
+                'status': self.status}
+
+
+class JsonLinesExporter(object):
+    """
+    Writes finished spans to a file as one JSON object per line. Spans are buffered until batch_size of them are
+    waiting or flush_interval seconds have passed since the last write.
+    """
+    def __init__(self, path: str = 'traces.jsonl', batch_size: int = 256, flush_interval: float = 5.0):
+        self._path = path
+        self._batch_size = batch_size
+        self._flush_interval = flush_interval
+        self._last_flush = time.monotonic()
+        self._buffer: List[Span] = []
+
+    def export(self, span: Span):
+        self._buffer.append(span)
+        if len(self._buffer) >= self._batch_size or time.monotonic() - self._last_flush >= self._flush_interval:
+            self.flush()
+
+    def flush(self):
+        self._last_flush = time.monotonic()
+        if not self._buffer:
+            return
+        with open(self._path, 'a') as f:
+            f.write(''.join(json.dumps(span.to_dict(), default=str) + '\n' for span in self._buffer))
+        self._buffer.clear()
+
+
+# The span that new spans become children of. _NOT_SAMPLED marks the inside of a trace that sampling dropped, so its
+# nested operations are skipped too instead of starting traces of their own.
+_NOT_SAMPLED = object()
+_current_span: ContextVar[Any] = ContextVar('current_span', default=None)
+
+
+class Tracer(object):
+    """
+    Creates spans and hands finished ones to an exporter.
+
+    Sampling is decided once per trace, when its root span starts: a fraction sample_rate of traces is recorded in
+    full and the rest cost one context variable lookup per span. Spans follow asyncio tasks through contextvars.
+    """
+    def __init__(self, sample_rate: float = 0.0, exporter: JsonLinesExporter = None):
+        self.sample_rate = sample_rate
+        self.exporter = exporter
+
+    def configure(self, sample_rate: float, exporter: JsonLinesExporter):
+        self.sample_rate = sample_rate
+        self.exporter = exporter
+
+    @contextlib.contextmanager
+    def span(self, name: str, **attributes):
+        """
+        Context manager timing the enclosed block as a span.
+
+        :param name: span name, e.g. 'db.get_game'
+        :param attributes: span attributes
+        :return: the Span, or None if the trace is not sampled
+        """
+        parent = _current_span.get()
+        if parent is _NOT_SAMPLED:
+            yield None
+            return
+        if parent is None:
+            if self.exporter is None or random.random() >= self.sample_rate:
+                token = _current_span.set(_NOT_SAMPLED)
+                try:
+                    yield None
+                finally:
+                    _current_span.reset(token)
+                return
+            the_span = Span(random.getrandbits(128), None, name, attributes)
+        else:
+            the_span = Span(parent.trace_id, parent.span_id, name, attributes)
+        token = _current_span.set(the_span)
+        try:
+            yield the_span
+        except BaseException as error:
+            the_span.status = 'ERROR'
+            the_span.attributes['exception.type'] = type(error).__name__
+            raise
+        finally:
+            _current_span.reset(token)
+            the_span.end_ns = time.time_ns()
+            self.exporter.export(the_span)
+
+
+TRACER = Tracer()
+
+
+def traced(name: str):
+    """
+    Decorator running every call of a function or coroutine function inside a span of TRACER.
+
+    :param name: span name
+    """
+    def decorator(func):
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def wrapper(*args, **kwargs):
+                with TRACER.span(name):
+                    return await func(*args, **kwargs)
+        else:
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with TRACER.span(name):
+                    return func(*args, **kwargs)
+        return wrapper
+    return decorator
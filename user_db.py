@@ -1,17 +1,108 @@
-from typing import Tuple, Dict
+from typing import Tuple, Dict, Union, List, Iterable
+from user_store import ShardedAccountStore
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+import base64
+import hashlib
+import hmac
+import os
 import secrets
+import threading
+import time
 import nacl.pwhash
+import nacl.public
 import nacl.exceptions
 
 
+# (opslimit, memlimit) for nacl.pwhash.str. 'interactive' is pwhash's own default and what production accounts use;
+# 'test' is only meant for seeding load-test environments.
+PWHASH_COST_PROFILES = {
+    'sensitive': (nacl.pwhash.OPSLIMIT_SENSITIVE, nacl.pwhash.MEMLIMIT_SENSITIVE),
+    'moderate': (nacl.pwhash.OPSLIMIT_MODERATE, nacl.pwhash.MEMLIMIT_MODERATE),
+    'interactive': (nacl.pwhash.OPSLIMIT_INTERACTIVE, nacl.pwhash.MEMLIMIT_INTERACTIVE),
+    'test': (nacl.pwhash.argon2id.OPSLIMIT_MIN, nacl.pwhash.argon2id.MEMLIMIT_MIN),
+}
+
+
+def _hash_password(password: str, cost_profile: str) -> bytes:
+    opslimit, memlimit = PWHASH_COST_PROFILES[cost_profile]
+    return nacl.pwhash.str(password.encode('utf-8'), opslimit=opslimit, memlimit=memlimit)
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode('ascii')
+
+
+def _b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + '=' * (-len(data) % 4))
+
+
+def new_session_keys() -> Tuple[str, str]:
+    """
+    Makes a key pair for receiving a session token from login without anyone else on the broker being able to read
+    it. The client sends the public key with its login command and keeps the private key for open_session().
+
+    :return: (private key, public key), both base64 encoded
+    """
+    private_key = nacl.public.PrivateKey.generate()
+    return _b64encode(bytes(private_key)), _b64encode(bytes(private_key.public_key))
+
+
+def seal_session(token: str, public_key: str) -> str:
+    """
+    Encrypts a session token so only the holder of the public key's private key can read it.
+
+    :raises: ValueError if the public key is not a base64 encoded Curve25519 public key
+    :param token: the session token
+    :param public_key: the client's public key from new_session_keys()
+    :return: the sealed token, base64 encoded
+    """
+    try:
+        box = nacl.public.SealedBox(nacl.public.PublicKey(_b64decode(public_key)))
+    except (TypeError, ValueError) as error:
+        raise ValueError('Invalid public key.') from error
+    return _b64encode(box.encrypt(token.encode('utf-8')))
+
+
+def open_session(sealed_token: str, private_key: str) -> str:
+    """
+    :param sealed_token: the sealed token published by the login command
+    :param private_key: the private key from new_session_keys()
+    :return: the session token
+    """
+    box = nacl.public.SealedBox(nacl.public.PrivateKey(_b64decode(private_key)))
+    return box.decrypt(_b64decode(sealed_token)).decode('utf-8')
+
+
 class UserDB(object):
-    def __init__(self):
-        self._accounts: Dict[str, bytes] = {}
+    def __init__(self, session_key: bytes = None, session_ttl: float = 3600, session_cache_size: int = 4096,
+                 cost_profile: str = 'interactive', accounts: ShardedAccountStore = None):
+        """
+        Constructor for the user database.
+
+        :param session_key: secret key for signing session tokens; random if None, which invalidates all sessions
+                            when the server restarts
+        :param session_ttl: number of seconds a session token stays valid
+        :param session_cache_size: number of verified session tokens remembered
+        :param cost_profile: default password hashing cost, one of PWHASH_COST_PROFILES
+        :param accounts: persistent storage for the accounts; in memory only if None
+        """
+        if cost_profile not in PWHASH_COST_PROFILES:
+            raise ValueError(f'Unknown cost profile {cost_profile}.')
+        self._cost_profile = cost_profile
+        self._accounts: Union[Dict[str, bytes], ShardedAccountStore] = {} if accounts is None else accounts
+        # Makes checking that a username is free and claiming it one step, for creations on executor threads
+        self._accounts_lock = threading.Lock()
+        self._session_key = session_key if session_key is not None else secrets.token_bytes(32)
+        self._session_ttl = session_ttl
+        self._session_cache_size = session_cache_size
+        self._verified_sessions: 'OrderedDict[str, Tuple[str, str, float]]' = OrderedDict()
+        self._revoked_sessions: Dict[str, float] = {}
 
-    def create_user(self, username: str) -> Tuple[str, str]:
+    def create_user(self, username: str, password: str = None) -> Tuple[str, str]:
         """
-        Creates a user and returns a automatically-generated token (password)
-        for the user.  You can generate this token using secrets.token_urlsafe()
+        Creates a user with the password the user chose, or with an automatically-generated token (password) if
+        none is given. You can generate this token using secrets.token_urlsafe()
 
         Only the one-way hash is stored in self._accounts.
         Yum.... hash browns!
@@ -21,17 +112,56 @@ class UserDB(object):
         NOTE: pwhash.str() expects passwords in bytes!  Use the str type's encode() function
         or the bytes type's decode() function to help you convert.
 
-        :raises: ValueError if the username already exists
+        Thread-safe, so the slow hash can run on an executor thread.
+
+        :raises: ValueError if the username already exists or the password is empty
         :param username: desired username
+        :param password: the user's password; generated if None
         :return: (username, password_token)
         """
         if username in self._accounts:
             raise ValueError('That username is taken.')
-        password_token_str = secrets.token_urlsafe()
-        password_token_hash = nacl.pwhash.str(password_token_str.encode('utf-8'))
-        self._accounts[username] = password_token_hash
+        if password is not None and not password:
+            raise ValueError('The password must not be empty.')
+        password_token_str = secrets.token_urlsafe() if password is None else password
+        password_token_hash = _hash_password(password_token_str, self._cost_profile)
+        with self._accounts_lock:
+            if username in self._accounts:
+                raise ValueError('That username is taken.')
+            self._accounts[username] = password_token_hash
         return username, password_token_str
 
+    def create_users(self, usernames: Iterable[str], cost_profile: str = None,
+                     max_workers: int = None) -> List[Tuple[str, str]]:
+        """
+        Creates many users at once, hashing their passwords across a pool of processes.
+        Either every user is created or, if any username is taken, none is.
+
+        :raises: ValueError if a username already exists or appears twice, or the cost profile is unknown
+        :param usernames: desired usernames
+        :param cost_profile: password hashing cost, one of PWHASH_COST_PROFILES; defaults to the database's profile
+        :param max_workers: number of hashing processes; defaults to the number of CPUs
+        :return: list of (username, password_token), in the order of usernames
+        """
+        usernames = list(usernames)
+        cost_profile = self._cost_profile if cost_profile is None else cost_profile
+        if cost_profile not in PWHASH_COST_PROFILES:
+            raise ValueError(f'Unknown cost profile {cost_profile}.')
+        if len(set(usernames)) != len(usernames) or any(username in self._accounts for username in usernames):
+            raise ValueError('That username is taken.')
+        password_tokens = [secrets.token_urlsafe() for _ in usernames]
+        max_workers = max_workers or os.cpu_count() or 1
+        # A few chunks per worker keeps the pool busy without paying inter-process overhead per password
+        chunksize = max(1, len(usernames) // (4 * max_workers))
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            password_token_hashes = list(pool.map(_hash_password, password_tokens, [cost_profile] * len(usernames),
+                                                  chunksize=chunksize))
+        with self._accounts_lock:
+            if any(username in self._accounts for username in usernames):
+                raise ValueError('That username is taken.')
+            self._accounts.update(zip(usernames, password_token_hashes))
+        return list(zip(usernames, password_tokens))
+
     def is_valid(self, username: str, password) -> bool:
         """
         Check whether the given username and password match a user
@@ -48,3 +178,67 @@ class UserDB(object):
             return nacl.pwhash.verify(self._accounts[username], password.encode('utf-8'))
         except nacl.exceptions.InvalidkeyError:
             return False
+
+    def _sign(self, payload: str) -> str:
+        return _b64encode(hmac.new(self._session_key, payload.encode('ascii'), hashlib.sha256).digest())
+
+    def login(self, username: str, password: str) -> str:
+        """
+        Checks the password once with is_valid() and issues a signed session token, so later commands can be
+        authenticated with check_session() instead of the deliberately slow password hash.
+
+        The token is "<expiry>.<token id>.<username>.<signature>", with the username base64 encoded and the
+        signature an HMAC-SHA256 of everything before it under the server's session key.
+
+        :raises: ValueError if the credentials are invalid
+        :param username:
+        :param password:
+        :return: the session token
+        """
+        if username not in self._accounts or not self.is_valid(username, password):
+            raise ValueError('Invalid username or password.')
+        payload = '.'.join((str(int(time.time() + self._session_ttl)), secrets.token_urlsafe(8),
+                            _b64encode(username.encode('utf-8'))))
+        return payload + '.' + self._sign(payload)
+
+    def check_session(self, token: str) -> Union[str, None]:
+        """
+        Checks a session token issued by login().
+
+        :param token: the session token
+        :return: the username the token was issued to, or None if the token is invalid, expired or revoked
+        """
+        now = time.time()
+        verified = self._verified_sessions.get(token)
+        if verified is None:
+            try:
+                payload, signature = token.rsplit('.', 1)
+                expiry, token_id, encoded_username = payload.split('.')
+                if not hmac.compare_digest(signature, self._sign(payload)):
+                    return None
+                verified = (_b64decode(encoded_username).decode('utf-8'), token_id, float(expiry))
+            except (ValueError, UnicodeError):
+                return None
+            self._verified_sessions[token] = verified
+            if len(self._verified_sessions) > self._session_cache_size:
+                self._verified_sessions.popitem(last=False)
+        username, token_id, expiry = verified
+        if expiry <= now or token_id in self._revoked_sessions:
+            self._verified_sessions.pop(token, None)
+            return None
+        return username
+
+    def revoke_session(self, token: str):
+        """
+        Revokes a session token before it expires. Revocations are kept until the token would have expired anyway.
+
+        :param token: the session token
+        """
+        if self.check_session(token) is None:
+            return
+        _, token_id, expiry = self._verified_sessions.pop(token)
+        now = time.time()
+        for revoked_id, revoked_expiry in list(self._revoked_sessions.items()):
+            if revoked_expiry <= now:
+                del self._revoked_sessions[revoked_id]
+        self._revoked_sessions[token_id] = expiry
@@ -0,0 +1,270 @@
+from typing import Dict, Tuple, Iterable, Iterator, Optional, Union
+import hashlib
+import json
+import mmap
+import os
+import struct
+import threading
+
+_INDEX_HEADER = struct.Struct('<4sII')      # magic, capacity (slots), count (used slots)
+_INDEX_HEADER_SIZE = 16
+_INDEX_SLOT = struct.Struct('<QQ')          # key fingerprint (0 = empty slot), offset of the record in the data file
+_INDEX_MAGIC = b'UIDX'
+_RECORD_HEADER = struct.Struct('<HH')       # username length, value length
+_INITIAL_CAPACITY = 64
+
+
+def hash_of(username: str) -> int:
+    # A stable hash (unlike hash(), which is salted per process)
+    return int.from_bytes(hashlib.blake2b(username.encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+def fingerprint_of(username: str) -> int:
+    # The index key; never 0, which marks an empty index slot
+    return hash_of(username) | 1
+
+
+class _AccountShard(object):
+    """
+    One shard of a ShardedAccountStore: an append-only data file of (username, value) records and a memory-mapped
+    open-addressing hash table from key fingerprint to the offset of the username's latest record.
+
+    Lookups may come from several threads at once (e.g. logins on an executor), so every access to the data file
+    position and the index holds the shard's lock.
+    """
+    def __init__(self, data_path: str, index_path: str):
+        self._lock = threading.Lock()
+        self._index_path = index_path
+        self._data = open(data_path, 'a+b')
+        self._index_file = None
+        self._index = None
+        if os.path.exists(index_path):
+            self._open_index()
+            magic, self._capacity, self._count = _INDEX_HEADER.unpack_from(self._index, 0)
+            if magic != _INDEX_MAGIC:
+                self._rebuild_index()
+        else:
+            self._rebuild_index()
+
+    def _open_index(self):
+        self._index_file = open(self._index_path, 'r+b')
+        self._index = mmap.mmap(self._index_file.fileno(), 0)
+
+    def _close_index(self):
+        if self._index is not None:
+            self._index.close()
+            self._index_file.close()
+            self._index = self._index_file = None
+
+    def _create_index(self, capacity: int, entries: Iterable[Tuple[int, int]]):
+        """
+        Writes a fresh index file holding the given entries and maps it.
+
+        :param capacity: number of slots
+        :param entries: (fingerprint, offset) pairs, all with distinct usernames
+        """
+        table = bytearray(_INDEX_HEADER_SIZE + capacity * _INDEX_SLOT.size)
+        count = 0
+        for fingerprint, offset in entries:
+            slot = self._first_slot(fingerprint, capacity)
+            while _INDEX_SLOT.unpack_from(table, _INDEX_HEADER_SIZE + slot * _INDEX_SLOT.size)[0]:
+                slot = (slot + 1) % capacity
+            _INDEX_SLOT.pack_into(table, _INDEX_HEADER_SIZE + slot * _INDEX_SLOT.size, fingerprint, offset)
+            count += 1
+        _INDEX_HEADER.pack_into(table, 0, _INDEX_MAGIC, capacity, count)
+        self._close_index()
+        tmp_path = self._index_path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(table)
+        os.replace(tmp_path, self._index_path)
+        self._open_index()
+        self._capacity, self._count = capacity, count
+
+    def _rebuild_index(self):
+        """
+        Recreates the index by scanning the data file, e.g. after the index was lost.
+        """
+        latest: Dict[str, Tuple[int, int]] = {}
+        self._data.seek(0)
+        data = self._data.read()
+        offset = 0
+        while offset + _RECORD_HEADER.size <= len(data):
+            username_len, value_len = _RECORD_HEADER.unpack_from(data, offset)
+            end = offset + _RECORD_HEADER.size + username_len + value_len
+            if end > len(data):
+                break  # torn record from a crash during a write
+            username = data[offset + _RECORD_HEADER.size:offset + _RECORD_HEADER.size + username_len].decode('utf-8')
+            latest[username] = (fingerprint_of(username), offset)
+            offset = end
+        capacity = _INITIAL_CAPACITY
+        while len(latest) * 2 > capacity:
+            capacity *= 2
+        self._create_index(capacity, latest.values())
+
+    @staticmethod
+    def _first_slot(fingerprint: int, capacity: int) -> int:
+        return (fingerprint >> 16) % capacity
+
+    def _read_record(self, offset: int) -> Tuple[str, bytes]:
+        self._data.seek(offset)
+        username_len, value_len = _RECORD_HEADER.unpack(self._data.read(_RECORD_HEADER.size))
+        record = self._data.read(username_len + value_len)
+        return record[:username_len].decode('utf-8'), record[username_len:]
+
+    def _find_slot(self, fingerprint: int, username: str) -> Tuple[int, Optional[int]]:
+        """
+        Probes the index for a username.
+
+        :return: (slot holding the username or the empty slot where it would go, record offset or None)
+        """
+        slot = self._first_slot(fingerprint, self._capacity)
+        while True:
+            slot_fingerprint, offset = _INDEX_SLOT.unpack_from(self._index, _INDEX_HEADER_SIZE +
+                                                               slot * _INDEX_SLOT.size)
+            if slot_fingerprint == 0:
+                return slot, None
+            if slot_fingerprint == fingerprint and self._read_record(offset)[0] == username:
+                return slot, offset
+            slot = (slot + 1) % self._capacity
+
+    def get(self, fingerprint: int, username: str) -> Optional[bytes]:
+        with self._lock:
+            _, offset = self._find_slot(fingerprint, username)
+            if offset is None:
+                return None
+            return self._read_record(offset)[1]
+
+    def put(self, fingerprint: int, username: str, value: bytes):
+        with self._lock:
+            self._put(fingerprint, username, value)
+
+    def _put(self, fingerprint: int, username: str, value: bytes):
+        encoded_username = username.encode('utf-8')
+        self._data.seek(0, os.SEEK_END)
+        offset = self._data.tell()
+        self._data.write(_RECORD_HEADER.pack(len(encoded_username), len(value)) + encoded_username + value)
+        self._data.flush()
+        slot, old_offset = self._find_slot(fingerprint, username)
+        _INDEX_SLOT.pack_into(self._index, _INDEX_HEADER_SIZE + slot * _INDEX_SLOT.size, fingerprint, offset)
+        if old_offset is None:
+            self._count += 1
+            _INDEX_HEADER.pack_into(self._index, 0, _INDEX_MAGIC, self._capacity, self._count)
+            if self._count * 2 > self._capacity:
+                entries = [_INDEX_SLOT.unpack_from(self._index, _INDEX_HEADER_SIZE + slot * _INDEX_SLOT.size)
+                           for slot in range(self._capacity)]
+                self._create_index(self._capacity * 2, [entry for entry in entries if entry[0]])
+
+    def usernames(self) -> Iterator[str]:
+        with self._lock:
+            usernames = []
+            for slot in range(self._capacity):
+                fingerprint, offset = _INDEX_SLOT.unpack_from(self._index,
+                                                              _INDEX_HEADER_SIZE + slot * _INDEX_SLOT.size)
+                if fingerprint:
+                    usernames.append(self._read_record(offset)[0])
+        return iter(usernames)
+
+    def __len__(self):
+        return self._count
+
+    def flush(self):
+        with self._lock:
+            self._data.flush()
+            os.fsync(self._data.fileno())
+            self._index.flush()
+
+    def close(self):
+        with self._lock:
+            self._close_index()
+            self._data.close()
+
+
+class ShardedAccountStore(object):
+    """
+    Persistent replacement for UserDB's in-memory accounts dict.
+
+    Accounts are spread over num_shards shards by a stable hash of the username. Each shard is an append-only data
+    file plus a memory-mapped hash index, so a lookup costs one index probe and one record read, and shards are only
+    opened the first time one of their usernames is accessed. The store can be used from several threads.
+    """
+    def __init__(self, directory: str, num_shards: int = 64):
+        """
+        Constructor for the account store. Reopening an existing store keeps its original number of shards.
+
+        :param directory: directory holding the shard files
+        :param num_shards: number of shards for a new store
+        """
+        self._directory = directory
+        self._num_shards = num_shards
+        self._meta_path = os.path.join(directory, 'store.json')
+        # Stores written before the shard was picked from the raw hash placed accounts by the odd fingerprint
+        self._odd_shards = False
+        if os.path.exists(self._meta_path):
+            with open(self._meta_path) as f:
+                meta = json.load(f)
+            self._num_shards = meta['num_shards']
+            self._odd_shards = meta.get('shard_key') != 'hash'
+        self._shards: Dict[int, _AccountShard] = {}
+        self._shards_lock = threading.Lock()
+
+    def _shard(self, shard_idx: int) -> _AccountShard:
+        shard = self._shards.get(shard_idx)
+        if shard is None:
+            with self._shards_lock:
+                shard = self._shards.get(shard_idx)
+                if shard is None:
+                    if not os.path.exists(self._meta_path):
+                        os.makedirs(self._directory, exist_ok=True)
+                        with open(self._meta_path, 'w') as f:
+                            json.dump({'num_shards': self._num_shards, 'shard_key': 'hash'}, f)
+                    prefix = os.path.join(self._directory, 'shard_%04d' % shard_idx)
+                    shard = self._shards[shard_idx] = _AccountShard(prefix + '.dat', prefix + '.idx')
+        return shard
+
+    def _locate(self, username: str) -> Tuple[_AccountShard, int]:
+        hash_value = hash_of(username)
+        fingerprint = hash_value | 1
+        return self._shard((fingerprint if self._odd_shards else hash_value) % self._num_shards), fingerprint
+
+    def __getitem__(self, username: str) -> bytes:
+        shard, fingerprint = self._locate(username)
+        value = shard.get(fingerprint, username)
+        if value is None:
+            raise KeyError(username)
+        return value
+
+    def __setitem__(self, username: str, value: bytes):
+        shard, fingerprint = self._locate(username)
+        shard.put(fingerprint, username, value)
+
+    def __contains__(self, username: str) -> bool:
+        shard, fingerprint = self._locate(username)
+        return shard.get(fingerprint, username) is not None
+
+    def get(self, username: str, default: Optional[bytes] = None) -> Union[bytes, None]:
+        shard, fingerprint = self._locate(username)
+        value = shard.get(fingerprint, username)
+        return default if value is None else value
+
+    def update(self, accounts: Iterable[Tuple[str, bytes]]):
+        for username, value in accounts:
+            self[username] = value
+
+    def __len__(self):
+        return sum(len(self._shard(shard_idx)) for shard_idx in range(self._num_shards))
+
+    def __iter__(self) -> Iterator[str]:
+        for shard_idx in range(self._num_shards):
+            yield from self._shard(shard_idx).usernames()
+
+    def flush(self):
+        """
+        Forces every open shard to disk.
+        """
+        for shard in self._shards.values():
+            shard.flush()
+
+    def close(self):
+        for shard in self._shards.values():
+            shard.close()
+        self._shards.clear()